@@ -0,0 +1,6 @@
+FROM fedora:latest
+
+COPY ./iobench.py /
+RUN dnf install python3-numpy -y
+
+ENTRYPOINT ["python3", "./iobench.py"]
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+
+"""
+A CPU aggressor that holds each of its cores at a target utilisation with a duty cycle, calibrated against the
+host's /proc/stat on startup, running an integer, vectorised FP, cache-resident or DRAM-streaming kernel
+"""
+
+import argparse                     # command line options
+import json                         # one result line per measurement
+import multiprocessing as mp        # one worker process per core
+import os                           # cpu affinity
+import signal                       # stop cleanly on docker stop
+import sys                          # start and stop commands on stdin
+import threading                    # the stdin listener
+from time import perf_counter, process_time, sleep, time  # duty cycles, CPU time and record times
+import numpy as np                  # vectorised FP and memory kernels
+from membench import working_set    # working sets sized against the host's caches
+
+KERNELS = ('int', 'fp', 'cache', 'dram')
+
+# The memory level each kernel's working set is sized against; the integer kernel has none
+LEVELS = {'fp': 'l2', 'cache': 'l2', 'dram': 'dram'}
+
+# Work per kernel call, small enough that a busy phase ends close to its deadline
+STEPS_PER_CALL = 2000
+LINES_PER_CALL = 4096
+
+PROC_STAT = '/proc/stat'
+
+
+def emit(record: dict):
+    """
+    Print one measurement as a JSON line, flushed so the driver sees it as it happens
+    """
+    print(json.dumps(record), flush=True)
+
+
+def make_kernel(kernel: str, nbytes: int) -> callable:
+    """
+    One call's worth of a kernel's work
+    :param kernel: int (integer ALU), fp (NumPy multiply-add), cache or dram (a write to every cache line)
+    :param nbytes: the working set of the fp, cache and dram kernels
+    :return: a function doing one call
+    """
+    if kernel == 'int':
+        def run():
+            x = 533
+            for _ in range(STEPS_PER_CALL):
+                x = (x * 1103515245 + 12345) & 0x7fffffff
+            return x
+        return run
+
+    if kernel == 'fp':
+        n = max(nbytes // (3 * 8), 64)
+        a, b, c = np.full(n, 1.0), np.full(n, 0.5), np.full(n, 1.0)
+
+        def run():
+            # a * 0.5 + 1 converges to 2, so the values never overflow
+            np.multiply(a, b, out=a)
+            np.add(a, c, out=a)
+        return run
+
+    if kernel in ('cache', 'dram'):
+        lines = np.zeros(max(nbytes // 8, 8))[::8]
+        cursor = [0]
+
+        def run():
+            # Successive calls walk the whole working set, one word per 64-byte line
+            lines[cursor[0]:cursor[0] + LINES_PER_CALL] += 1.0
+            cursor[0] = (cursor[0] + LINES_PER_CALL) % len(lines)
+        return run
+
+    raise ValueError(f'Unknown kernel "{kernel}". Expecting ' + ', '.join(KERNELS) + '.')
+
+
+def worker(cpu: int, kernel: str, nbytes: int, period: float, duty, running, stop, cpu_seconds, calls):
+    """
+    Run the kernel for duty * period out of every period while running is set, until stop is set
+    :param cpu: the cpu to pin the worker to
+    :param duty: the shared busy fraction of each period, set by the calibration
+    :param running: set while the aggressor is loading its cores
+    :param stop: set to end the worker
+    :param cpu_seconds: the worker's busy CPU time, for the driver to read
+    :param calls: the worker's kernel calls, for the driver to read
+    """
+    os.sched_setaffinity(0, {cpu})
+    # The driver stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    run = make_kernel(kernel, nbytes)
+    while not stop.is_set():
+        if not running.is_set():
+            running.wait(0.05)
+            continue
+        start = perf_counter()
+        cpu_start = process_time()
+        busy = duty.value * period
+        n = 0
+        while perf_counter() - start < busy:
+            run()
+            n += 1
+        cpu_seconds.value += process_time() - cpu_start
+        calls.value += n
+        rest = start + period - perf_counter()
+        if rest > 0:
+            sleep(rest)
+
+
+def cpu_jiffies(cpus: {int}) -> (int, int):
+    """
+    Busy and total jiffies of some cpus since boot, from the host's /proc/stat
+    :param cpus: the cpu numbers
+    :return: busy and total jiffies summed over the cpus
+    """
+    busy = total = 0
+    with open(PROC_STAT, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if not fields or not fields[0].startswith('cpu') or fields[0] == 'cpu' or int(fields[0][3:]) not in cpus:
+                continue
+            # user nice system idle iowait irq softirq steal; guest time is already part of user
+            values = [int(v) for v in fields[1:9]]
+            busy += sum(values) - values[3] - values[4]
+            total += sum(values)
+    return busy, total
+
+
+def utilization(cpus: {int}, seconds: float) -> float:
+    """
+    :return: the busy fraction of the cpus over the next seconds
+    """
+    busy, total = cpu_jiffies(cpus)
+    sleep(seconds)
+    busy2, total2 = cpu_jiffies(cpus)
+    return (busy2 - busy) / (total2 - total) if total2 > total else 0.0
+
+
+class Aggressor:
+    """
+    Worker processes pinned one per core, sharing a duty cycle
+    """
+
+    def __init__(self, kernel: str, target: float, workers: int=None, period: float=0.1, fraction: float=0.5):
+        """
+        :param kernel: int, fp, cache or dram
+        :param target: the utilisation to hold each core at, from 0 to 1
+        :param workers: worker processes, one per allowed cpu by default
+        :param period: seconds per duty cycle
+        :param fraction: the share of the kernel's memory level used as its working set
+        """
+        if not 0 < target <= 1:
+            raise ValueError(f'The target utilisation must be above 0 and at most 100%, not {target:.0%}.')
+        allowed = sorted(os.sched_getaffinity(0))
+        self.kernel = kernel
+        self.target = target
+        self.period = period
+        self.cpus = [allowed[i % len(allowed)] for i in range(workers or len(allowed))]
+        self.nbytes = working_set(LEVELS[kernel], fraction) if kernel in LEVELS else 0
+        if kernel == 'dram':
+            # Together the workers still stream well past the L3, without each holding a DRAM-sized buffer
+            self.nbytes //= len(self.cpus)
+        # More workers than cpus share them, so their cpus are that much busier
+        self.load = min(target * len(self.cpus) / len(set(self.cpus)), 1.0)
+        self.duty = mp.Value('d', target, lock=False)
+        self.running = mp.Event()
+        self.stop = mp.Event()
+        self.cpu_seconds = [mp.Value('d', 0.0, lock=False) for _ in self.cpus]
+        self.calls = [mp.Value('q', 0, lock=False) for _ in self.cpus]
+        self.processes = [mp.Process(target=worker, args=(cpu, kernel, self.nbytes, period, self.duty, self.running,
+                                                          self.stop, s, c), daemon=True)
+                          for cpu, s, c in zip(self.cpus, self.cpu_seconds, self.calls)]
+        self.last = None
+
+    def start(self) -> 'Aggressor':
+        for p in self.processes:
+            p.start()
+        return self
+
+    def calibrate(self, rounds: int=6, window: float=1.0, tolerance: float=0.01) -> [dict]:
+        """
+        Adjust the duty cycle until the workers' cpus are busier than when idle by the target, as the host's
+        /proc/stat sees it, so sleep overshoot, kernel call granularity and worker overhead are all accounted for
+        :param rounds: the most measurements to take
+        :param window: seconds per measurement
+        :param tolerance: how close to the target the utilisation must come
+        :return: one record per round
+        """
+        cpus = set(self.cpus)
+        idle = utilization(cpus, window / 2)
+        records = []
+        self.running.set()
+        for i in range(rounds):
+            achieved = max(utilization(cpus, window) - idle, 0.0)
+            records.append({'kind': 'calibration', 'round': i, 'duty': self.duty.value, 'utilization': achieved,
+                            'idle': idle, 'time': time()})
+            emit(records[-1])
+            if self.load >= 1 or abs(achieved - self.load) <= tolerance:
+                break
+            self.duty.value = min(max(self.duty.value * self.load / max(achieved, 0.01), 0.01), 1.0)
+        if self.load >= 1:
+            self.duty.value = 1.0
+        self.running.clear()
+        return records
+
+    def resume(self):
+        self.last = (time(), sum(s.value for s in self.cpu_seconds), sum(c.value for c in self.calls),
+                     cpu_jiffies(set(self.cpus)))
+        self.running.set()
+
+    def sample(self) -> dict:
+        """
+        :return: the utilisation of the workers' cpus (every process on them counted), the workers' own share of
+                 them, and kernel calls per second, since the last sample
+        """
+        now, cpu_seconds, calls = time(), sum(s.value for s in self.cpu_seconds), sum(c.value for c in self.calls)
+        jiffies = cpu_jiffies(set(self.cpus))
+        then, cpu_seconds0, calls0, jiffies0 = self.last
+        self.last = (now, cpu_seconds, calls, jiffies)
+        seconds = max(now - then, 1e-9)
+        return {'time': now, 'seconds': seconds,
+                'utilization': (jiffies[0] - jiffies0[0]) / max(jiffies[1] - jiffies0[1], 1),
+                'own': (cpu_seconds - cpu_seconds0) / (seconds * len(self.cpus)),
+                'calls_per_sec': (calls - calls0) / seconds}
+
+    def close(self):
+        self.stop.set()
+        self.running.set()
+        for p in self.processes:
+            p.join()
+
+
+def read_results(logfile: str) -> dict:
+    """
+    Collect the measurements of an aggressor log
+    :param logfile: the log holding the aggressor's JSON lines
+    :return: the config, ready and summary records, the calibration rounds, and the per-second time, utilisation,
+             own share and kernel calls per second as arrays
+    """
+    results = {'config': None, 'ready': None, 'summary': None, 'calibration': [],
+               'time': [], 'utilization': [], 'own': [], 'calls_per_sec': []}
+    with open(logfile, 'r') as f:
+        for line in f:
+            if not line.startswith('{'):
+                continue
+            record = json.loads(line)
+            if record['kind'] == 'calibration':
+                results['calibration'].append(record)
+            elif record['kind'] == 'interval':
+                for k in ('time', 'utilization', 'own', 'calls_per_sec'):
+                    results[k].append(record[k])
+            else:
+                results[record['kind']] = record
+    for k in ('time', 'utilization', 'own', 'calls_per_sec'):
+        results[k] = np.array(results[k])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CPU aggressor holding each core at a target utilisation')
+    parser.add_argument('--kernel', choices=KERNELS, default='int')
+    parser.add_argument('--utilization', type=float, default=50, help='percent of each core to keep busy')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, one per allowed cpu by default')
+    parser.add_argument('--period', type=float, default=0.1, help='seconds per duty cycle')
+    parser.add_argument('--fraction', type=float, default=0.5, help='share of the memory level used as working set')
+    parser.add_argument('--duration', type=float, default=0, help='seconds to load the cores, 0 until stopped')
+    parser.add_argument('--wait', action='store_true',
+                        help='after calibrating, wait for "start" on stdin, and stop on "stop" or end of input')
+    args = parser.parse_args()
+
+    aggressor = Aggressor(args.kernel, args.utilization / 100, args.workers, args.period, args.fraction)
+    emit({'kind': 'config', 'kernel': args.kernel, 'utilization': args.utilization, 'cpus': aggressor.cpus,
+          'period': args.period, 'bytes': aggressor.nbytes, 'duration': args.duration})
+
+    started = threading.Event()
+    finish = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: (finish.set(), started.set()))
+
+    aggressor.start()
+    calibration = aggressor.calibrate()
+    emit({'kind': 'ready', 'duty': aggressor.duty.value, 'utilization': calibration[-1]['utilization'],
+          'rounds': len(calibration), 'time': time()})
+
+    if args.wait:
+        def listen():
+            for command in sys.stdin:
+                if command.strip() == 'start':
+                    started.set()
+                elif command.strip() == 'stop':
+                    break
+            finish.set()
+            started.set()
+
+        threading.Thread(target=listen, daemon=True).start()
+        started.wait()
+
+    begin = time()
+    cpu_seconds = 0.0
+    if not finish.is_set():
+        aggressor.resume()
+        emit({'kind': 'start', 'time': begin})
+        while not finish.is_set():
+            left = args.duration - (time() - begin) if args.duration else 1
+            if left <= 0:
+                break
+            finish.wait(min(left, 1))
+            interval = aggressor.sample()
+            cpu_seconds += interval['own'] * interval['seconds'] * len(aggressor.cpus)
+            emit(dict(interval, kind='interval'))
+    aggressor.close()
+
+    seconds = time() - begin
+    emit({'kind': 'summary', 'kernel': args.kernel, 'target': args.utilization, 'duty': aggressor.duty.value,
+          'seconds': seconds, 'own': cpu_seconds / max(seconds * len(aggressor.cpus), 1e-9),
+          'calls': sum(c.value for c in aggressor.calls), 'time': time()})
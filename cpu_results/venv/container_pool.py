@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""
+Keep pre-created containers warm per image, cpuset and memory nodes, so repeated trials run their workload
+with docker exec instead of paying container create/start/teardown every time
+"""
+
+import atexit                       # guaranteed teardown
+import json                         # image entrypoints from docker inspect
+from concurrent.futures import ThreadPoolExecutor  # parallel create and teardown
+from subprocess import DEVNULL, PIPE, run  # docker CLI
+from threading import Lock          # contenders acquire from several threads
+from docker_api import default_client  # Engine API when the daemon answers on its socket
+
+
+def remove_containers(names: [str]) -> [str]:
+    """
+    Force-remove containers in parallel and wait for all of them
+    :param names: the container names
+    :return: the names that could not be removed (other than ones that did not exist)
+    """
+    def remove(name: str) -> bool:
+        p = run(['docker', 'rm', '-f', name], universal_newlines=True, stdout=DEVNULL, stderr=PIPE)
+        return p.returncode == 0 or 'No such container' in p.stderr
+
+    if not names:
+        return []
+    api = default_client()
+    if api is not None:
+        return api.remove_many(names)
+    with ThreadPoolExecutor(max_workers=min(len(names), 16)) as pool:
+        removed = list(pool.map(remove, names))
+    return [name for name, ok in zip(names, removed) if not ok]
+
+
+class ContainerPool:
+    """
+    Idle containers kept running per (image, cpuset, mems), handed out to one workload at a time
+    """
+
+    def __init__(self, prefix: str='pool'):
+        """
+        :param prefix: the prefix of every pooled container's name
+        """
+        self.prefix = prefix
+        self.idle = {}
+        self.containers = []
+        self.entrypoints = {}
+        self.created = 0
+        self._lock = Lock()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _create(self, img: str, cpuset: str, mems: str=None) -> str:
+        """
+        Start a container that idles until workloads are exec'd into it
+        """
+        with self._lock:
+            self.created += 1
+            name = f'{self.prefix}-{self.created}'
+            self.containers.append(name)
+
+        # A leaked container with the same name would make docker run fail
+        remove_containers([name])
+        api = default_client()
+        if api is not None:
+            try:
+                api.create(name, img, cmd=['infinity'], entrypoint=['sleep'], cpuset=cpuset, mems=mems)
+                api.start(name)
+            except ValueError as e:
+                raise ValueError(f'Could not start pooled container {name}: {e}')
+            return name
+
+        cmd = ['docker', 'run', '-d', '--name', name, '--entrypoint', 'sleep']
+        if cpuset:
+            cmd += ['--cpuset-cpus', cpuset]
+        if mems:
+            cmd += ['--cpuset-mems', mems]
+        p = run(cmd + [img, 'infinity'], universal_newlines=True, stdout=DEVNULL, stderr=PIPE)
+        if p.returncode != 0:
+            raise ValueError(f'Could not start pooled container {name}: {p.stderr.strip()}')
+        return name
+
+    def warm(self, img: str, cpuset: str=None, count: int=1, mems: str=None):
+        """
+        Pre-create containers in parallel so the first trials do not pay for them
+        :param img: the image
+        :param cpuset: the --cpuset-cpus list, or None for unrestricted
+        :param count: the number of containers to keep ready
+        :param mems: the --cpuset-mems list, or None for any node
+        """
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            names = list(pool.map(lambda _: self._create(img, cpuset, mems), range(count)))
+        with self._lock:
+            self.idle.setdefault((img, cpuset, mems), []).extend(names)
+
+    def acquire(self, img: str, cpuset: str=None, mems: str=None) -> str:
+        """
+        Take an idle container for the image, cpuset and memory nodes, creating one if none is idle
+        :param img: the image
+        :param cpuset: the --cpuset-cpus list, or None for unrestricted
+        :param mems: the --cpuset-mems list, or None for any node
+        :return: the container name
+        """
+        with self._lock:
+            idle = self.idle.get((img, cpuset, mems))
+            if idle:
+                return idle.pop()
+        return self._create(img, cpuset, mems)
+
+    def release(self, name: str, img: str, cpuset: str=None, mems: str=None):
+        """
+        Hand a container back once its workload has finished
+        :param name: the container name
+        :param img: the image it was acquired for
+        :param cpuset: the cpuset it was acquired for
+        :param mems: the memory nodes it was acquired for
+        """
+        with self._lock:
+            self.idle.setdefault((img, cpuset, mems), []).append(name)
+
+    def discard(self, name: str):
+        """
+        Remove a container instead of handing it back, e.g. after its workload failed
+        :param name: the container name
+        """
+        with self._lock:
+            if name in self.containers:
+                self.containers.remove(name)
+        remove_containers([name])
+
+    def exec_command(self, name: str, img: str, tty: bool=True) -> str:
+        """
+        The command that runs the image's entrypoint inside a pooled container
+        :param name: the container name
+        :param img: the image
+        :param tty: True for an interactive terminal, as pexpect needs
+        :return: a docker exec command line
+        """
+        if img not in self.entrypoints:
+            p = run(['docker', 'inspect', '--format', '{{json .Config.Entrypoint}}', img], universal_newlines=True,
+                    stdout=PIPE, stderr=DEVNULL)
+            self.entrypoints[img] = ' '.join(json.loads(p.stdout or 'null') or [])
+        return 'docker exec ' + ('-it ' if tty else '') + name + ' ' + self.entrypoints[img]
+
+    def close(self) -> [str]:
+        """
+        Remove every pooled container in parallel
+        :return: the names that could not be removed
+        """
+        with self._lock:
+            names = self.containers
+            self.containers = []
+            self.idle = {}
+        return remove_containers(names)
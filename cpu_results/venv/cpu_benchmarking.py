@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+
+"""
+Run the Linpack benchmark for benchmarking the CPU to demonstrate
+if there is measureable container interference across various experiments
+"""
+
+from subprocess import PIPE, Popen, STDOUT, TimeoutExpired  # spawn processes with CLI commands
+import pexpect                      # spawn and correspond with child processes
+from pexpect import fdpexpect       # correspond with containers attached over the Engine API
+from os import path                 # per-trial store next to each log
+import sys                          # exit status of the whole run
+from concurrent.futures import ThreadPoolExecutor  # drive contenders in parallel
+from threading import Barrier, BrokenBarrierError, Event, Lock, Thread  # release and stop contenders together
+from time import time               # wall-clock windows and deadlines
+from linpack_stream import LinpackStream  # parse trials as they arrive
+from container_pool import ContainerPool, remove_containers  # warm containers and batched teardown
+from sampler import Sampler         # host and container counters alongside each run
+from perfcounters import Counters, join_trials  # per-cgroup event counters joined with the trials
+from microservice import read_results  # parse the microservice victim's output
+import aggressor                    # parse the duty-cycle aggressor's output
+from docker_api import DockerClient, DockerError, default_client  # containers without forking the CLI
+from result_cache import CONTEXT_LABEL, DEFAULT_TTL, ResultCache, context_hash, image_label  # skip unchanged work
+
+
+class AttachedContainer(fdpexpect.fdspawn):
+    """
+    pexpect child talking to a container's terminal over an Engine API attach socket, whose exit status is
+    the container's exit code
+    """
+
+    def __init__(self, api: DockerClient, name: str, sock):
+        """
+        :param api: the API client
+        :param name: the container, created with a tty and stdin and attached before it was started
+        :param sock: the attach socket, which the child then owns
+        """
+        self.api = api
+        self.container = name
+        super().__init__(sock.detach(), encoding='utf-8')
+
+    def close(self, force: bool=False):
+        """
+        Close the attach socket once the container has exited, killing it first with force
+        """
+        if self.child_fd == -1:
+            return
+        try:
+            if force:
+                self.api.kill(self.container)
+            self.exitstatus = self.api.wait(self.container, timeout=60)
+        except (DockerError, OSError):
+            self.exitstatus = None
+        self.signalstatus = None
+        super().close()
+
+
+def spawn_container(cmd: str, api: DockerClient, container_name: str, img: str, cpuset: str=None,
+                    mems: str=None, args: [str]=None) -> pexpect.spawnu:
+    """
+    Start a container with an interactive terminal, like docker run -it
+    :param cmd: the docker command line, used when there is no API client
+    :param api: the API client, or None to fork the docker CLI
+    :param container_name: the container name
+    :param img: the image
+    :param cpuset: the --cpuset-cpus list
+    :param mems: the --cpuset-mems list
+    :param args: arguments to the image's entrypoint, already part of cmd
+    :return: the pexpect child
+    """
+    if api is None:
+        return pexpect.spawnu(cmd)
+    api.create(container_name, img, cmd=args, cpuset=cpuset, mems=mems, tty=True, stdin=True)
+    # Attach before starting, so none of the output is missed
+    sock = api.attach(container_name)
+    api.start(container_name)
+    return AttachedContainer(api, container_name, sock)
+
+
+def multi_tests(img: str, stress_img: str, total_tests: int, test_name: str, timeout: int=600,
+                spec_file: str='cpu_scenarios.json', cache: ResultCache=None):
+    """
+    Tests that run on 2 or more containers
+    :param img: a docker linpack image
+    :param stress_img: a docker stress image
+    :param total_tests: the total number of tests
+    :param test_name: the base test name, which selects the suite in the scenario spec
+    :param timeout: seconds each container may run before it is stopped
+    :param spec_file: the scenario spec describing each test
+    :param cache: stored results to reuse for tests that have not changed
+    :return the names of tests and the exit status of every contender
+    """
+    from scenarios import load_spec, run_matrix
+
+    spec = load_spec(spec_file)
+    spec['defaults'].update(linpack_image=img, stress_image=stress_img, timeout=timeout)
+    spec['scenarios'] = [s for s in spec['scenarios'] if s.get('suite') == test_name][:total_tests]
+    return run_matrix(spec, cache=cache)
+
+
+def run_concurrently(jobs: [(str, callable, dict)], timeout: int=600) -> dict:
+    """
+    Run every job in its own worker thread, all released together by a start barrier
+    :param jobs: list of (name, function, keyword arguments) tuples, one per contender
+    :param timeout: seconds each contender may run before it is stopped and marked failed
+    :return: a dict mapping each job name to its status, error, start and end times and result
+    """
+    results = {}
+    if not jobs:
+        return results
+
+    barrier = Barrier(len(jobs))
+    # Aggressors run until every other contender has finished, or for their own duration when there are none
+    stop = Event()
+    left = [sum(func is not run_aggressor for _, func, _ in jobs)]
+    lock = Lock()
+
+    def contend(name: str, func: callable, kwargs: dict):
+        record = {'status': 0, 'error': None, 'start': None, 'end': None, 'result': None}
+        try:
+            if func is run_aggressor:
+                # An aggressor calibrates first and passes the barrier itself, so the others start against its load
+                kwargs = dict(kwargs, start=barrier, stop=stop if left[0] else None)
+            else:
+                # Every worker blocks here until all contenders are ready to spawn
+                barrier.wait()
+            record['start'] = time()
+            record['result'] = func(timeout=timeout, **kwargs)
+        except BrokenBarrierError:
+            record['status'] = 1
+            record['error'] = 'another contender failed before the start'
+        except Exception as e:
+            record['status'] = 1
+            record['error'] = str(e)
+            if func is run_aggressor:
+                # Nobody waits forever for an aggressor that never reached the barrier
+                barrier.abort()
+        record['end'] = time()
+        results[name] = record
+        if func is not run_aggressor:
+            with lock:
+                left[0] -= 1
+                if not left[0]:
+                    stop.set()
+
+    # The heavy lifting happens in the spawned processes, so threads are enough to overlap them
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        for name, func, kwargs in jobs:
+            pool.submit(contend, name, func, kwargs)
+
+    for name, record in results.items():
+        if record['status'] != 0:
+            print(f'  {name} failed: {record["error"]}')
+        elif isinstance(record['result'], LinpackStream):
+            s = record['result'].summary()
+            print(f'  {name}: {s["trials"]} trials, p50 {s["p50"]} GFlops, p99 {s["p99"]} GFlops, cv {s["cv"]}')
+        elif isinstance(record['result'], dict) and 'qps' in (record['result'].get('summary') or {}):
+            s = record['result']['summary']
+            p99 = 'n/a' if s['p99_ns'] is None else f'{s["p99_ns"] / 1e6:.3f} ms'
+            print(f'  {name}: {s["qps"]:.1f} of {s["rate"]:g} requests/s, p99 {p99}, {s["unanswered"]} unanswered')
+        elif isinstance(record['result'], dict) and record['result'].get('ready') is not None:
+            r = record['result']
+            own = 'n/a' if r['summary'] is None else f'{r["summary"]["own"]:.1%}'
+            print(f'  {name}: {r["config"]["kernel"]} aggressor at {r["config"]["utilization"]:g}% per core, '
+                  f'calibrated duty {r["ready"]["duty"]:.3f}, its own share {own}')
+
+    return results
+
+
+def clean_containers(tests: [str]) -> [str]:
+    """
+    Stop and remove containers that have been tested, in parallel, waiting for every removal
+    :param tests: list of test names
+    :return: the containers that could not be removed
+    """
+    failed = remove_containers(tests)
+    for test in failed:
+        print(f'  could not remove container {test}')
+    return failed
+
+
+def baseline_tests(img: str, total_tests: int, test_name: str, spec_file: str='cpu_scenarios.json',
+                   cache: ResultCache=None):
+    """
+    Implement baseline tests and save results in logs directory
+    :param img: docker image
+    :param total_tests: total number of tests
+    :param test_name: base name of tests, which selects the suite in the scenario spec
+    :param spec_file: the scenario spec describing each test
+    :param cache: stored results to reuse for tests that have not changed
+    :return the names of tests
+    """
+    from scenarios import load_spec, run_matrix
+
+    spec = load_spec(spec_file)
+    spec['defaults'].update(linpack_image=img)
+    spec['scenarios'] = [s for s in spec['scenarios'] if s.get('suite') == test_name][:total_tests]
+    names, statuses = run_matrix(spec, serial=True, cache=cache)
+    return names
+
+
+def benchmark_linpack(logfile: str, child: pexpect.spawnu, total_equations: int, leading_dimension: int, trials: int,
+                      alignment_value: int, timeout: int=600, target_ci: float=None, min_trials: int=30):
+    """
+    Set the parameters for Linpack and store the resulting benchmarked measurements into a file
+    :param logfile: the file for storing results
+    :param child: the child process that was spawned for running Linpack in Docker
+    :param total_equations: the total number of linear equations that will be run
+    :param leading_dimension: the array's leading dimension
+    :param trials: the number of times the benchmark will be run, the cap when target_ci is given
+    :param alignment_value: is the memory alignment value (in kB)
+    :param timeout: seconds the whole benchmark may take before the child is stopped
+    :param target_ci: stop Linpack once the 95% interval on mean GFlops is within this fraction of the mean
+    :param min_trials: trials to run before stopping early
+    :return: the per-trial series, also stored alongside the log as a .npz file
+    """
+    deadline = time() + timeout
+    fileout = open(logfile, 'w')
+    stream = LinpackStream(int(trials))
+
+    child.logfile = fileout
+    child.logfile_read = stream
+    try:
+        for value in ['', total_equations, leading_dimension, trials, alignment_value]:
+            child.expect(':', timeout=max(deadline - time(), 0))
+            child.send(value)
+            child.send('\n')
+
+        # Adaptive mode checks the interval every time a line arrives
+        while target_ci is not None:
+            if child.expect([pexpect.EOF, '\n'], timeout=max(deadline - time(), 0)) == 0:
+                break
+            if stream.converged(target_ci, min_trials):
+                child.close(force=True)
+                stream.stopped = True
+                fileout.write(f'\nStopped after {stream.trials} trials: mean GFlops within '
+                              f'{stream.halfwidth():.3%} at 95% confidence\n')
+                break
+        else:
+            child.expect(pexpect.EOF, timeout=max(deadline - time(), 0))
+    except pexpect.TIMEOUT:
+        child.close(force=True)
+        raise ValueError(f'The Linpack process did not finish within {timeout} seconds.')
+    finally:
+        fileout.close()
+    child.close()
+
+    # Check for errors in running benchmark
+    if child.exitstatus != 0 and not stream.stopped:
+        raise ValueError(f'The Linpack process did not exit correctly. '
+                         f'Exit Status: {child.exitstatus} where expecting zero.')
+
+    if child.signalstatus is not None and not stream.stopped:
+        raise ValueError(f'The Linpack process gave the incorrect status signal. '
+                         f'Signal Status: {child.signalstatus} where expecting None.')
+
+    stream.flush()
+    stream.save(path.splitext(logfile)[0] + '.npz')
+    return stream
+
+
+def run_native(logfile: str, total_equations: str='1000', leading_dimension: str='1000', trials: str='250',
+               alignment_value: str='64', timeout: int=600, sample_rate: float=100, target_ci: float=None,
+               min_trials: int=30):
+    """
+    Run the Linpack benchmark natively, outside of any container
+    :param logfile: the file to save the linpack stdout
+    :param total_equations: total number of linear equations to run
+    :param leading_dimension: leading dimension of the matrix for the equations (minimum 1000)
+    :param trials: total number of times the benchmark is run
+    :param alignment_value: the alignment value for memory (minimum 64)
+    :param timeout: seconds the benchmark may take before it is stopped
+    :param sample_rate: resource samples per second taken alongside the run, 0 to disable
+    :param target_ci: stop once mean GFlops is known within this fraction, with trials as the cap
+    :param min_trials: trials to run before stopping early
+    :return: the per-trial series
+    """
+    cmd = './xlinpack_xeon64'
+    child = pexpect.spawnu(cmd)
+    if not sample_rate:
+        return benchmark_linpack(logfile, child, total_equations, leading_dimension, trials, alignment_value,
+                                 timeout, target_ci, min_trials)
+
+    with Sampler(path.splitext(logfile)[0] + '.samples', sample_rate, pid=child.pid):
+        return benchmark_linpack(logfile, child, total_equations, leading_dimension, trials, alignment_value,
+                                 timeout, target_ci, min_trials)
+
+
+def run_docker(logfile: str, img: str, container_name: str, pin: bool=False, total_pinned_cpu: int=2, start: int=0,
+               stress: bool=False, total_equations: str='1000', leading_dimension: str='1000', trials: str='250',
+               alignment_value: str='64', timeout: int=600, cpuset: str=None, sample_rate: float=100,
+               pool: ContainerPool=None, target_ci: float=None, min_trials: int=30, mems: str=None,
+               counter_rate: float=10, args: [str]=None):
+    """
+    Create and run a docker container with the provided image
+    :param logfile: the file to save the linpack stdout
+    :param img: the image with which to run the container
+    :param container_name: the container name
+    :param pin: True if cpus need to be pinned, False otherwise
+    :param total_pinned_cpu: the total number of cpus to pin
+    :param total_equations: total number of linear equations to run
+    :param leading_dimension: leading dimension of the matrix for the equations (minimum 1000)
+    :param trials: total number of times the benchmark is run
+    :param alignment_value: the alignment value for memory (minimum 64)
+    :param timeout: seconds the container may run before it is stopped
+    :param cpuset: an explicit --cpuset-cpus list such as '0,2', used instead of pin/start when given
+    :param sample_rate: resource samples per second taken alongside the run, 0 to disable
+    :param pool: warm containers to docker exec the workload in, instead of running a new container
+    :param target_ci: stop once mean GFlops is known within this fraction, with trials as the cap
+    :param min_trials: trials to run before stopping early
+    :param mems: an explicit --cpuset-mems list of NUMA nodes, e.g. from topology.plan
+    :param counter_rate: perf event counter reads per second on the container's cgroup, 0 to disable
+    :param args: arguments to the image's entrypoint, e.g. the stress workers and seconds
+    :return: the per-trial series, or None for a stress container
+    """
+    # Format string for pinned CPUs
+    if pin:
+        cpuset = cpuset or ','.join(str(c) for c in range(start, start + total_pinned_cpu))
+
+    api = None
+    if pool is not None:
+        container_name = pool.acquire(img, cpuset, mems)
+        cmd = pool.exec_command(container_name, img)
+    else:
+        api = default_client()
+        # A container leaked by an earlier run would make docker run --name fail
+        remove_containers([container_name])
+        cmd = 'docker run --name ' + container_name + ' -it '
+        if cpuset:
+            cmd += '--cpuset-cpus ' + cpuset + ' '
+        if mems:
+            cmd += '--cpuset-mems ' + mems + ' '
+        cmd += img
+    if args:
+        cmd += ' ' + ' '.join(args)
+
+    # Sample the host and the container's cgroup for the whole run
+    sampler = None
+    if sample_rate:
+        sampler = Sampler(path.splitext(logfile)[0] + '.samples', sample_rate, container=container_name).start()
+    # Count cycles, instructions, LLC misses and scheduler events on the container's cgroup
+    counters = None
+    if counter_rate:
+        counters = Counters(path.splitext(logfile)[0] + '.counters', counter_rate, container=container_name,
+                            cpus=cpuset).start()
+    healthy = False
+    try:
+        if not stress:
+            stream = benchmark_linpack(logfile, spawn_container(cmd, api, container_name, img, cpuset, mems, args),
+                                       total_equations, leading_dimension, trials, alignment_value, timeout,
+                                       target_ci, min_trials)
+            if counters is not None:
+                counters.stop()
+                join_trials(stream.columns(), counters.filename, path.splitext(logfile)[0] + '.perf.npz')
+            # Linpack is still running inside a container that was stopped early
+            healthy = not stream.stopped
+            if stream.stopped and pool is None:
+                remove_containers([container_name])
+            return stream
+
+        # Wait for the stress container so its window is part of the contended run
+        child = spawn_container(cmd, api, container_name, img, cpuset, mems, args)
+        try:
+            child.expect(pexpect.EOF, timeout=timeout)
+        except pexpect.TIMEOUT:
+            child.close(force=True)
+            raise ValueError(f'The stress process did not finish within {timeout} seconds.')
+        child.close()
+        healthy = True
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if counters is not None:
+            counters.stop()
+        # A workload that failed may still be running inside, so its container is not reused
+        if pool is not None and healthy:
+            pool.release(container_name, img, cpuset, mems)
+        elif pool is not None:
+            pool.discard(container_name)
+
+
+def run_microservice(logfile: str, img: str, container_name: str, role: str='client', port: int=8533,
+                     host: str='127.0.0.1', work: int=2000, rate: float=500, connections: int=8, duration: float=30,
+                     cpuset: str=None, mems: str=None, timeout: int=600, sample_rate: float=100) -> dict:
+    """
+    Create and run a container with the microservice image, as the latency-sensitive service or its client
+    :param logfile: the file to save the service's or client's output
+    :param img: the microservice image
+    :param container_name: the container name
+    :param role: server or client
+    :param port: the service's port, on the host network so neither side pays for NAT
+    :param host: the service's address, for the client
+    :param work: spin steps per request, i.e. the CPU cost of each request, for the server
+    :param rate: requests per second the client sends, open-loop
+    :param connections: connections the client spreads its requests over
+    :param duration: seconds the client sends for, or the longest the server waits for its client
+    :param cpuset: an explicit --cpuset-cpus list such as '0,2'
+    :param mems: an explicit --cpuset-mems list of NUMA nodes, e.g. from topology.plan
+    :param timeout: seconds the container may run before it is stopped
+    :param sample_rate: resource samples per second taken alongside the run, 0 to disable
+    :return: the parsed measurements
+    """
+    # A container leaked by an earlier run would make docker run --name fail
+    remove_containers([container_name])
+    cmd = ['docker', 'run', '--name', container_name, '--network', 'host']
+    if cpuset:
+        cmd += ['--cpuset-cpus', cpuset]
+    if mems:
+        cmd += ['--cpuset-mems', mems]
+    cmd += [img, role, '--host', host, '--port', str(port), '--work', str(work), '--rate', str(rate),
+            '--connections', str(connections), '--duration', str(duration)]
+
+    sampler = None
+    if sample_rate:
+        sampler = Sampler(path.splitext(logfile)[0] + '.samples', sample_rate, container=container_name).start()
+    try:
+        with open(logfile, 'w') as fileout:
+            p = Popen(cmd, universal_newlines=True, stdout=fileout, stderr=STDOUT)
+            try:
+                p.wait(timeout=timeout)
+            except TimeoutExpired:
+                p.kill()
+                p.wait()
+                raise ValueError(f'The microservice {role} did not finish within {timeout} seconds.')
+    finally:
+        if sampler is not None:
+            sampler.stop()
+
+    if p.returncode != 0:
+        raise ValueError(f'The microservice {role} did not exit correctly. '
+                         f'Exit Status: {p.returncode} where expecting zero.')
+    return read_results(logfile)
+
+
+def run_aggressor(logfile: str, img: str, container_name: str, kernel: str='int', utilization: float=50,
+                  workers: int=None, period: float=0.1, fraction: float=0.5, duration: float=0, cpuset: str=None,
+                  mems: str=None, timeout: int=600, sample_rate: float=100, start: Barrier=None,
+                  stop: Event=None) -> dict:
+    """
+    Create and run a container with the duty-cycle aggressor image, which calibrates itself before the other
+    contenders are released and loads its cores until they have finished
+    :param logfile: the file to save the aggressor's output
+    :param img: the aggressor image
+    :param container_name: the container name
+    :param kernel: int, fp, cache or dram
+    :param utilization: percent of each core to keep busy
+    :param workers: worker processes, one per cpu of the cpuset by default
+    :param period: seconds per duty cycle
+    :param fraction: the share of the kernel's memory level used as its working set
+    :param duration: seconds to load the cores when there is no stop event, 0 for the whole timeout
+    :param cpuset: an explicit --cpuset-cpus list such as '0,2'
+    :param mems: an explicit --cpuset-mems list of NUMA nodes, e.g. from topology.plan
+    :param timeout: seconds the container may take to calibrate, and to run
+    :param sample_rate: resource samples per second taken alongside the run, 0 to disable
+    :param start: the contenders' start barrier, passed once the aggressor is calibrated
+    :param stop: set once every other contender has finished
+    :return: the parsed measurements
+    """
+    # A container leaked by an earlier run would make docker run --name fail
+    remove_containers([container_name])
+    cmd = ['docker', 'run', '-i', '--name', container_name]
+    if cpuset:
+        cmd += ['--cpuset-cpus', cpuset]
+    if mems:
+        cmd += ['--cpuset-mems', mems]
+    cmd += [img, '--kernel', kernel, '--utilization', str(utilization), '--period', str(period),
+            '--fraction', str(fraction), '--duration', str(duration), '--wait']
+    if workers:
+        cmd += ['--workers', str(workers)]
+
+    sampler = None
+    if sample_rate:
+        sampler = Sampler(path.splitext(logfile)[0] + '.samples', sample_rate, container=container_name).start()
+    ready = Event()
+    try:
+        with open(logfile, 'w') as fileout:
+            p = Popen(cmd, universal_newlines=True, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+
+            def copy():
+                for line in p.stdout:
+                    fileout.write(line)
+                    if line.startswith('{"kind": "ready"'):
+                        ready.set()
+                # An aggressor that exited is not going to get ready
+                ready.set()
+
+            reader = Thread(target=copy, daemon=True)
+            reader.start()
+            try:
+                if not ready.wait(timeout) or p.poll() is not None:
+                    raise ValueError(f'The aggressor did not calibrate within {timeout} seconds.')
+                if start is not None:
+                    start.wait()
+                p.stdin.write('start\n')
+                p.stdin.flush()
+                # Until every other contender has finished, or for the aggressor's own duration
+                if stop is not None:
+                    stop.wait(timeout)
+                else:
+                    try:
+                        p.wait(timeout=min(duration, timeout) if duration else timeout)
+                    except TimeoutExpired:
+                        pass
+                if p.poll() is None:
+                    try:
+                        p.stdin.write('stop\n')
+                        p.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                p.wait(timeout=30)
+            except TimeoutExpired:
+                raise ValueError('The aggressor did not stop within 30 seconds of being told to.')
+            finally:
+                if p.poll() is None:
+                    p.kill()
+                    p.wait()
+                reader.join()
+    finally:
+        if sampler is not None:
+            sampler.stop()
+
+    if p.returncode != 0:
+        raise ValueError(f'The aggressor did not exit correctly. Exit Status: {p.returncode} where expecting zero.')
+    return aggressor.read_results(logfile)
+
+
+def build_image(img: str, dockerfile: str, force: bool=False) -> bool:
+    """
+    Build a Linpack image from the Dockerfile, unless the image was built from the same Dockerfile and context
+    :param img: name of image
+    :param dockerfile: the Dockerfile, with the current directory as its context
+    :param force: True to build even when nothing has changed
+    :return: True if the image was built
+    """
+    digest = context_hash(dockerfile)
+    if not force and image_label(img, CONTEXT_LABEL) == digest:
+        print(f'{img} is up to date')
+        return False
+
+    api = default_client()
+    if api is not None:
+        api.build(img, dockerfile, '.', {CONTEXT_LABEL: digest})
+        return True
+    p = Popen(['docker', 'build', '-f', dockerfile, '-t', img, '--label', f'{CONTEXT_LABEL}={digest}', '.'],
+              universal_newlines=True, stdout=PIPE)
+    out, err = p.communicate()
+    return True
+
+
+if __name__ == '__main__':
+    # Usage: cpu_benchmarking.py [--force] [--ttl hours]
+    # Unchanged images are not rebuilt and unchanged tests reuse their stored results, unless --force is given
+    force = '--force' in sys.argv
+    ttl = float(sys.argv[sys.argv.index('--ttl') + 1]) * 3600 if '--ttl' in sys.argv else DEFAULT_TTL
+
+    # Build the Linpack image
+    img = 'manta/linpack'
+    dockerfile = 'Dockerfile.lp'
+    print(f'\ncreating ' + img + ' image...')
+    build_image(img, dockerfile, force)
+
+    # Build the Linpack image
+    stress_img = 'manta/stress'
+    dockerfile = 'Dockerfile.st'
+    print(f'creating ' + stress_img + ' image...')
+    build_image(stress_img, dockerfile, force)
+
+    # Build the microservice victim's image
+    dockerfile = 'Dockerfile.ms'
+    print(f'creating manta/microservice image...')
+    build_image('manta/microservice', dockerfile, force)
+
+    # Build the calibrated duty-cycle aggressor's image
+    dockerfile = 'Dockerfile.ag'
+    print(f'creating manta/aggressor image...')
+    build_image('manta/aggressor', dockerfile, force)
+    cache = ResultCache(ttl=ttl, force=force)
+
+    # Baseline Tests
+    baseline_total_tests = 5
+    name = 'baseline'
+    print(f'\nrunning ' + str(baseline_total_tests) + ' baseline tests...')
+    baseline_names = baseline_tests(img, baseline_total_tests, name, cache=cache)
+
+    # Multiple Core Tests
+    multi_total_tests = 8
+    name = 'multi'
+    print(f'\nrunning ' + str(multi_total_tests) + ' multi-container tests...')
+    multi_names, multi_statuses = multi_tests(img, stress_img, multi_total_tests, name, cache=cache)
+
+    # Linpack next to the duty-cycle aggressor, per kernel and utilisation
+    duty_total_tests = 2
+    name = 'duty'
+    print(f'\nrunning ' + str(duty_total_tests) + ' duty-cycle aggressor tests...')
+    duty_names, duty_statuses = multi_tests(img, stress_img, duty_total_tests, name, cache=cache)
+
+    print('\nstopping/removing tests...')
+    clean_containers(baseline_names)
+    clean_containers(multi_names)
+    clean_containers(duty_names)
+
+    print('\nDone!')
+    sys.exit(max(list(multi_statuses.values()) + list(duty_statuses.values()), default=0))
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+
+"""
+Watch a victim's live Linpack, iperf3 or wrk results for interference with streaming change-point
+detection (CUSUM or EWMA) against its recorded baseline, and act once it is detected: re-pin the
+victim onto idle cores, lower the aggressors' CPU weight or io.max, or migrate the victim through a
+checkpoint-restore backend, reporting the time to detect and the throughput recovered
+"""
+
+import json                         # daemon config, events and report
+from abc import ABC, abstractmethod  # checkpoint-restore backends
+import sys                          # command line arguments
+from os import path                 # wait for the victim's log
+from subprocess import DEVNULL, PIPE, run  # docker CLI
+from time import sleep, time        # log polling and event times
+import numpy as np                  # baseline statistics and the simulated feed
+from io_benchmarking import set_io_max  # throttle aggressors' I/O
+from linpack_stream import TRIAL_ROW  # per-trial GFlops
+from significance import HIGHER_IS_BETTER, _network_module, load_samples  # recorded baselines
+from topology import Topology, format_cpulist, parse_cpulist  # idle cores to re-pin onto
+
+
+def linpack_parser() -> callable:
+    """
+    A line parser giving the GFlops of every Linpack trial row, and None for any other line
+    """
+    def parse(line: str) -> float:
+        match = TRIAL_ROW.match(line)
+        return float(match.group(5)) if match else None
+    return parse
+
+
+def iperf3_parser() -> callable:
+    """
+    A line parser giving the bits/second of every iperf3 interval; with -P only the [SUM] lines count,
+    and the end-of-test summary is skipped
+    """
+    split_interval = _network_module('iperf3log').split_interval
+    state = {'has_sum': False, 'in_summary': False}
+
+    def parse(line: str) -> float:
+        state['in_summary'] = state['in_summary'] or line.startswith('- - -')
+        interval = split_interval(line)
+        if interval is None or state['in_summary']:
+            return None
+        state['has_sum'] = state['has_sum'] or interval[0] == 'sum'
+        if interval[0] == 'streams' and state['has_sum']:
+            return None
+        return interval[4]
+    return parse
+
+
+def wrk_parser() -> callable:
+    """
+    A line parser giving the mean latency in seconds of every wrk run appended to the log, e.g. by
+    running short wrk tests back to back
+    """
+    to_seconds = _network_module('wrklog').to_seconds
+
+    def parse(line: str) -> float:
+        fields = line.split()
+        if len(fields) >= 4 and fields[0] == 'Latency':
+            try:
+                return to_seconds(fields[1])
+            except (AttributeError, ValueError):
+                return None
+        return None
+    return parse
+
+
+PARSERS = {'linpack': linpack_parser, 'iperf3': iperf3_parser, 'wrk': wrk_parser}
+
+
+def follow(logfile: str, kind: str, poll: float=0.2, idle: float=30):
+    """
+    Tail a log as the workload writes it, yielding one sample per result line
+    :param logfile: the victim's log
+    :param kind: linpack, iperf3 or wrk
+    :param poll: seconds between checks for new output
+    :param idle: stop once the log has not grown for this many seconds
+    :return: a generator of (arrival time, value) pairs
+    """
+    parse = PARSERS[kind]()
+    deadline = time() + idle
+    while not path.exists(logfile):
+        if time() > deadline:
+            return
+        sleep(poll)
+
+    partial = ''
+    with open(logfile, 'r') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                if time() > deadline:
+                    return
+                sleep(poll)
+                continue
+            deadline = time() + idle
+
+            # A line the workload has not finished writing is completed on the next read
+            partial += line
+            if not partial.endswith('\n'):
+                continue
+            value = parse(partial)
+            partial = ''
+            if value is not None:
+                yield time(), value
+
+
+class SimulatedFeed:
+    """
+    A victim whose samples degrade by a factor from a given sample onwards and win back part of the loss
+    every time it is mitigated,
+    with a simulated clock, so the detector and its actions can be exercised without a workload
+    """
+
+    def __init__(self, mean: float, sd: float, samples: int=200, change_at: int=60, factor: float=0.6,
+                 recovered: float=0.9, period: float=1.0, seed: int=533):
+        """
+        :param mean: the baseline mean
+        :param sd: the baseline standard deviation
+        :param samples: samples to produce
+        :param change_at: the sample at which interference starts
+        :param factor: the victim's mean under interference, as a fraction of the baseline mean
+        :param recovered: the share of the remaining loss won back every time mitigate is called
+        :param period: simulated seconds between samples
+        :param seed: the noise's seed
+        """
+        self.mean = mean
+        self.sd = sd
+        self.samples = samples
+        self.change_at = change_at
+        self.factor = factor
+        self.recovered = recovered
+        self.period = period
+        self.rng = np.random.RandomState(seed)
+        self.loss = 1 - factor
+
+    @property
+    def change_time(self) -> float:
+        return self.change_at * self.period
+
+    def mitigate(self, *_):
+        """
+        Called after every action; the victim recovers from the next sample on
+        """
+        self.loss *= 1 - self.recovered
+
+    def __iter__(self):
+        for i in range(self.samples):
+            level = 1 - self.loss if i >= self.change_at else 1.0
+            yield i * self.period, self.rng.normal(self.mean * level, self.sd)
+
+
+class Cusum:
+    """
+    One-sided tabular CUSUM of standardised degradation against the baseline
+    """
+
+    def __init__(self, mean: float, sd: float, higher_is_better: bool=True, drift: float=0.5,
+                 threshold: float=5.0):
+        """
+        :param mean: the baseline mean
+        :param sd: the baseline standard deviation
+        :param higher_is_better: True for throughput, False for latency
+        :param drift: the slack k, in standard deviations, below which degradation is not accumulated
+        :param threshold: the decision interval h, in standard deviations
+        """
+        self.mean = mean
+        self.sd = sd
+        self.sign = -1.0 if higher_is_better else 1.0
+        self.drift = drift
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.s = 0.0
+        self.onset = 0
+
+    def update(self, value: float) -> bool:
+        """
+        Add one sample
+        :param value: the sample
+        :return: True once the accumulated degradation crosses the threshold
+        """
+        self.n += 1
+        self.s = max(0.0, self.s + self.sign * (value - self.mean) / self.sd - self.drift)
+        # The change is estimated to start right after the statistic last left zero
+        if self.s == 0.0:
+            self.onset = self.n
+        return self.s > self.threshold
+
+
+class Ewma:
+    """
+    EWMA control chart with time-varying limits, alarming on the degraded side only
+    """
+
+    def __init__(self, mean: float, sd: float, higher_is_better: bool=True, smoothing: float=0.2,
+                 threshold: float=3.0):
+        """
+        :param mean: the baseline mean
+        :param sd: the baseline standard deviation
+        :param higher_is_better: True for throughput, False for latency
+        :param smoothing: the weight lambda of each new sample
+        :param threshold: the control limit L, in standard deviations of the EWMA
+        """
+        self.mean = mean
+        self.sd = sd
+        self.sign = -1.0 if higher_is_better else 1.0
+        self.smoothing = smoothing
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.z = self.mean
+        self.onset = 0
+
+    def update(self, value: float) -> bool:
+        """
+        Add one sample
+        :param value: the sample
+        :return: True once the EWMA is beyond its control limit on the degraded side
+        """
+        lam = self.smoothing
+        self.n += 1
+        self.z = lam * value + (1 - lam) * self.z
+        limit = self.threshold * self.sd * np.sqrt(lam / (2 - lam) * (1 - (1 - lam) ** (2 * self.n)))
+        if self.sign * (self.z - self.mean) <= 0:
+            self.onset = self.n
+        return self.sign * (self.z - self.mean) > limit
+
+
+DETECTORS = {'cusum': Cusum, 'ewma': Ewma}
+
+
+def docker(*args: str) -> str:
+    """
+    Run a docker command, raising ValueError with its error when it fails or cannot be started
+    :return: its output
+    """
+    try:
+        p = run(['docker'] + list(args), universal_newlines=True, stdout=PIPE, stderr=PIPE)
+    except OSError as e:
+        raise ValueError(f'docker {args[0]} failed: {e}')
+    if p.returncode != 0:
+        raise ValueError(f'docker {args[0]} failed: {p.stderr.strip()}')
+    return p.stdout.strip()
+
+
+def busy_cpus() -> {int}:
+    """
+    The cpus pinned by every running container; unpinned containers may run anywhere and are ignored
+    """
+    busy = set()
+    ids = docker('ps', '-q').split()
+    if ids:
+        for cpuset in docker('inspect', '--format', '{{.HostConfig.CpusetCpus}}', *ids).split():
+            busy.update(parse_cpulist(cpuset))
+    return busy
+
+
+def idle_cpus(count: int, avoid: [int]=(), topology: Topology=None) -> str:
+    """
+    Whole physical cores that no running container is pinned to, preferring a different last-level
+    cache than the cpus being left
+    :param count: the cpus needed
+    :param avoid: the cpus the victim is leaving
+    :param topology: the host topology, read from sysfs when not given
+    :return: a --cpuset-cpus list
+    """
+    topology = topology or Topology()
+    busy = busy_cpus() | set(avoid)
+    shared = {topology.llc[c] for c in avoid if c in topology.llc}
+    cores = [core for core in topology.cores() if not busy & set(core)]
+    cores.sort(key=lambda core: topology.llc[core[0]] in shared)
+    cpus = [c for core in cores for c in core][:count]
+    if len(cpus) < count:
+        raise ValueError(f'Only {len(cpus)} idle cpus, {count} needed.')
+    return format_cpulist(cpus)
+
+
+class Repin:
+    """
+    Move the victim onto idle cores with docker update --cpuset-cpus
+    """
+
+    def __init__(self, cpus: str=None, topology: Topology=None):
+        """
+        :param cpus: the cpuset to move to, or None to pick as many idle cpus as the victim has now
+        :param topology: the host topology used to pick idle cores
+        """
+        self.cpus = cpus
+        self.topology = topology
+
+    def apply(self, victim: str) -> str:
+        current = parse_cpulist(docker('inspect', '--format', '{{.HostConfig.CpusetCpus}}', victim))
+        cpus = self.cpus or idle_cpus(len(current) or 1, current, self.topology)
+        docker('update', '--cpuset-cpus', cpus, victim)
+        return f'repinned {victim} to cpus {cpus}'
+
+
+class Throttle:
+    """
+    Lower the aggressors' CPU weight (docker update --cpu-shares, which docker maps to cpu.weight on
+    cgroup v2) and/or their io.max
+    """
+
+    def __init__(self, containers: [str], cpu_shares: int=None, io_max: dict=None, device: str=None):
+        """
+        :param containers: the aggressors
+        :param cpu_shares: the aggressors' new weight, against the default of 1024
+        :param io_max: limits keyed by read_bps, write_bps, read_iops and write_iops
+        :param device: the block device io_max applies to
+        """
+        self.containers = containers
+        self.cpu_shares = cpu_shares
+        self.io_max = io_max
+        self.device = device
+
+    def apply(self, victim: str) -> str:
+        done = []
+        if self.cpu_shares:
+            docker('update', '--cpu-shares', str(self.cpu_shares), *self.containers)
+            done.append(f'cpu shares {self.cpu_shares}')
+        if self.io_max:
+            for container in self.containers:
+                set_io_max(container, self.device, self.io_max)
+            done.append(f'io.max {self.io_max}')
+        return f'throttled {", ".join(self.containers)}: {", ".join(done)}'
+
+
+class CheckpointBackend(ABC):
+    """
+    Moves a running container to another host; subclasses implement migrate
+    """
+
+    @abstractmethod
+    def migrate(self, container: str) -> str:
+        """
+        :param container: the container to move
+        :return: a description of where it went
+        """
+
+
+class DockerCheckpoint(CheckpointBackend):
+    """
+    docker checkpoint (CRIU, needs experimental daemons on both hosts) with the checkpoint copied over
+    scp and restored into a container of the same name and image on the target host
+    """
+
+    def __init__(self, host: str, ssh: str=None, checkpoint_dir: str='/var/tmp/checkpoints'):
+        """
+        :param host: the target's docker host, e.g. ssh://user@host
+        :param ssh: the scp destination, e.g. user@host, derived from an ssh:// host when not given
+        :param checkpoint_dir: where checkpoints are written on both hosts
+        """
+        self.host = host
+        self.ssh = ssh or host.replace('ssh://', '')
+        self.checkpoint_dir = checkpoint_dir
+
+    def migrate(self, container: str) -> str:
+        name = f'{container}-{int(time())}'
+        image = docker('inspect', '--format', '{{.Config.Image}}', container)
+        docker('checkpoint', 'create', '--checkpoint-dir', self.checkpoint_dir, container, name)
+        docker('-H', self.host, 'create', '--name', container, image)
+        try:
+            p = run(['scp', '-rq', path.join(self.checkpoint_dir, name), f'{self.ssh}:{self.checkpoint_dir}/'],
+                    stdout=DEVNULL, stderr=PIPE, universal_newlines=True)
+        except OSError as e:
+            raise ValueError(f'Could not copy checkpoint {name}: {e}')
+        if p.returncode != 0:
+            raise ValueError(f'Could not copy checkpoint {name}: {p.stderr.strip()}')
+        docker('-H', self.host, 'start', '--checkpoint-dir', self.checkpoint_dir, '--checkpoint', name, container)
+        return f'restored on {self.host} from checkpoint {name}'
+
+
+class Migrate:
+    """
+    Move the victim to another host through a checkpoint-restore backend
+    """
+
+    def __init__(self, backend: CheckpointBackend):
+        self.backend = backend
+
+    def apply(self, victim: str) -> str:
+        return f'migrated {victim}: {self.backend.migrate(victim)}'
+
+
+def make_action(config: dict):
+    """
+    Build an action from its config, e.g. {"action": "throttle", "containers": [...], "cpu_shares": 128}
+    """
+    config = dict(config)
+    kind = config.pop('action')
+    if kind == 'repin':
+        # A copy of another host's sysfs can stand in for this host's topology
+        sysfs = config.pop('sysfs', None)
+        return Repin(topology=Topology(sysfs) if sysfs else None, **config)
+    if kind == 'throttle':
+        return Throttle(**config)
+    if kind == 'migrate':
+        return Migrate(DockerCheckpoint(**config))
+    raise ValueError(f'Unknown action "{kind}". Expecting repin, throttle or migrate.')
+
+
+def emit(record: dict):
+    """
+    Print one daemon event as a JSON line, flushed so it can be followed
+    """
+    print(json.dumps(record), flush=True)
+
+
+def watch(feed, victim: str, detector, actions: list, baseline_mean: float, recovery: int=10,
+          change_time: float=None, on_action: callable=None) -> dict:
+    """
+    Run the detector over the feed and take the next action, escalating, whenever interference is detected
+    :param feed: (time, value) pairs, e.g. from follow or a SimulatedFeed
+    :param victim: the victim container
+    :param detector: a Cusum or Ewma against the baseline
+    :param actions: the actions to take, one per detection, in order
+    :param baseline_mean: the baseline mean, which recovery is measured against
+    :param recovery: samples after an action over which the recovered mean is taken
+    :param change_time: when interference really started, if known (simulated feeds); later detections, and
+                        every detection without it, are timed from the detector's estimate of the onset
+    :param on_action: called with each event once its action has been taken
+    :return: every detection with its action, time to detect and the share of lost throughput recovered
+    """
+    times = []
+    values = []
+    events = []
+    pending = None
+    alarmed = False
+    remaining = list(actions)
+
+    for t, value in feed:
+        times.append(t)
+        values.append(value)
+
+        # Recovery of the last action is measured over the samples that follow it
+        if pending is not None and len(values) - pending['index'] >= recovery:
+            finish(pending, values, baseline_mean)
+            emit(pending)
+            pending = None
+
+        if not detector.update(value):
+            alarmed = False
+            continue
+        if alarmed:
+            # With no action left, interference that persists is reported once
+            continue
+
+        onset = times[len(times) - detector.n + detector.onset]
+        event = {'kind': 'detection', 'time': t, 'onset': onset,
+                 'time_to_detect': t - (onset if change_time is None or events else change_time),
+                 'samples_to_detect': detector.n - detector.onset,
+                 'degraded_mean': float(np.mean(values[len(values) - detector.n + detector.onset:])),
+                 'action': None, 'result': None}
+        if pending is not None:
+            # Still degraded before the recovery window was over: the last action did not help
+            finish(pending, values, baseline_mean)
+            emit(pending)
+            pending = None
+
+        if remaining:
+            detector.reset()
+            action = remaining.pop(0)
+            event['action'] = type(action).__name__.lower()
+            try:
+                event['result'] = action.apply(victim)
+                if on_action is not None:
+                    on_action(event)
+            except ValueError as e:
+                event['result'] = f'failed: {e}'
+            event['index'] = len(values)
+            pending = event
+        else:
+            alarmed = True
+            emit(event)
+        events.append(event)
+
+    if pending is not None:
+        finish(pending, values, baseline_mean)
+        emit(pending)
+
+    return {'victim': victim, 'samples': len(values), 'baseline_mean': baseline_mean, 'events': events}
+
+
+def finish(event: dict, values: [float], baseline_mean: float):
+    """
+    Fill in the mean after an event's action and the share of the lost throughput (or added latency)
+    it won back
+    """
+    after = values[event.pop('index'):]
+    event['recovered_mean'] = float(np.mean(after)) if after else None
+    lost = baseline_mean - event['degraded_mean']
+    event['recovered'] = (event['recovered_mean'] - event['degraded_mean']) / lost if after and lost else None
+
+
+def baseline_of(kind: str, patterns: [str]) -> (float, float):
+    """
+    The mean and standard deviation of the recorded baseline
+    :param kind: linpack, iperf3 or wrk
+    :param patterns: the baseline's logs or glob patterns
+    :return: the mean and standard deviation, which is floored at 1% of the mean
+    """
+    samples = load_samples(kind, patterns)
+    if not len(samples):
+        raise ValueError(f'No {kind} baseline samples in {patterns}.')
+    mean = float(samples.mean())
+    sd = float(samples.std(ddof=1)) if len(samples) > 1 else 0.0
+    return mean, max(sd, abs(mean) * 0.01)
+
+
+if __name__ == '__main__':
+    # Usage: detector.py config.json [--simulate]
+    with open(sys.argv[1], 'r') as f:
+        config = json.load(f)
+    kind = config.get('kind', 'linpack')
+    higher_is_better = config.get('higher_is_better', HIGHER_IS_BETTER[kind])
+
+    if '--simulate' in sys.argv:
+        # A simulated victim from the config's "simulate" block, recovering once an action is taken
+        sim = config.get('simulate', {})
+        mean, sd = sim.get('mean'), sim.get('sd')
+        if mean is None:
+            mean, sd = baseline_of(kind, config['baseline'])
+        feed = SimulatedFeed(mean, sd, **{k: v for k, v in sim.items() if k not in ('mean', 'sd')})
+        on_action, change_time = feed.mitigate, feed.change_time
+    else:
+        mean, sd = baseline_of(kind, config['baseline'])
+        feed = follow(config['log'], kind, idle=config.get('idle', 30))
+        on_action, change_time = None, None
+
+    detector = DETECTORS[config.get('method', 'cusum')](mean, sd, higher_is_better, **config.get('detector', {}))
+    report = watch(feed, config['victim'], detector, [make_action(a) for a in config.get('actions', [])], mean,
+                   config.get('recovery', 10), change_time, on_action)
+    report.update(kind=kind, method=config.get('method', 'cusum'), baseline_sd=sd)
+
+    with open(config.get('report', 'detector_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    for event in report['events']:
+        recovered = 'n/a' if event.get('recovered') is None else f'{event["recovered"]:.1%}'
+        print(f'{event["action"] or "detected"} {event["time_to_detect"]:.1f}s after the change '
+              f'({event["samples_to_detect"]} samples): {event["result"]}, recovered {recovered}')
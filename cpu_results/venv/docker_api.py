@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+
+"""
+Thin Docker Engine API client over a pool of persistent unix socket connections, so containers are
+created, started, waited for and removed in bulk without forking the docker CLI for each one
+"""
+
+import http.client                  # HTTP/1.1 with keep-alive
+import io                           # in-memory build context
+import json                         # request and response bodies
+import socket                       # unix socket transport
+import sys                          # command line arguments
+import tarfile                      # build context upload
+from concurrent.futures import ThreadPoolExecutor  # concurrent bulk operations
+from os import environ, path        # socket location
+from queue import Empty, LifoQueue  # idle connections
+from threading import Lock, Thread  # shared default client and events thread
+from time import time               # lifecycle clock
+from urllib.parse import quote, urlencode  # request paths
+
+DOCKER_SOCKET = '/var/run/docker.sock'
+
+# Stream ids in the multiplexed (non-tty) attach and logs framing
+STDIN, STDOUT, STDERR = 0, 1, 2
+
+
+class DockerError(ValueError):
+    """
+    An error response from the Engine API
+    """
+
+    def __init__(self, message: str, status: int=None):
+        super().__init__(message)
+        self.status = status
+
+
+class UnixConnection(http.client.HTTPConnection):
+    """
+    HTTP connection to the daemon's unix socket
+    """
+
+    def __init__(self, socket_path: str, timeout: float=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def demux(chunks) -> iter:
+    """
+    Split a multiplexed attach or logs stream into its frames
+    :param chunks: an iterator of raw bytes as read from the socket
+    :return: an iterator of (stream id, bytes)
+    """
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        # Each frame is an 8 byte header (stream, 0, 0, 0, big endian size) and its payload
+        while len(buffer) >= 8:
+            size = int.from_bytes(buffer[4:8], 'big')
+            if len(buffer) < 8 + size:
+                break
+            yield buffer[0], buffer[8:8 + size]
+            buffer = buffer[8 + size:]
+
+
+def read_chunks(response: http.client.HTTPResponse, size: int=65536) -> iter:
+    """
+    :param response: a streaming response
+    :return: an iterator of the bytes as they arrive, ending when the daemon closes the stream
+    """
+    while True:
+        try:
+            chunk = response.read1(size)
+        except (OSError, http.client.HTTPException, ValueError):
+            return
+        if not chunk:
+            return
+        yield chunk
+
+
+def json_lines(chunks) -> iter:
+    """
+    :param chunks: an iterator of bytes holding newline-separated JSON objects
+    :return: an iterator of the decoded objects
+    """
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+class DockerClient:
+    """
+    Engine API client sharing keep-alive connections between threads
+    """
+
+    def __init__(self, socket_path: str=DOCKER_SOCKET, size: int=16, timeout: float=60):
+        """
+        :param socket_path: the daemon's unix socket
+        :param size: idle connections kept open, and workers used by the bulk operations
+        :param timeout: seconds a request may take, unless it says otherwise
+        """
+        self.socket_path = socket_path
+        self.size = size
+        self.timeout = timeout
+        self.opened = 0
+        self._idle = LifoQueue()
+
+    def _connection(self, timeout: float=None) -> UnixConnection:
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            conn = UnixConnection(self.socket_path, self.timeout)
+            self.opened += 1
+        # 0 means no limit, e.g. to wait for a container or follow a stream
+        conn.timeout = self.timeout if timeout is None else (timeout or None)
+        if conn.sock is not None:
+            conn.sock.settimeout(conn.timeout)
+        return conn
+
+    def _release(self, conn: UnixConnection, response: http.client.HTTPResponse):
+        if response.will_close or self._idle.qsize() >= self.size:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    def _send(self, method: str, url: str, params: dict=None, body=None, headers: dict=None,
+              timeout: float=None) -> (UnixConnection, http.client.HTTPResponse):
+        """
+        Send a request, retrying once on a fresh connection if a pooled one had been closed by the daemon
+        """
+        if params:
+            url += '?' + urlencode({k: v for k, v in params.items() if v is not None})
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers.setdefault('Content-Type', 'application/json')
+        for attempt in range(2):
+            conn = self._connection(timeout)
+            reused = conn.sock is not None
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except (ConnectionError, http.client.BadStatusLine, http.client.CannotSendRequest):
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+
+    def request(self, method: str, url: str, params: dict=None, body=None, headers: dict=None,
+                timeout: float=None):
+        """
+        Make one API call on a pooled connection
+        :param method: the HTTP method
+        :param url: the path, e.g. /containers/create
+        :param params: query parameters; None values are left out
+        :param body: a dict or list sent as JSON, or bytes
+        :param headers: extra request headers
+        :param timeout: seconds the call may take, 0 for no limit
+        :return: the decoded JSON response, the raw bytes if it is not JSON, or None if empty
+        """
+        conn, response = self._send(method, url, params, body, headers, timeout)
+        try:
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn, response)
+        if response.status >= 400:
+            try:
+                message = json.loads(data)['message']
+            except (ValueError, KeyError, TypeError):
+                message = data.decode(errors='replace').strip()
+            raise DockerError(f'{method} {url}: {message}', response.status)
+        if not data:
+            return None
+        if response.getheader('Content-Type', '').startswith('application/json'):
+            return json.loads(data)
+        return data
+
+    def stream(self, method: str, url: str, params: dict=None, body=None, headers: dict=None,
+               timeout: float=None) -> (UnixConnection, http.client.HTTPResponse):
+        """
+        Make a call whose response is read as it arrives, on a connection of its own
+        :return: the connection, to be closed by the caller, and the response
+        """
+        conn, response = self._send(method, url, params, body, headers, timeout)
+        if response.status >= 400:
+            data = response.read()
+            conn.close()
+            raise DockerError(f'{method} {url}: {data.decode(errors="replace").strip()}', response.status)
+        return conn, response
+
+    def close(self):
+        """
+        Close every idle connection
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+    def ping(self) -> bool:
+        """
+        :return: True if the daemon answers
+        """
+        try:
+            return self.request('GET', '/_ping', timeout=5) in (b'OK', 'OK')
+        except (OSError, DockerError, http.client.HTTPException):
+            return False
+
+    def version(self) -> dict:
+        return self.request('GET', '/version')
+
+    def create(self, name: str, image: str, cmd: [str]=None, entrypoint: [str]=None, cpuset: str=None,
+               mems: str=None, tty: bool=False, stdin: bool=False, ports: dict=None, labels: dict=None,
+               env: dict=None, auto_remove: bool=False) -> str:
+        """
+        Create a container, like docker create
+        :param name: the container name
+        :param image: the image
+        :param cmd: the command, or None for the image's default
+        :param entrypoint: the entrypoint, or None for the image's
+        :param cpuset: the --cpuset-cpus list
+        :param mems: the --cpuset-mems list
+        :param tty: True to allocate a terminal, like -t
+        :param stdin: True to keep stdin open for attach, like -i
+        :param ports: container port to host port, like -p host:container
+        :param labels: container labels
+        :param env: environment variables
+        :param auto_remove: True to remove the container once it exits, like --rm
+        :return: the container id
+        """
+        host_config = {'CpusetCpus': cpuset or '', 'CpusetMems': mems or '', 'AutoRemove': auto_remove}
+        config = {'Image': image, 'Tty': tty, 'OpenStdin': stdin, 'StdinOnce': stdin, 'AttachStdin': stdin,
+                  'AttachStdout': True, 'AttachStderr': True, 'Labels': labels or {},
+                  'Env': [f'{k}={v}' for k, v in (env or {}).items()], 'HostConfig': host_config}
+        if cmd is not None:
+            config['Cmd'] = list(cmd)
+        if entrypoint is not None:
+            config['Entrypoint'] = list(entrypoint)
+        if ports:
+            config['ExposedPorts'] = {f'{p}/tcp': {} for p in ports}
+            host_config['PortBindings'] = {f'{p}/tcp': [{'HostPort': str(h)}] for p, h in ports.items()}
+        return self.request('POST', '/containers/create', {'name': name}, config)['Id']
+
+    def start(self, name: str):
+        self.request('POST', f'/containers/{quote(name)}/start')
+
+    def wait(self, name: str, timeout: float=None) -> int:
+        """
+        :param name: the container
+        :param timeout: seconds to wait, or None to wait as long as it runs
+        :return: the container's exit code
+        """
+        result = self.request('POST', f'/containers/{quote(name)}/wait', timeout=timeout or 0)
+        return result['StatusCode']
+
+    def kill(self, name: str, signal: str='KILL'):
+        self.request('POST', f'/containers/{quote(name)}/kill', {'signal': signal})
+
+    def inspect(self, name: str) -> dict:
+        return self.request('GET', f'/containers/{quote(name)}/json')
+
+    def inspect_image(self, name: str) -> dict:
+        return self.request('GET', f'/images/{quote(name)}/json')
+
+    def exists(self, name: str) -> bool:
+        try:
+            self.inspect(name)
+            return True
+        except DockerError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    def remove(self, name: str, force: bool=True) -> bool:
+        """
+        :param name: the container
+        :param force: True to kill it first if it is running
+        :return: True if it was removed, False if it did not exist
+        """
+        try:
+            self.request('DELETE', f'/containers/{quote(name)}', {'force': int(force)})
+            return True
+        except DockerError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    def attach(self, name: str, stdin: bool=True) -> socket.socket:
+        """
+        Attach to a container's stdin, stdout and stderr before starting it, like docker run -it
+        :param name: the container
+        :param stdin: True to write to the container's stdin through the socket
+        :return: the hijacked socket; raw bytes for a tty container, demux() frames otherwise
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        query = urlencode({'stream': 1, 'stdin': int(stdin), 'stdout': 1, 'stderr': 1})
+        sock.sendall(f'POST /containers/{quote(name)}/attach?{query} HTTP/1.1\r\nHost: docker\r\n'
+                     f'Connection: Upgrade\r\nUpgrade: tcp\r\nContent-Length: 0\r\n\r\n'.encode())
+        # Read the headers a byte at a time, so no output that follows them is consumed
+        head = b''
+        while not head.endswith(b'\r\n\r\n'):
+            byte = sock.recv(1)
+            if not byte:
+                sock.close()
+                raise DockerError(f'attach {name}: the daemon closed the connection')
+            head += byte
+        status = int(head.split(b' ', 2)[1])
+        if status not in (101, 200):
+            sock.close()
+            raise DockerError(f'attach {name}: {head.decode(errors="replace").splitlines()[0]}', status)
+        return sock
+
+    def logs(self, name: str, follow: bool=False, timestamps: bool=False, tty: bool=None) -> iter:
+        """
+        Stream a container's output, like docker logs [--follow]
+        :param name: the container
+        :param follow: True to keep streaming until the container stops
+        :param timestamps: True to prefix each line with its time
+        :param tty: whether the container has a terminal; looked up when None
+        :return: an iterator of (stream id, bytes)
+        """
+        if tty is None:
+            tty = self.inspect(name)['Config']['Tty']
+        conn, response = self.stream('GET', f'/containers/{quote(name)}/logs',
+                                     {'stdout': 1, 'stderr': 1, 'follow': int(follow),
+                                      'timestamps': int(timestamps)}, timeout=0 if follow else None)
+        try:
+            if tty:
+                for chunk in read_chunks(response):
+                    yield STDOUT, chunk
+            else:
+                yield from demux(read_chunks(response))
+        finally:
+            conn.close()
+
+    def events(self, filters: dict=None, since: float=None, until: float=None) -> (UnixConnection, iter):
+        """
+        Subscribe to the daemon's event stream
+        :param filters: e.g. {'type': ['container']}
+        :param since: only events from this time on
+        :param until: stop once this time has passed, or None to stream until the connection is closed
+        :return: the connection, whose close ends the stream, and an iterator of event dicts
+        """
+        conn, response = self.stream('GET', '/events', {'filters': json.dumps(filters) if filters else None,
+                                                        'since': since, 'until': until}, timeout=0)
+        return conn, json_lines(read_chunks(response))
+
+    def build(self, tag: str, dockerfile: str='Dockerfile', context: str='.', labels: dict=None) -> str:
+        """
+        Build an image from a directory, like docker build -f dockerfile -t tag context
+        :param tag: the image name
+        :param dockerfile: the Dockerfile, relative to the context
+        :param context: the build context directory
+        :param labels: image labels
+        :return: the image id
+        """
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar:
+            tar.add(context, arcname='.')
+        conn, response = self.stream('POST', '/build', {'t': tag, 'dockerfile': dockerfile, 'rm': 1,
+                                                        'labels': json.dumps(labels) if labels else None},
+                                     archive.getvalue(), {'Content-Type': 'application/x-tar'}, timeout=0)
+        image = None
+        try:
+            for message in json_lines(read_chunks(response)):
+                if 'error' in message:
+                    raise DockerError(f'build {tag}: {message["error"].strip()}')
+                image = message.get('aux', {}).get('ID', image)
+        finally:
+            conn.close()
+        return image
+
+    def bulk(self, func: callable, items: list) -> list:
+        """
+        Apply one call to many items concurrently, over the pooled connections
+        :param func: e.g. client.start
+        :param items: the arguments, one per call
+        :return: the results in order; a failed call's exception is returned in its place
+        """
+        def call(item):
+            try:
+                return func(*item) if isinstance(item, tuple) else func(item)
+            except Exception as e:
+                return e
+
+        if len(items) < 2:
+            return [call(item) for item in items]
+        try:
+            with ThreadPoolExecutor(max_workers=min(len(items), self.size)) as pool:
+                return list(pool.map(call, items))
+        except RuntimeError:
+            # No new threads can be started at interpreter shutdown, e.g. when a pool is closed at exit
+            return [call(item) for item in items]
+
+    def remove_many(self, names: [str], force: bool=True) -> [str]:
+        """
+        :param names: the containers
+        :param force: True to kill running ones first
+        :return: the names that could not be removed (other than ones that did not exist)
+        """
+        results = self.bulk(lambda name: self.remove(name, force), names)
+        return [name for name, r in zip(names, results) if isinstance(r, Exception)]
+
+    def start_many(self, names: [str]) -> [str]:
+        """
+        :return: the names that could not be started
+        """
+        results = self.bulk(self.start, names)
+        return [name for name, r in zip(names, results) if isinstance(r, Exception)]
+
+    def wait_many(self, names: [str], timeout: float=None) -> [int]:
+        """
+        :return: every container's exit code, or None where waiting failed
+        """
+        return [None if isinstance(r, Exception) else r for r in self.bulk(lambda n: self.wait(n, timeout), names)]
+
+
+class Lifecycle:
+    """
+    Background /events subscriber recording when each container was created, started, died and destroyed,
+    in the daemon's clock
+    """
+
+    def __init__(self, client: DockerClient, names: [str]=None):
+        """
+        :param client: the API client
+        :param names: the containers to record, or None for every container
+        """
+        self.client = client
+        self.names = None if names is None else set(names)
+        self.times = {}
+        self.exit_codes = {}
+        self._conn = None
+        self._thread = None
+
+    def start(self):
+        self._conn, events = self.client.events({'type': ['container']}, since=int(time()) - 1)
+        self._thread = Thread(target=self._record, args=(events,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # Shutting the socket down ends the stream the thread is blocked on
+        if self._conn is not None and self._conn.sock is not None:
+            try:
+                self._conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+        if self._conn is not None:
+            self._conn.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _record(self, events: iter):
+        try:
+            for event in events:
+                name = event.get('Actor', {}).get('Attributes', {}).get('name')
+                if name is None or (self.names is not None and name not in self.names):
+                    continue
+                action = event.get('Action', event.get('status', ''))
+                seconds = event['timeNano'] / 1e9 if 'timeNano' in event else float(event.get('time', 0))
+                self.times.setdefault(name, {}).setdefault(action, seconds)
+                if action == 'die':
+                    self.exit_codes[name] = int(event['Actor']['Attributes'].get('exitCode', -1))
+        except (OSError, ValueError):
+            pass
+
+    def skew(self, action: str='start') -> float:
+        """
+        :param action: the lifecycle event, e.g. start
+        :return: seconds between the first and last container reaching it, or None if none did
+        """
+        times = [t[action] for t in self.times.values() if action in t]
+        return max(times) - min(times) if times else None
+
+
+_default = {}
+_default_lock = Lock()
+
+
+def default_client() -> DockerClient:
+    """
+    The process-wide client for DOCKER_HOST (a unix:// socket) or /var/run/docker.sock
+    :return: the client, or None if the daemon does not answer there, so callers fall back to the docker CLI
+    """
+    host = environ.get('DOCKER_HOST', 'unix://' + DOCKER_SOCKET)
+    socket_path = host[len('unix://'):] if host.startswith('unix://') else None
+    with _default_lock:
+        if host not in _default:
+            client = DockerClient(socket_path) if socket_path and path.exists(socket_path) else None
+            _default[host] = client if client is not None and client.ping() else None
+        return _default[host]
+
+
+if __name__ == '__main__':
+    # Usage: docker_api.py [rm name ...]
+    # Prints the daemon's version, or force-removes the named containers concurrently
+    client = default_client()
+    if client is None:
+        sys.exit('The docker daemon does not answer on its unix socket.')
+    if sys.argv[1:2] == ['rm']:
+        failed = client.remove_many(sys.argv[2:])
+        print(f'removed {len(sys.argv) - 2 - len(failed)}, failed: {failed}')
+        sys.exit(1 if failed else 0)
+    print(json.dumps(client.version()))
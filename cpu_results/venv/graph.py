@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+import matplotlib.pyplot as plt     # visual plotting of data
+import seaborn as sns               # visual plotting of data
+from os import listdir, path        # work with file directory
+import pandas as pd                 # handling data
+import csv                          # create CSVs from data
+import io                           # compare CSVs before rewriting them
+import results_store                # parsed logs, only re-parsed when changed
+from microservice import read_results  # latency and QPS of the microservice victim
+import aggressor                    # the duty-cycle aggressor's kernel and utilisation
+from significance import linpack_samples  # per-trial GFlops of the duty-cycle victims
+
+
+def barplot(filename: str, x_label: str, y_label: str, img_title: str):
+    """
+    Graph barplot from resulting benchmarking measuremnt(s)
+    :param filename: file containing data
+    :param x_label: x label's name
+    :param y_label: y label's name
+    :param img_title: title of saved file
+    """
+    sns.set(style='whitegrid')
+    df = pd.read_csv('./csv/' + filename)
+    # A figure of its own, so bars from earlier plots are not drawn again
+    fig, ax = plt.subplots()
+    sns.barplot(data=df, ax=ax)
+    ax.set(xlabel=x_label, ylabel=y_label)
+
+    # Save plot image, and close it so headless runs do not block or keep every figure open
+    img = './graph/' + img_title
+    fig.savefig(img)
+    plt.close(fig)
+
+
+def create_csv(filename: str, header: [str], data: [float]) -> bool:
+    """
+    Creates CSVs from the data for later use with pandas dataframes
+    :param filename: the new csv filename
+    :param header: the data headers
+    :param data: the data values
+    :return: True if the CSV was written, False if it already held this data
+    """
+    buf = io.StringIO(newline='')
+    wr = csv.writer(buf, delimiter=',', quoting=csv.QUOTE_NONE)
+    wr.writerow(header)
+    wr.writerow(data)
+
+    csvfile = './csv/' + filename
+    if path.exists(csvfile):
+        with open(csvfile, 'r', newline='') as f:
+            if f.read() == buf.getvalue():
+                return False
+
+    with open(csvfile, 'w', newline='') as f:
+        f.write(buf.getvalue())
+    return True
+
+
+def update_plot(filename: str, header: [str], data: [float], x_label: str, y_label: str, img_title: str):
+    """
+    Rewrite the CSV and replot it only when its data changed or the plot is missing
+    :param filename: the csv filename
+    :param header: the data headers
+    :param data: the data values
+    :param x_label: x label's name
+    :param y_label: y label's name
+    :param img_title: title of saved file
+    """
+    if create_csv(filename, header, data) or not path.exists('./graph/' + img_title + '.png'):
+        barplot(filename, x_label=x_label, y_label=y_label, img_title=img_title)
+
+
+def parse_tests():
+    """
+    Parse and graph baseline and other tests
+    """
+    baseline_gflops = []
+    reduced_gflops = []
+    microservice_gflops = []
+    multi_gflops = []
+    lv_ls_gflops = []
+
+    conn = results_store.connect()
+    for f in results_store.ingest(conn):
+        print(f'parsed {f}')
+
+    for f, gflop in results_store.averages(conn):
+        if gflop > 0:
+            if 'baseline' in f:
+                baseline_gflops.append(gflop)
+            elif 'reduced' in f:
+                reduced_gflops.append(gflop)
+            elif 'microservice' in f:
+                microservice_gflops.append(gflop)
+            elif 'multi' in f:
+                multi_gflops.append(gflop)
+            elif 'lv' in f:
+                lv_ls_gflops.append(gflop)
+
+    # Plot barplots
+    baseline_legend = ['Lr2', 'L', 'nL', 'L<r2']
+    reduced_legend = ['L<r base', ' L< ', 'L ', ' L<r2 ', 'Lr2 ', ' L<r2', 'nL ', '  L<r2', 'L<r2 ', ' L<', 'L< ']
+    microservice_legend = ['L', 'Lr2']
+    multi_legend = ['L', 'L', 'Lr2', 'Lr2']
+    lv_ls_legend = ['Lr2 base', 'L base', ' L ', '  L ', ' Lr2', '  Lr2', 'L v s', 'Lr2 v s']
+
+    print(f'\nBaseline GFlops: {baseline_gflops}')
+    filename = 'baseline.csv'
+    update_plot(filename, baseline_legend, baseline_gflops, x_label='Baseline Tests',
+                y_label='Average GFlops per 500 Trials', img_title='baseline_tests')
+
+    print(f'\nReduced Linpack GFlops: {reduced_gflops}')
+    filename = 'reduced.csv'
+    update_plot(filename, reduced_legend, reduced_gflops, x_label='Reduced Linpack Tests',
+                y_label='Average GFlops per 500 Trials', img_title='reduced_tests')
+
+    print(f'Microservice GFlops: {microservice_gflops}')
+    filename = 'microservice.csv'
+    update_plot(filename, microservice_legend, microservice_gflops, x_label='Microservice Tests',
+                y_label='Average GFlops per 500 Trials', img_title='microservice_tests')
+
+    parse_microservice()
+    parse_duty()
+
+    print(f'Multi-core GFlops: {multi_gflops}')
+    filename = 'multi.csv'
+    update_plot(filename, multi_legend, multi_gflops, x_label='Multi-Core Container Tests',
+                y_label='Average GFlops per 500 Trials', img_title='multi_tests')
+
+    print(f'Linpack Versus GFlops: {lv_ls_gflops}')
+    filename = 'lv_ls.csv'
+    update_plot(filename, lv_ls_legend, lv_ls_gflops, x_label='Linpack Versus Tests',
+                y_label='Average GFlops per 500 Trials', img_title='lv_ls_tests')
+
+    conn.close()
+
+
+def parse_microservice(directory: str='./graph_data/microservice/', baseline: str='microservice_base'):
+    """
+    Graph the microservice victim's p99 latency inflation over its uncontended run, and the QPS it achieved
+    :param directory: the directory containing the client logs; the service and aggressors log to other extensions
+    :param baseline: the uncontended run every p99 is divided by
+    """
+    if not path.isdir(directory):
+        return
+    summaries = {}
+    for f in sorted(listdir(directory)):
+        if f.endswith('.log'):
+            summary = read_results(path.join(directory, f))['summary']
+            if summary is not None and summary['p99_ns'] is not None:
+                summaries[path.splitext(f)[0]] = summary
+    if baseline not in summaries:
+        return
+
+    header = list(summaries)
+    inflation = [round(summaries[h]['p99_ns'] / summaries[baseline]['p99_ns'], 4) for h in header]
+    print(f'Microservice p99 inflation: {dict(zip(header, inflation))}')
+    update_plot('microservice_p99.csv', header, inflation, x_label='Microservice Tests',
+                y_label='p99 Latency / Uncontended p99', img_title='microservice_p99')
+
+    qps = [round(summaries[h]['qps'], 2) for h in header]
+    print(f'Microservice QPS: {dict(zip(header, qps))}')
+    update_plot('microservice_qps.csv', header, qps, x_label='Microservice Tests',
+                y_label='Achieved Requests per Second', img_title='microservice_qps')
+
+
+def parse_duty(directory: str='./graph_data/duty/', baseline: str='duty_base'):
+    """
+    Graph the Linpack victim's GFlops drop against the duty-cycle aggressor's utilisation per core, one graph per kernel
+    :param directory: the directory containing the victims' logs, next to their aggressors' .aggressor logs
+    :param baseline: the victim's run alone
+    """
+    base_log = path.join(directory, baseline + '.log')
+    if not path.exists(base_log) or not len(linpack_samples(base_log)):
+        return
+    base = float(linpack_samples(base_log).mean())
+
+    curves = {}
+    for f in sorted(listdir(directory)):
+        victim_log = path.join(directory, path.splitext(f)[0] + '.log')
+        if not f.endswith('.aggressor') or not path.exists(victim_log):
+            continue
+        config = aggressor.read_results(path.join(directory, f))['config']
+        victim = linpack_samples(victim_log)
+        if config is not None and len(victim):
+            drop = 100 * (1 - float(victim.mean()) / base)
+            curves.setdefault(config['kernel'], []).append((config['utilization'], drop))
+
+    for kernel, points in curves.items():
+        points.sort()
+        header = [f'{u:g}%' for u, _ in points]
+        drops = [round(d, 2) for _, d in points]
+        print(f'Linpack drop next to the {kernel} aggressor: {dict(zip(header, drops))}')
+        update_plot(f'duty_{kernel}.csv', header, drops, x_label=f'{kernel} aggressor utilisation per core',
+                    y_label='Linpack GFlops drop (%)', img_title=f'duty_{kernel}')
+
+
+def parse_file(logfile: str) -> float:
+    """
+    Grab the GFlops data from the log and store in data structure for graphing
+    :param logfile: the logfile containing the benchmark results
+    :return: return the gflop measuremnts
+    """
+    start = -1  # Line starting measurement table values
+    average = 0.0
+
+    # Reduce the logfile data to the benchmark measurements
+    with open('./graph_data/' + logfile, 'r') as f:
+        for count, line in enumerate(f):
+            if 'Performance' in line:
+                start = count + 3
+            elif count == start:
+                average = line.split()[3]
+                break
+        f.close()
+
+    return average
+
+
+if __name__ == '__main__':
+    print('\nparsing results...')
+    parse_tests()
+    print('\nDone!')
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+"""
+Run the I/O probe in a victim container while aggressor containers generate I/O against the same
+loop-mounted filesystem, to demonstrate if there is measurable disk and page-cache interference
+and how much cgroup v2 io.max throttling of the aggressors mitigates it
+"""
+
+from subprocess import PIPE, Popen, STDOUT, TimeoutExpired, run  # docker, mount and losetup
+from os import listdir, major, makedirs, minor, path, stat  # loop target and device numbers
+import sys                          # exit status of the whole run
+from container_pool import remove_containers  # leaked containers
+from cpu_benchmarking import build_image, clean_containers  # shared with the CPU suite
+from iobench import read_results    # parse iobench output
+from sampler import Sampler, cgroup_of, container_pid  # counters alongside each run, live io.max
+
+# Graphed summary field of the victims, with its label and scale
+METRICS = [('mbps', 'Throughput (MB/s)', 1), ('p99_ns', 'p99 latency (us)', 1e-3)]
+
+# docker run flags that set io.max in the container's cgroup, per throttled resource
+IO_MAX_FLAGS = {'read_bps': '--device-read-bps', 'write_bps': '--device-write-bps',
+                'read_iops': '--device-read-iops', 'write_iops': '--device-write-iops'}
+
+# io.max keys, per throttled resource
+IO_MAX_KEYS = {'read_bps': 'rbps', 'write_bps': 'wbps', 'read_iops': 'riops', 'write_iops': 'wiops'}
+
+
+def setup_loop_target(image: str='/var/tmp/iobench.img', mountpoint: str='/mnt/iobench', size_mb: int=4096) -> str:
+    """
+    Create an ext4 filesystem in a file, unless it exists, and loop-mount it, so the suite runs on one box
+    :param image: the file backing the filesystem
+    :param mountpoint: where to mount it
+    :param size_mb: the filesystem's size when it is created
+    :return: the loop device, which io.max throttles
+    """
+    if not path.exists(image):
+        run(['truncate', '-s', f'{size_mb}M', image], check=True)
+        run(['mkfs.ext4', '-q', '-F', image], check=True)
+    makedirs(mountpoint, exist_ok=True)
+
+    if path.ismount(mountpoint):
+        return run(['findmnt', '-n', '-o', 'SOURCE', mountpoint], universal_newlines=True, stdout=PIPE,
+                   check=True).stdout.strip()
+
+    device = run(['losetup', '--find', '--show', image], universal_newlines=True, stdout=PIPE,
+                 check=True).stdout.strip()
+    run(['mount', device, mountpoint], check=True)
+    return device
+
+
+def teardown_loop_target(mountpoint: str, device: str):
+    """
+    Unmount the loop target and release its device
+    :param mountpoint: where it is mounted
+    :param device: the loop device
+    """
+    run(['umount', mountpoint])
+    run(['losetup', '-d', device])
+
+
+def io_max_flags(device: str, io_max: dict) -> [str]:
+    """
+    docker run flags throttling a container's I/O to a device, which docker writes to io.max
+    :param device: the block device, e.g. the loop device
+    :param io_max: limits keyed by read_bps, write_bps, read_iops and write_iops
+    :return: the flags
+    """
+    flags = []
+    for key, flag in IO_MAX_FLAGS.items():
+        if io_max.get(key):
+            flags += [flag, f'{device}:{io_max[key]}']
+    return flags
+
+
+def set_io_max(container: str, device: str, io_max: dict):
+    """
+    Change a running container's io.max, e.g. to throttle an aggressor once interference is seen
+    :param container: the container name
+    :param device: the block device
+    :param io_max: limits keyed by read_bps, write_bps, read_iops and write_iops; missing keys are unlimited
+    """
+    pid = container_pid(container)
+    if pid is None:
+        raise ValueError(f'Container {container} is not running.')
+    rdev = stat(device).st_rdev
+    limits = ' '.join(f'{k}={io_max.get(key) or "max"}' for key, k in IO_MAX_KEYS.items())
+    with open(path.join(cgroup_of(pid), 'io.max'), 'w') as f:
+        f.write(f'{major(rdev)}:{minor(rdev)} {limits}\n')
+
+
+def run_iobench(logfile: str, img: str, container_name: str, target: str, device: str=None, pattern: str='rand',
+                op: str='read', block: int=4096, size: int=256, ops: int=None, duration: float=20,
+                direct: bool=False, method: str='pread', io_max: dict=None, cpuset: str=None, timeout: int=600,
+                sample_rate: float=100, mems: str=None) -> dict:
+    """
+    Create and run a container with the iobench image against a file on the target filesystem
+    :param logfile: the file to save iobench's output
+    :param img: the iobench image
+    :param container_name: the container name, which also names its file on the target
+    :param target: the directory of the filesystem under test, mounted into the container at /data
+    :param device: the block device behind target, needed for io_max
+    :param pattern: seq or rand
+    :param op: read or write
+    :param block: bytes per op
+    :param size: MiB of the file the ops range over
+    :param ops: ops to issue, or None to run for duration seconds
+    :param duration: seconds to run when ops is None
+    :param direct: True for O_DIRECT
+    :param method: pread or mmap
+    :param io_max: limits keyed by read_bps, write_bps, read_iops and write_iops, applied through io.max
+    :param cpuset: an explicit --cpuset-cpus list such as '0,2'
+    :param timeout: seconds the container may run before it is stopped
+    :param sample_rate: resource samples per second taken alongside the run, 0 to disable
+    :param mems: an explicit --cpuset-mems list of NUMA nodes, e.g. from topology.plan
+    :return: the parsed measurements
+    """
+    # A container leaked by an earlier run would make docker run --name fail
+    remove_containers([container_name])
+    cmd = ['docker', 'run', '--name', container_name, '-v', path.abspath(target) + ':/data']
+    if cpuset:
+        cmd += ['--cpuset-cpus', cpuset]
+    if mems:
+        cmd += ['--cpuset-mems', mems]
+    if io_max:
+        cmd += io_max_flags(device, io_max)
+    cmd += [img, '--file', f'/data/{container_name}.dat', '--pattern', pattern, '--op', op, '--block', str(block),
+            '--size', str(size), '--duration', str(duration), '--method', method]
+    if ops:
+        cmd += ['--ops', str(ops)]
+    if direct:
+        cmd += ['--direct']
+
+    sampler = None
+    if sample_rate:
+        sampler = Sampler(path.splitext(logfile)[0] + '.samples', sample_rate, container=container_name).start()
+    try:
+        with open(logfile, 'w') as fileout:
+            p = Popen(cmd, universal_newlines=True, stdout=fileout, stderr=STDOUT)
+            try:
+                p.wait(timeout=timeout)
+            except TimeoutExpired:
+                p.kill()
+                p.wait()
+                raise ValueError(f'The iobench process did not finish within {timeout} seconds.')
+    finally:
+        if sampler is not None:
+            sampler.stop()
+
+    if p.returncode != 0:
+        raise ValueError(f'The iobench process did not exit correctly. '
+                         f'Exit Status: {p.returncode} where expecting zero.')
+    return read_results(logfile)
+
+
+def io_tests(img: str, test_name: str, target: str, device: str, timeout: int=600,
+             spec_file: str='io_scenarios.json'):
+    """
+    Run one suite of the I/O scenario spec
+    :param img: the iobench image
+    :param test_name: the suite to run, baseline, contended or mitigated
+    :param target: the directory of the filesystem under test
+    :param device: the block device behind target
+    :param timeout: seconds each container may run before it is stopped
+    :param spec_file: the scenario spec describing each test
+    :return: the names of tests and the exit status of every contender
+    """
+    from scenarios import load_spec, run_matrix
+
+    spec = load_spec(spec_file)
+    spec['defaults'].update(io_image=img, io_target=target, io_device=device, timeout=timeout)
+    spec['scenarios'] = [s for s in spec['scenarios'] if s.get('suite') == test_name]
+    return run_matrix(spec)
+
+
+def io_csvs(directory: str='./graph_data/io/'):
+    """
+    Graph the victims' throughput and p99 latency per run, with one CSV and barplot per metric
+    :param directory: the directory containing the iobench logs; aggressors log to .aggressor files
+    """
+    from graph import update_plot
+
+    for key, y_label, scale in METRICS:
+        header = []
+        data = []
+        for f in sorted(listdir(directory)):
+            if f.endswith('.log'):
+                summary = read_results(path.join(directory, f))['summary']
+                if summary is not None and summary[key] is not None:
+                    header.append(path.splitext(f)[0])
+                    data.append(round(summary[key] * scale, 4))
+        if header:
+            print(f'{y_label}: {dict(zip(header, data))}')
+            update_plot('io_' + key + '.csv', header, data, x_label='I/O Tests', y_label=y_label,
+                        img_title='io_' + key)
+
+
+if __name__ == '__main__':
+
+    # Build the iobench image
+    img = 'manta/iobench'
+    dockerfile = 'Dockerfile.io'
+    print(f'\ncreating ' + img + ' image...')
+    build_image(img, dockerfile)
+
+    # Loop-mounted filesystem shared by the victim and the aggressors
+    target = '/mnt/iobench'
+    print(f'mounting the loop target at ' + target + '...')
+    device = setup_loop_target(mountpoint=target)
+
+    statuses = {}
+    try:
+        for name in ['baseline', 'contended', 'mitigated']:
+            print(f'\nrunning ' + name + ' I/O tests...')
+            names, suite_statuses = io_tests(img, name, target, device)
+            statuses.update(suite_statuses)
+            clean_containers(names)
+    finally:
+        teardown_loop_target(target, device)
+
+    print('\ngraphing I/O results...')
+    io_csvs()
+
+    print('\nDone!')
+    sys.exit(max(statuses.values(), default=0))
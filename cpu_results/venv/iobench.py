@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""
+Sequential and random read/write probes over a file, buffered or O_DIRECT, through pread/pwrite or
+mmap, with per-op latency histograms; run inside a container as the victim or as an I/O aggressor
+"""
+
+import argparse                     # command line options
+import json                         # one result line per measurement
+import mmap                         # aligned buffers and mapped files
+import os                           # raw file descriptors, O_DIRECT and fadvise
+from time import perf_counter_ns, time  # per-op latency and interval boundaries
+import numpy as np                  # offsets, latency arrays and histograms
+
+# Latency histogram buckets per power of two, i.e. quarter-octave resolution
+BUCKETS_PER_OCTAVE = 4
+
+# Latencies recorded per preallocated chunk when the run is bounded by time rather than ops
+CHUNK = 1 << 16
+
+
+def emit(record: dict):
+    """
+    Print one measurement as a JSON line, flushed so the driver sees it as it happens
+    """
+    print(json.dumps(record), flush=True)
+
+
+def prepare(filename: str, size: int, chunk: int=1 << 20):
+    """
+    Make sure the file holds size bytes of data, then drop it from the page cache so every run
+    starts cold
+    :param filename: the target file
+    :param size: bytes the file must hold
+    :param chunk: bytes written at a time
+    """
+    if not os.path.exists(filename) or os.path.getsize(filename) < size:
+        data = np.random.RandomState(533).randint(0, 256, chunk, dtype=np.uint8).tobytes()
+        with open(filename, 'wb') as f:
+            for _ in range(0, size, chunk):
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    fd = os.open(filename, os.O_RDONLY)
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    os.close(fd)
+
+
+def histogram(latencies: np.ndarray) -> [[int, int]]:
+    """
+    Compact log-scale latency histogram
+    :param latencies: per-op latencies in nanoseconds
+    :return: [lower bound in ns, count] for every non-empty bucket
+    """
+    buckets = np.floor(np.log2(np.maximum(latencies, 1)) * BUCKETS_PER_OCTAVE).astype(np.int64)
+    counts = np.bincount(buckets)
+    nonzero = np.nonzero(counts)[0]
+    return [[int(2 ** (b / BUCKETS_PER_OCTAVE)), int(counts[b])] for b in nonzero]
+
+
+def probe(filename: str, pattern: str='rand', op: str='read', block: int=4096, size: int=256 << 20,
+          ops: int=None, duration: float=20, direct: bool=False, method: str='pread', seed: int=533):
+    """
+    Issue one op at a time against the file, timing each, with a throughput record every second
+    :param filename: the target file
+    :param pattern: seq or rand
+    :param op: read or write
+    :param block: bytes per op, a multiple of 4096 for O_DIRECT
+    :param size: bytes of the file the ops range over
+    :param ops: ops to issue, or None to run for duration seconds
+    :param duration: seconds to run when ops is None
+    :param direct: True to bypass the page cache with O_DIRECT
+    :param method: pread (pread/pwrite into an aligned buffer) or mmap (copies to/from a mapping)
+    :param seed: the seed of the random offsets
+    """
+    if direct and method == 'mmap':
+        raise ValueError('O_DIRECT does not apply to mmap.')
+
+    prepare(filename, size)
+    blocks = size // block
+    total = ops or blocks
+    if pattern == 'rand':
+        offsets = np.random.RandomState(seed).randint(0, blocks, total, dtype=np.int64) * block
+    else:
+        offsets = np.arange(total, dtype=np.int64) % blocks * block
+
+    fd = os.open(filename, os.O_RDWR | (os.O_DIRECT if direct else 0))
+    # An anonymous mapping is page aligned, as O_DIRECT needs
+    buf = mmap.mmap(-1, block)
+    buf.write(b'\x5a' * block)
+    mapped = mmap.mmap(fd, size) if method == 'mmap' else None
+
+    chunks = [np.empty(total if ops else CHUNK, dtype=np.int64)]
+    done = 0
+    interval_ops = 0
+    start = perf_counter_ns()
+    interval_start = start
+    deadline = start + int(duration * 1e9)
+
+    try:
+        while (done < ops) if ops is not None else (perf_counter_ns() < deadline):
+            offset = int(offsets[done % total])
+            t0 = perf_counter_ns()
+            if mapped is not None and op == 'read':
+                mapped[offset:offset + block]
+            elif mapped is not None:
+                mapped[offset:offset + block] = buf
+            elif op == 'read':
+                os.preadv(fd, [buf], offset)
+            else:
+                os.pwrite(fd, buf, offset)
+            t1 = perf_counter_ns()
+
+            i = done % CHUNK if ops is None else done
+            if ops is None and i == 0 and done:
+                chunks.append(np.empty(CHUNK, dtype=np.int64))
+            chunks[-1][i] = t1 - t0
+            done += 1
+            interval_ops += 1
+
+            if t1 - interval_start >= 1e9:
+                seconds = (t1 - interval_start) / 1e9
+                emit({'kind': 'interval', 'ops': interval_ops, 'seconds': seconds,
+                      'mbps': interval_ops * block / seconds / 1e6, 'time': time()})
+                interval_start = t1
+                interval_ops = 0
+
+        if op == 'write':
+            # Writes are only complete once they are on the device
+            if mapped is not None:
+                mapped.flush()
+            os.fsync(fd)
+    finally:
+        if mapped is not None:
+            mapped.close()
+        buf.close()
+        os.close(fd)
+
+    seconds = (perf_counter_ns() - start) / 1e9
+    latencies = np.concatenate(chunks)[:done] if ops is None else chunks[0][:done]
+    p50, p90, p99, p999 = (float(v) for v in np.percentile(latencies, [50, 90, 99, 99.9])) if done else [None] * 4
+    emit({'kind': 'summary', 'ops': done, 'bytes': done * block, 'seconds': seconds,
+          'mbps': done * block / seconds / 1e6, 'iops': done / seconds,
+          'p50_ns': p50, 'p90_ns': p90, 'p99_ns': p99, 'p999_ns': p999,
+          'histogram': histogram(latencies) if done else [], 'time': time()})
+
+
+def read_results(logfile: str) -> dict:
+    """
+    Collect the measurements of an iobench log
+    :param logfile: the log holding iobench's JSON lines
+    :return: the config and summary records, and the per-second throughput as an array
+    """
+    results = {'config': None, 'summary': None, 'intervals': []}
+    with open(logfile, 'r') as f:
+        for line in f:
+            if not line.startswith('{'):
+                continue
+            record = json.loads(line)
+            if record['kind'] == 'interval':
+                results['intervals'].append(record['mbps'])
+            else:
+                results[record['kind']] = record
+    results['intervals'] = np.array(results['intervals'])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sequential and random read/write I/O probe')
+    parser.add_argument('--file', required=True, help='the target file, on the filesystem under test')
+    parser.add_argument('--pattern', choices=['seq', 'rand'], default='rand')
+    parser.add_argument('--op', choices=['read', 'write'], default='read')
+    parser.add_argument('--block', type=int, default=4096, help='bytes per op')
+    parser.add_argument('--size', type=int, default=256, help='MiB of the file the ops range over')
+    parser.add_argument('--ops', type=int, default=None, help='ops to issue instead of running for --duration')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--direct', action='store_true', help='bypass the page cache with O_DIRECT')
+    parser.add_argument('--method', choices=['pread', 'mmap'], default='pread')
+    args = parser.parse_args()
+
+    emit({'kind': 'config', 'file': args.file, 'pattern': args.pattern, 'op': args.op, 'block': args.block,
+          'size': args.size << 20, 'direct': args.direct, 'method': args.method})
+    probe(args.file, args.pattern, args.op, args.block, args.size << 20, args.ops, args.duration, args.direct,
+          args.method)
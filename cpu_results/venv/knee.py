@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+"""
+Locate the aggressor intensity at which a victim's throughput drops by a given fraction, bisecting over
+short adaptive runs instead of sweeping a full-length grid, and keep every run as a degradation curve
+"""
+
+import csv                          # knee summary table
+import json                         # search specs
+import math                         # log-scale brackets and grid sizes
+import sys                          # command line arguments
+from time import time               # benchmark seconds per evaluation
+from result_cache import DEFAULT_TTL, ResultCache  # evaluations already run are not run again
+from scenarios import expand, run_scenario  # every evaluation is an ordinary scenario
+from significance import HIGHER_IS_BETTER, load_samples  # the victim's samples, per workload kind
+
+# Fields a search falls back to when it does not set them
+SEARCH_DEFAULTS = {'kind': 'linpack', 'resource': 'cpu', 'scale': 'linear', 'integer': False, 'tolerance': 0.05,
+                   'max_evaluations': 12, 'victim': 0}
+
+KNEE_HEADER = ['Search', 'Resource', 'Kind', 'Target drop', 'Knee', 'Bracket low', 'Bracket high', 'Evaluations',
+               'Benchmark seconds', 'Grid points', 'Grid seconds']
+
+
+def load_spec(filename: str) -> dict:
+    """
+    Read a knee search spec from a JSON file
+    :param filename: the spec file
+    :return: the parsed spec
+    """
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def degradation(baseline: float, victim: float, higher_is_better: bool=True) -> float:
+    """
+    The fraction of the victim's throughput lost to the aggressors; for latency, the throughput a
+    closed-loop client would lose, so both read the same way
+    :param baseline: the victim's mean alone
+    :param victim: the victim's mean next to the aggressors
+    :param higher_is_better: whether the metric is a throughput (True) or a latency (False)
+    :return: 0 for no loss, up to 1
+    """
+    return 1 - victim / baseline if higher_is_better else 1 - baseline / victim
+
+
+def to_scale(x: float, scale: str) -> float:
+    return math.log(x) if scale == 'log' else x
+
+
+def from_scale(u: float, scale: str) -> float:
+    return math.exp(u) if scale == 'log' else u
+
+
+def split(low: float, high: float, d_low: float, d_high: float, target: float, scale: str) -> float:
+    """
+    The next intensity to try: where the target falls between the bracket's drops, as in regula falsi,
+    kept to the middle half of the bracket so a flat or noisy side cannot stall the search
+    :param low: the bracket's intensity below the knee
+    :param high: the bracket's intensity at or above the knee
+    :param d_low: the victim's drop at low
+    :param d_high: the victim's drop at high
+    :param target: the drop being located
+    :param scale: linear or log, the scale the bracket is split in
+    :return: the intensity
+    """
+    u_low, u_high = to_scale(low, scale), to_scale(high, scale)
+    share = (target - d_low) / (d_high - d_low) if d_high > d_low else 0.5
+    share = min(max(share, 0.25), 0.75)
+    return from_scale(u_low + share * (u_high - u_low), scale)
+
+
+class KneeSearch:
+    """
+    One search: a scenario whose contenders use {intensity}, the victim's workload kind and the intensity range
+    """
+
+    def __init__(self, search: dict, defaults: dict, target: float, cache: ResultCache=None):
+        """
+        :param search: the search from the spec, with its name, contenders, low and high intensity, and optionally
+                       its kind, resource, scale, integer, tolerance, max_evaluations, victim, baseline and defaults
+        :param defaults: the spec defaults, which the search's own defaults override
+        :param target: the fraction of victim throughput whose loss marks the knee
+        :param cache: stored results, so evaluations that were already run are read back instead
+        """
+        self.search = dict(SEARCH_DEFAULTS, **search)
+        self.name = self.search['name']
+        self.defaults = dict(defaults, **self.search.get('defaults', {}))
+        self.target = float(self.search.get('target', target))
+        self.cache = cache
+        self.higher_is_better = self.search.get('higher_is_better', HIGHER_IS_BETTER[self.search['kind']])
+        self.timeout = int(self.defaults.get('timeout', 600))
+        self.baseline = None
+        self.points = {}
+        self.seconds = 0.0
+
+    def _measure(self, name: str, contenders: [dict], intensity=None) -> float:
+        """
+        Run one scenario, or read its stored results back, and average the victim's samples
+        :return: the victim's mean
+        """
+        scenario = {'name': name, 'exclusive': True, 'contenders': contenders,
+                    'params': {} if intensity is None else {'intensity': intensity}}
+        expanded, = expand({'defaults': self.defaults, 'scenarios': [scenario]})
+        start = time()
+        statuses = run_scenario(expanded, self.timeout, cache=self.cache)
+        self.seconds += time() - start
+        if any(statuses.values()):
+            raise ValueError(f'{name} failed: ' + ', '.join(n for n, s in statuses.items() if s))
+
+        logfile = expanded['jobs'][int(self.search['victim'])][2]['logfile']
+        samples = load_samples(self.search['kind'], [logfile])
+        if not len(samples):
+            raise ValueError(f'{name}: the victim log {logfile} holds no {self.search["kind"]} samples')
+        return float(samples.mean())
+
+    def evaluate(self, intensity: float) -> float:
+        """
+        The victim's drop at an intensity, measured once per intensity
+        :param intensity: the aggressors' intensity
+        :return: the fraction of the victim's throughput lost
+        """
+        if self.search['integer']:
+            intensity = int(round(intensity))
+        if intensity not in self.points:
+            mean = self._measure(f'{self.name}_{intensity:g}', self.search['contenders'], intensity)
+            self.points[intensity] = (mean, degradation(self.baseline, mean, self.higher_is_better))
+            print(f'{self.name}: intensity {intensity:g}, drop {self.points[intensity][1]:.1%}')
+        return self.points[intensity][1]
+
+    def converged(self, low: float, high: float) -> bool:
+        if self.search['integer'] and high - low <= 1:
+            return True
+        scale = self.search['scale']
+        width = to_scale(float(self.search['high']), scale) - to_scale(float(self.search['low']), scale)
+        return to_scale(high, scale) - to_scale(low, scale) <= self.search['tolerance'] * width
+
+    def grid_points(self) -> int:
+        """
+        :return: the runs a grid over the range, as fine as the search's tolerance, would take
+        """
+        points = int(math.ceil(1 / self.search['tolerance'])) + 1
+        if self.search['integer']:
+            points = min(points, int(self.search['high']) - int(self.search['low']) + 1)
+        return points
+
+    def run(self) -> dict:
+        """
+        Measure the victim alone, then bracket and bisect the knee
+        :return: the knee (None when the high end does not reach the target), the last bracket, the curve of every
+                 evaluated intensity and its drop, and the benchmark seconds spent next to a grid's estimate
+        """
+        # The victim alone, by default the first contender on its own
+        baseline = self.search.get('baseline', [self.search['contenders'][0]])
+        self.baseline = self._measure(f'{self.name}_baseline', baseline)
+
+        low, high = self.search['low'], self.search['high']
+        d_low, d_high = self.evaluate(low), self.evaluate(high)
+        low, high = min(self.points), max(self.points)
+        knee = None
+        if d_low >= self.target:
+            # Already degraded at the lowest intensity
+            knee, high = low, low
+        elif d_high >= self.target:
+            while not self.converged(low, high) and len(self.points) < self.search['max_evaluations']:
+                x = split(low, high, d_low, d_high, self.target, self.search['scale'])
+                d = self.evaluate(x)
+                x = int(round(x)) if self.search['integer'] else x
+                if x in (low, high):
+                    break
+                if d >= self.target:
+                    high, d_high = x, d
+                else:
+                    low, d_low = x, d
+            # Interpolate the knee inside the last bracket
+            share = (self.target - d_low) / (d_high - d_low) if d_high > d_low else 1
+            scale = self.search['scale']
+            knee = from_scale(to_scale(low, scale) + share * (to_scale(high, scale) - to_scale(low, scale)), scale)
+
+        evaluations = len(self.points) + 1
+        return {'name': self.name, 'resource': self.search['resource'], 'kind': self.search['kind'],
+                'target': self.target, 'knee': knee, 'low': low, 'high': high, 'baseline': self.baseline,
+                'curve': sorted((x, mean, d) for x, (mean, d) in self.points.items()),
+                'evaluations': evaluations, 'seconds': self.seconds,
+                'grid_points': self.grid_points(), 'grid_seconds': self.grid_points() * self.seconds / evaluations}
+
+
+def curve_csvs(results: [dict], table: str='./csv/knee.csv'):
+    """
+    Graph every search's degradation curve, and store the knees in one table
+    :param results: results of KneeSearch.run
+    :param table: the CSV holding one row per search
+    """
+    from graph import update_plot
+
+    for r in results:
+        header = [f'{x:g}' for x, _, _ in r['curve']]
+        data = [round(100 * d, 2) for _, _, d in r['curve']]
+        update_plot('knee_' + r['name'] + '.csv', header, data, x_label=f'{r["resource"]} aggressor intensity',
+                    y_label='Victim throughput drop (%)', img_title='knee_' + r['name'])
+
+    with open(table, 'w', newline='') as f:
+        wr = csv.writer(f, delimiter=',')
+        wr.writerow(KNEE_HEADER)
+        for r in results:
+            wr.writerow([r['name'], r['resource'], r['kind'], r['target'], '' if r['knee'] is None else r['knee'],
+                         r['low'], r['high'], r['evaluations'], round(r['seconds'], 1), r['grid_points'],
+                         round(r['grid_seconds'], 1)])
+
+
+if __name__ == '__main__':
+    # Usage: knee.py [knee.json] [--only name] [--target fraction] [--force | --no-cache] [--ttl hours]
+    args = [a for i, a in enumerate(sys.argv[1:], 1)
+            if not a.startswith('--') and sys.argv[i - 1] not in ('--only', '--target', '--ttl')]
+    spec = load_spec(args[0] if args else 'knee.json')
+    target = float(sys.argv[sys.argv.index('--target') + 1]) if '--target' in sys.argv else spec.get('target', 0.1)
+    ttl = float(sys.argv[sys.argv.index('--ttl') + 1]) * 3600 if '--ttl' in sys.argv else DEFAULT_TTL
+    cache = None if '--no-cache' in sys.argv else ResultCache(ttl=ttl, force='--force' in sys.argv)
+    searches = spec['searches']
+    if '--only' in sys.argv:
+        searches = [s for s in searches if s['name'] == sys.argv[sys.argv.index('--only') + 1]]
+
+    results = []
+    for search in searches:
+        r = KneeSearch(search, spec.get('defaults', {}), target, cache).run()
+        results.append(r)
+        knee = 'not reached' if r['knee'] is None else f'{r["knee"]:g}'
+        print(f'{r["name"]} ({r["resource"]}): {r["target"]:.0%} drop at {knee}, {r["evaluations"]} runs in '
+              f'{r["seconds"] / 60:.1f} benchmark-minutes, against about {r["grid_seconds"] / 60:.1f} for a '
+              f'{r["grid_points"]}-point grid')
+    curve_csvs(results)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+"""
+Incrementally parse Linpack output into per-trial columns, keeping running statistics
+so a run's results are ready the moment it ends
+"""
+
+import re                           # match trial and summary rows
+import sys                          # command line arguments
+from time import time               # arrival time of each trial
+import numpy as np                  # columnar per-trial storage
+
+# Size   LDA    Align. Time(s)    GFlops   Residual     Residual(norm) Check
+TRIAL_ROW = re.compile(r'^\s*(\d+)\s+(\d+)\s+(\d+)\s+([\d.]+)\s+([\d.]+)\s+(\S+)\s+(\S+)\s+(pass|fail)\s*$')
+# Size   LDA    Align.  Average  Maximal
+SUMMARY_ROW = re.compile(r'^\s*(\d+)\s+(\d+)\s+(\d+)\s+([\d.]+)\s+([\d.]+)\s*$')
+
+# Two-sided normal quantiles for the confidence levels used by the stopping rule
+Z = {0.9: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+
+class LinpackStream:
+    """
+    File-like sink for pexpect that parses every trial row as it arrives
+    """
+    COLUMNS = ('time', 'gflops', 'residual', 'residual_norm')
+
+    def __init__(self, capacity: int=500):
+        """
+        :param capacity: the number of trials to preallocate room for
+        """
+        self.capacity = max(int(capacity), 1)
+        self.data = {c: np.empty(self.capacity) for c in self.COLUMNS}
+        self.passed = np.empty(self.capacity, dtype=bool)
+        self.timestamps = np.empty(self.capacity)
+        self.trials = 0
+        self.size = None
+        self.average = None
+        self.maximal = None
+        self.stopped = False
+        self._in_summary = False
+        self._partial = ''
+        self._now = np.nan
+
+        # Running statistics (Welford) over the GFlops column
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = np.inf
+
+    def write(self, text: str):
+        """
+        Accept a chunk of output, which may end part way through a line
+        :param text: the chunk of output
+        """
+        # Trials parsed from live output are stamped with their arrival time
+        self._now = time()
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self.feed_line(line)
+
+    def flush(self):
+        """
+        Parse any trailing line that was not terminated by a newline
+        """
+        if self._partial:
+            self.feed_line(self._partial)
+            self._partial = ''
+
+    def feed_line(self, line: str):
+        """
+        Parse a single line of Linpack output
+        :param line: the line, with or without its newline
+        """
+        if 'Performance Summary' in line:
+            self._in_summary = True
+            return
+
+        if self._in_summary:
+            match = SUMMARY_ROW.match(line)
+            if match:
+                self.average = float(match.group(4))
+                self.maximal = float(match.group(5))
+            return
+
+        match = TRIAL_ROW.match(line)
+        if not match:
+            return
+
+        if self.trials == self.capacity:
+            self._grow()
+
+        t = self.trials
+        self.size = int(match.group(1))
+        gflops = float(match.group(5))
+        self.data['time'][t] = float(match.group(4))
+        self.data['gflops'][t] = gflops
+        self.data['residual'][t] = float(match.group(6))
+        self.data['residual_norm'][t] = float(match.group(7))
+        self.passed[t] = match.group(8) == 'pass'
+        self.timestamps[t] = self._now
+        self.trials += 1
+
+        delta = gflops - self._mean
+        self._mean += delta / self.trials
+        self._m2 += delta * (gflops - self._mean)
+        self._min = min(self._min, gflops)
+
+    def _grow(self):
+        """
+        Double the preallocated room when a run has more trials than expected
+        """
+        self.capacity *= 2
+        for c in self.COLUMNS:
+            self.data[c] = np.resize(self.data[c], self.capacity)
+        self.passed = np.resize(self.passed, self.capacity)
+        self.timestamps = np.resize(self.timestamps, self.capacity)
+
+    def halfwidth(self, confidence: float=0.95) -> float:
+        """
+        Half-width of the confidence interval on mean GFlops, relative to the mean
+        :param confidence: 0.9, 0.95 or 0.99
+        :return: e.g. 0.005 for a mean known to within 0.5%, or infinity with fewer than 2 trials
+        """
+        if self.trials < 2 or not self._mean:
+            return np.inf
+        return Z[confidence] * np.sqrt(self._m2 / (self.trials - 1) / self.trials) / self._mean
+
+    def converged(self, target: float, min_trials: int=30, confidence: float=0.95) -> bool:
+        """
+        Sequential stopping rule: enough trials have arrived to know mean GFlops precisely enough
+        :param target: the largest acceptable relative half-width, e.g. 0.005 for 0.5%
+        :param min_trials: trials to wait for before the interval is trusted
+        :param confidence: 0.9, 0.95 or 0.99
+        :return: True once the run can stop
+        """
+        return self.trials >= min_trials and self.halfwidth(confidence) <= target
+
+    def columns(self) -> dict:
+        """
+        :return: the per-trial columns, trimmed to the trials seen so far, with each trial's arrival time
+        """
+        columns = {c: self.data[c][:self.trials] for c in self.COLUMNS}
+        columns['passed'] = self.passed[:self.trials]
+        columns['timestamp'] = self.timestamps[:self.trials]
+        return columns
+
+    def summary(self) -> dict:
+        """
+        Summarise the GFlops series seen so far
+        :return: trials, mean, min, p50, p99, stddev and coefficient of variation, plus Linpack's own summary
+        """
+        gflops = self.data['gflops'][:self.trials]
+        stddev = float(np.sqrt(self._m2 / (self.trials - 1))) if self.trials > 1 else 0.0
+        return {'trials': self.trials,
+                'mean': self._mean if self.trials else None,
+                'min': float(self._min) if self.trials else None,
+                'p50': float(np.percentile(gflops, 50)) if self.trials else None,
+                'p99': float(np.percentile(gflops, 99)) if self.trials else None,
+                'stddev': stddev,
+                'cv': stddev / self._mean if self._mean else None,
+                'average': self.average,
+                'maximal': self.maximal}
+
+    def save(self, filename: str):
+        """
+        Store the per-trial columns next to the text log
+        :param filename: the .npz file to write
+        """
+        np.savez_compressed(filename, **self.columns())
+
+
+def read_log(logfile: str) -> LinpackStream:
+    """
+    Parse an existing Linpack text log
+    :param logfile: the logfile containing the benchmark results
+    :return: the parsed trials
+    """
+    stream = LinpackStream()
+    with open(logfile, 'r') as f:
+        for line in f:
+            stream.feed_line(line)
+    return stream
+
+
+def load_trials(filename: str) -> dict:
+    """
+    Load per-trial columns previously stored with LinpackStream.save
+    :param filename: the .npz file
+    :return: the per-trial columns
+    """
+    with np.load(filename) as data:
+        return {k: data[k] for k in data.files}
+
+
+if __name__ == '__main__':
+    # Usage: linpack_stream.py logfile [logfile ...]
+    for logfile in sys.argv[1:]:
+        print(f'{logfile}: {read_log(logfile).summary()}')
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+"""
+Memory bandwidth, latency and cache-thrashing kernels, run inside a container (or natively)
+with working sets sized relative to the host's L2, L3 and DRAM
+"""
+
+import argparse                     # command line options
+import json                         # one result line per measurement
+from os import listdir, path        # cache sizes from sysfs
+from time import perf_counter, time  # kernel timing and aggressor duration
+import numpy as np                  # vectorised kernels
+
+CACHE_DIR = '/sys/devices/system/cpu/cpu0/cache'
+
+# Sizes assumed when sysfs does not describe the caches
+DEFAULT_CACHES = {'l1': 32 << 10, 'l2': 1 << 20, 'l3': 8 << 20}
+
+# DRAM working sets are this many times the L3, so that they cannot be cache-resident
+DRAM_FACTOR = 8
+
+# Bytes STREAM counts per element for each kernel
+STREAM_BYTES = {'copy': 16, 'scale': 16, 'add': 24, 'triad': 24}
+
+# Least traffic per timed STREAM measurement
+MIN_TIMED_BYTES = 16 << 20
+
+
+def cache_sizes() -> dict:
+    """
+    The data and unified cache sizes of cpu0, per level
+    :return: a dict mapping 'l1', 'l2' and 'l3' to bytes
+    """
+    sizes = dict(DEFAULT_CACHES)
+    if not path.isdir(CACHE_DIR):
+        return sizes
+
+    for index in listdir(CACHE_DIR):
+        d = path.join(CACHE_DIR, index)
+        try:
+            with open(path.join(d, 'level')) as f:
+                level = 'l' + f.read().strip()
+            with open(path.join(d, 'type')) as f:
+                kind = f.read().strip()
+            with open(path.join(d, 'size')) as f:
+                size = f.read().strip()
+        except OSError:
+            continue
+        if kind == 'Instruction' or level not in sizes:
+            continue
+        multiplier = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}.get(size[-1], 1)
+        sizes[level] = int(size.rstrip('KMG')) * multiplier
+    return sizes
+
+
+def working_set(level: str, fraction: float=0.5, caches: dict=None) -> int:
+    """
+    A working-set size relative to a level of the memory hierarchy
+    :param level: l1, l2, l3 or dram
+    :param fraction: the share of that level to use
+    :param caches: cache sizes, read from sysfs when not given
+    :return: the working set in bytes
+    """
+    caches = caches or cache_sizes()
+    if level == 'dram':
+        return int(fraction * DRAM_FACTOR * caches['l3'])
+    return int(fraction * caches[level])
+
+
+def emit(record: dict):
+    """
+    Print one measurement as a JSON line, flushed so the driver sees it as it happens
+    """
+    print(json.dumps(record), flush=True)
+
+
+def stream(nbytes: int, iterations: int=20, scalar: float=3.0):
+    """
+    STREAM copy, scale, add and triad over three arrays sharing the working set
+    :param nbytes: the working set across the three arrays
+    :param iterations: timed passes of every kernel
+    :param scalar: the scale factor
+    """
+    n = max(nbytes // (3 * 8), 1)
+    a = np.full(n, 1.0)
+    b = np.full(n, 2.0)
+    c = np.zeros(n)
+    t = np.empty(n)
+
+    kernels = {'copy': lambda: np.copyto(c, a),
+               'scale': lambda: np.multiply(c, scalar, out=b),
+               'add': lambda: np.add(a, b, out=c),
+               # NumPy needs two passes for a*q+b, but STREAM still counts 24 bytes per element
+               'triad': lambda: np.add(b, np.multiply(c, scalar, out=t), out=a)}
+
+    for i in range(iterations):
+        for kernel, run in kernels.items():
+            # Cache-resident passes take microseconds, so each timing repeats the kernel over MIN_TIMED_BYTES
+            reps = max(MIN_TIMED_BYTES // (STREAM_BYTES[kernel] * n), 1)
+            start = perf_counter()
+            for _ in range(reps):
+                run()
+            seconds = perf_counter() - start
+            moved = STREAM_BYTES[kernel] * n * reps
+            emit({'kernel': kernel, 'iteration': i, 'bytes': moved, 'seconds': seconds,
+                  'gbps': moved / seconds / 1e9, 'time': time()})
+
+
+# Slots of the ring timed alongside every chase, small enough to stay in L1, so its per-step time is the
+# interpreter's own cost
+LOCAL_SLOTS = 64
+
+
+def ring(n: int, rng: np.random.RandomState) -> (np.ndarray, int):
+    """
+    A random cyclic permutation: linking a random order into a ring gives a single cycle, visiting every
+    slot before repeating
+    :param n: the slots
+    :param rng: the random generator
+    :return: the next slot of every slot, and the first slot
+    """
+    order = rng.permutation(n)
+    nxt = np.empty(n, dtype=np.int64)
+    nxt[order[:-1]] = order[1:]
+    nxt[order[-1]] = order[0]
+    return nxt, int(order[0])
+
+
+def walk(chain: memoryview, p: int, steps: int) -> int:
+    """
+    Follow a chain for a number of steps, each load depending on the one before
+    :return: where the walk ended
+    """
+    for _ in range(steps):
+        p = chain[p]
+    return p
+
+
+def chase(nbytes: int, iterations: int=20, steps: int=200000, block: int=10000, seed: int=533):
+    """
+    Pointer-chasing latency probe: one dependent chain over a random cyclic permutation, so every load
+    waits for the one before. Each block of steps is followed by the same walk over an L1-resident ring,
+    and that time, the interpreter's cost per step, is subtracted
+    :param nbytes: the working set of the permutation
+    :param iterations: timed chases
+    :param steps: dependent loads in each chase
+    :param block: steps between switches to the L1-resident ring, so both see the same clock and noise
+    :param seed: the permutation's seed
+    """
+    rng = np.random.RandomState(seed)
+    nxt, p = ring(max(nbytes // 8, 2 * LOCAL_SLOTS), rng)
+    local, q = ring(LOCAL_SLOTS, rng)
+    # Indexing a memoryview loads one element into a Python int, with none of NumPy's scalar overhead
+    chain, local_chain = memoryview(nxt), memoryview(local)
+
+    blocks = max(steps // block, 1)
+    for i in range(iterations):
+        loaded = overhead = 0.0
+        for _ in range(blocks):
+            start = perf_counter()
+            p = walk(chain, p, block)
+            loaded += perf_counter() - start
+            start = perf_counter()
+            q = walk(local_chain, q, block)
+            overhead += perf_counter() - start
+        emit({'kernel': 'chase', 'iteration': i, 'bytes': nxt.nbytes, 'seconds': loaded, 'steps': blocks * block,
+              'ns_per_access': (loaded - overhead) / (blocks * block) * 1e9,
+              'overhead_ns': overhead / (blocks * block) * 1e9, 'time': time()})
+
+
+def thrash(nbytes: int, duration: float=60, stride: int=64):
+    """
+    Cache-thrashing aggressor that writes one word per cache line across its working set until the
+    duration is up
+    :param nbytes: the working set, usually larger than the L3
+    :param duration: seconds to run
+    :param stride: bytes between writes, one cache line
+    """
+    buf = np.zeros(max(nbytes // 8, 1))
+    lines = buf[::max(stride // 8, 1)]
+    deadline = time() + duration
+    passes = 0
+    start = perf_counter()
+    while time() < deadline:
+        lines += 1.0
+        passes += 1
+    seconds = perf_counter() - start
+    emit({'kernel': 'thrash', 'iteration': 0, 'bytes': nbytes, 'seconds': seconds, 'passes': passes,
+          'gbps': 2 * lines.size * stride * passes / seconds / 1e9, 'time': time()})
+
+
+def read_results(logfile: str) -> dict:
+    """
+    Collect the measurements of a membench log
+    :param logfile: the log holding membench's JSON lines
+    :return: the config record, plus per kernel the arrays of its metric (GB/s, or ns/access for chase)
+             and of the measurements' times
+    """
+    results = {'config': None}
+    with open(logfile, 'r') as f:
+        for line in f:
+            if not line.startswith('{'):
+                continue
+            record = json.loads(line)
+            if record['kernel'] == 'config':
+                results['config'] = record
+                continue
+            metric = record['ns_per_access'] if record['kernel'] == 'chase' else record['gbps']
+            values, times = results.setdefault(record['kernel'], ([], []))
+            values.append(metric)
+            times.append(record['time'])
+
+    for kernel in results:
+        if kernel != 'config':
+            values, times = results[kernel]
+            results[kernel] = {'values': np.array(values), 'time': np.array(times)}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory bandwidth, latency and cache-thrashing kernels')
+    parser.add_argument('--kernel', choices=['stream', 'chase', 'thrash'], default='stream')
+    parser.add_argument('--level', choices=['l1', 'l2', 'l3', 'dram'], default='l3')
+    parser.add_argument('--fraction', type=float, default=0.5, help='share of the level used as the working set')
+    parser.add_argument('--bytes', type=int, default=None, help='an explicit working set, instead of level')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=60, help='seconds the thrash aggressor runs')
+    args = parser.parse_args()
+
+    caches = cache_sizes()
+    nbytes = args.bytes or working_set(args.level, args.fraction, caches)
+    emit({'kernel': 'config', 'level': args.level, 'fraction': args.fraction, 'bytes': nbytes, 'caches': caches})
+
+    if args.kernel == 'stream':
+        stream(nbytes, args.iterations)
+    elif args.kernel == 'chase':
+        chase(nbytes, args.iterations)
+    else:
+        thrash(nbytes, args.duration)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+Run the STREAM, pointer-chasing and cache-thrashing kernels in containers to demonstrate
+if there is measurable memory bandwidth and cache interference across various experiments
+"""
+
+from subprocess import Popen, STDOUT, TimeoutExpired  # run the membench containers
+from os import listdir, path        # per-run samples next to each log
+import sys                          # exit status of the whole run
+from container_pool import ContainerPool, remove_containers  # warm containers and teardown
+from cpu_benchmarking import build_image, clean_containers  # shared with the CPU suite
+from membench import read_results   # parse membench output
+from sampler import Sampler         # host and container counters alongside each run
+
+# Graphed metric of each kernel, with its unit
+METRICS = [('copy', 'Copy GB/s'), ('scale', 'Scale GB/s'), ('add', 'Add GB/s'), ('triad', 'Triad GB/s'),
+           ('chase', 'ns per access')]
+
+
+def run_membench(logfile: str, img: str, container_name: str, kernel: str='stream', level: str='l3',
+                 fraction: float=0.5, iterations: int=20, duration: float=60, cpuset: str=None, timeout: int=600,
+                 sample_rate: float=100, pool: ContainerPool=None, mems: str=None) -> dict:
+    """
+    Create and run a container with the membench image
+    :param logfile: the file to save membench's output
+    :param img: the membench image
+    :param container_name: the container name
+    :param kernel: stream, chase or thrash
+    :param level: l1, l2, l3 or dram, which the working set is sized against
+    :param fraction: the share of that level used as the working set
+    :param iterations: timed passes of the stream or chase kernels
+    :param duration: seconds a thrash aggressor runs
+    :param cpuset: an explicit --cpuset-cpus list such as '0,2'
+    :param timeout: seconds the container may run before it is stopped
+    :param sample_rate: resource samples per second taken alongside the run, 0 to disable
+    :param pool: warm containers to docker exec the kernels in, instead of running a new container
+    :param mems: an explicit --cpuset-mems list of NUMA nodes, e.g. from topology.plan
+    :return: the parsed measurements
+    """
+    args = ['--kernel', kernel, '--level', level, '--fraction', str(fraction), '--iterations', str(iterations),
+            '--duration', str(duration)]
+
+    if pool is not None:
+        container_name = pool.acquire(img, cpuset, mems)
+        cmd = pool.exec_command(container_name, img, tty=False).split() + args
+    else:
+        # A container leaked by an earlier run would make docker run --name fail
+        remove_containers([container_name])
+        cmd = ['docker', 'run', '--name', container_name]
+        if cpuset:
+            cmd += ['--cpuset-cpus', cpuset]
+        if mems:
+            cmd += ['--cpuset-mems', mems]
+        cmd += [img] + args
+
+    sampler = None
+    if sample_rate:
+        sampler = Sampler(path.splitext(logfile)[0] + '.samples', sample_rate, container=container_name).start()
+    healthy = False
+    try:
+        with open(logfile, 'w') as fileout:
+            p = Popen(cmd, universal_newlines=True, stdout=fileout, stderr=STDOUT)
+            try:
+                p.wait(timeout=timeout)
+            except TimeoutExpired:
+                p.kill()
+                p.wait()
+                raise ValueError(f'The membench process did not finish within {timeout} seconds.')
+
+        if p.returncode != 0:
+            raise ValueError(f'The membench process did not exit correctly. '
+                             f'Exit Status: {p.returncode} where expecting zero.')
+        healthy = True
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if pool is not None and healthy:
+            pool.release(container_name, img, cpuset, mems)
+        elif pool is not None:
+            pool.discard(container_name)
+
+    return read_results(logfile)
+
+
+def memory_tests(img: str, test_name: str, timeout: int=600, spec_file: str='memory_scenarios.json'):
+    """
+    Run one suite of the memory scenario spec
+    :param img: the membench image
+    :param test_name: the suite to run, baseline or contended
+    :param timeout: seconds each container may run before it is stopped
+    :param spec_file: the scenario spec describing each test
+    :return: the names of tests and the exit status of every contender
+    """
+    from scenarios import load_spec, run_matrix
+
+    spec = load_spec(spec_file)
+    spec['defaults'].update(memory_image=img, timeout=timeout)
+    spec['scenarios'] = [s for s in spec['scenarios'] if s.get('suite') == test_name]
+    return run_matrix(spec)
+
+
+def memory_csvs(directory: str='./graph_data/memory/'):
+    """
+    Graph the mean of every kernel's metric per run, with one CSV and barplot per kernel
+    :param directory: the directory containing the membench logs
+    """
+    from graph import update_plot
+
+    columns = {kernel: ([], []) for kernel, _ in METRICS}
+    for f in sorted(listdir(directory)):
+        if not f.endswith('.log'):
+            continue
+        results = read_results(path.join(directory, f))
+        for kernel, _ in METRICS:
+            if kernel in results:
+                columns[kernel][0].append(path.splitext(f)[0])
+                columns[kernel][1].append(round(float(results[kernel]['values'].mean()), 4))
+
+    for kernel, y_label in METRICS:
+        header, data = columns[kernel]
+        if header:
+            print(f'{y_label}: {dict(zip(header, data))}')
+            update_plot('memory_' + kernel + '.csv', header, data, x_label='Memory Tests', y_label=y_label,
+                        img_title='memory_' + kernel)
+
+
+if __name__ == '__main__':
+
+    # Build the membench image, and the Linpack and stress images used as aggressors
+    img = 'manta/membench'
+    for image, dockerfile in [(img, 'Dockerfile.mem'), ('manta/linpack', 'Dockerfile.lp'),
+                              ('manta/stress', 'Dockerfile.st')]:
+        print(f'creating ' + image + ' image...')
+        build_image(image, dockerfile)
+
+    # Baseline and contended tests
+    statuses = {}
+    for name in ['baseline', 'contended']:
+        print(f'\nrunning ' + name + ' memory tests...')
+        names, suite_statuses = memory_tests(img, name)
+        statuses.update(suite_statuses)
+        clean_containers(names)
+
+    print('\ngraphing memory results...')
+    memory_csvs()
+
+    print('\nDone!')
+    sys.exit(max(statuses.values(), default=0))
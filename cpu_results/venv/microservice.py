@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+"""
+A latency-sensitive request/response service with a fixed CPU cost per request, and an open-loop client
+recording per-request latency; run inside containers as the victim of CPU interference
+"""
+
+import argparse                     # command line options
+import asyncio                      # one event loop for the service and for the client's connections
+import json                         # one result line per measurement
+import struct                       # fixed-size request and response frames
+from time import perf_counter_ns, time  # request due times, latency and service time
+import numpy as np                  # latency arrays and percentiles
+from iobench import histogram       # the same log-scale latency histogram as the I/O probe
+
+# Request: its sequence number. Response: the sequence number and the service time in ns
+REQUEST = struct.Struct('!Q')
+RESPONSE = struct.Struct('!QQ')
+
+# Percentiles in every interval and summary record
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def emit(record: dict):
+    """
+    Print one measurement as a JSON line, flushed so the driver sees it as it happens
+    """
+    print(json.dumps(record), flush=True)
+
+
+def spin(work: int) -> int:
+    """
+    The CPU cost of one request: a fixed number of integer steps, so that time slicing with a noisy
+    neighbour stretches the service time instead of the amount of work
+    :param work: the number of steps
+    :return: the final state, so the loop cannot be skipped
+    """
+    x = 533
+    for _ in range(work):
+        x = (x * 1103515245 + 12345) & 0x7fffffff
+    return x
+
+
+def percentiles(latencies: np.ndarray) -> dict:
+    """
+    :param latencies: latencies in nanoseconds
+    :return: p50_ns, p90_ns, p99_ns and p999_ns, or None for each when there are none
+    """
+    values = np.percentile(latencies, PERCENTILES) if len(latencies) else [None] * len(PERCENTILES)
+    return {'p' + str(p).replace('.', '') + '_ns': None if v is None else float(v)
+            for p, v in zip(PERCENTILES, values)}
+
+
+async def serve(port: int, work: int, duration: float):
+    """
+    Answer requests until every client has disconnected, or until duration has passed
+    :param port: the TCP port to listen on, on every address
+    :param work: the CPU cost of each request, in spin steps
+    :param duration: the longest the service runs, in seconds, when no client comes or leaves
+    """
+    service = []
+    clients = {'open': 0, 'seen': 0}
+    done = asyncio.Event()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        clients['open'] += 1
+        clients['seen'] += 1
+        try:
+            while True:
+                seq, = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                # Requests are served one at a time, like a single-threaded worker
+                start = perf_counter_ns()
+                spin(work)
+                elapsed = perf_counter_ns() - start
+                service.append(elapsed)
+                writer.write(RESPONSE.pack(seq, elapsed))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            clients['open'] -= 1
+            if clients['open'] == 0:
+                done.set()
+
+    server = await asyncio.start_server(handle, port=port, reuse_address=True)
+    started = time()
+    try:
+        await asyncio.wait_for(done.wait(), duration)
+    except asyncio.TimeoutError:
+        pass
+    server.close()
+
+    service = np.array(service, dtype=np.int64)
+    emit(dict({'kind': 'server', 'requests': len(service), 'clients': clients['seen'], 'seconds': time() - started,
+               'mean_ns': float(service.mean()) if len(service) else None,
+               'histogram': histogram(service) if len(service) else []}, **percentiles(service)))
+
+
+async def connect(host: str, port: int, wait: float) -> (asyncio.StreamReader, asyncio.StreamWriter):
+    """
+    Connect to the service, retrying while its container starts
+    :param host: the service's address
+    :param port: the service's port
+    :param wait: seconds to keep retrying
+    :return: the connection's reader and writer
+    """
+    deadline = time() + wait
+    while True:
+        try:
+            return await asyncio.open_connection(host, port)
+        except OSError:
+            if time() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def load(host: str, port: int, rate: float, connections: int, duration: float, wait: float=30,
+               drain: float=5) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Send requests open-loop at a constant rate: request i is due at start + i / rate whether or not earlier
+    ones have been answered, and its latency is measured from when it was due, so queueing behind a stalled
+    service is counted rather than hidden by requests that were never sent
+    :param host: the service's address
+    :param port: the service's port
+    :param rate: requests per second
+    :param connections: persistent connections the requests are spread over
+    :param duration: seconds to send requests for
+    :param wait: seconds to keep retrying the first connections while the service starts
+    :param drain: seconds to wait for outstanding responses once the last request is due
+    :return: every request's due time and latency, in ns, and whether it was answered; a request still
+             unanswered when the drain is over is recorded as waiting until then, so the stalls it stands for
+             stay in the percentiles
+    """
+    streams = [await connect(host, port, wait) for _ in range(connections)]
+    due = asyncio.Queue()
+    total = int(rate * duration)
+    times = np.zeros(total, dtype=np.int64)
+    latencies = np.full(total, -1, dtype=np.int64)
+
+    async def worker(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            seq = await due.get()
+            writer.write(REQUEST.pack(seq))
+            await reader.readexactly(RESPONSE.size)
+            latencies[seq] = perf_counter_ns() - times[seq]
+            due.task_done()
+
+    workers = [asyncio.ensure_future(worker(r, w)) for r, w in streams]
+    start = perf_counter_ns()
+    for seq in range(total):
+        times[seq] = start + int(seq * 1e9 / rate)
+        delay = (times[seq] - perf_counter_ns()) / 1e9
+        if delay > 0:
+            await asyncio.sleep(delay)
+        due.put_nowait(seq)
+
+    try:
+        await asyncio.wait_for(due.join(), drain)
+    except asyncio.TimeoutError:
+        pass
+    for w in workers:
+        w.cancel()
+    given_up = perf_counter_ns()
+    for _, writer in streams:
+        writer.close()
+
+    answered = latencies >= 0
+    latencies[~answered] = given_up - times[~answered]
+    return times - start, latencies, answered
+
+
+def report(rate: float, duration: float, times: np.ndarray, latencies: np.ndarray, answered: np.ndarray):
+    """
+    Emit one record per second of requests, by when they were due, and the run's summary; requests and QPS
+    count the answered requests, the latencies include the unanswered ones at their lower bound
+    :param rate: the requested rate
+    :param duration: the seconds requests were sent for
+    :param times: the due times of the requests, in ns from the start
+    :param latencies: their latencies in ns
+    :param answered: whether each request was answered
+    """
+    seconds = times // 1000000000
+    for second in range(int(np.ceil(duration))):
+        window = seconds == second
+        done = int(answered[window].sum())
+        emit(dict({'kind': 'interval', 'second': second, 'requests': done, 'qps': float(done)},
+                  **percentiles(latencies[window])))
+
+    done = int(answered.sum())
+    emit(dict({'kind': 'summary', 'rate': rate, 'requests': done, 'unanswered': len(latencies) - done,
+               'seconds': duration, 'qps': done / duration,
+               'mean_ns': float(latencies.mean()) if len(latencies) else None,
+               'histogram': histogram(latencies) if len(latencies) else [], 'time': time()},
+              **percentiles(latencies)))
+
+
+def read_results(logfile: str) -> dict:
+    """
+    Collect the measurements of a microservice log
+    :param logfile: the log holding the client's or the service's JSON lines
+    :return: the config, summary and server records, and the per-second QPS and p99 latency as arrays
+    """
+    results = {'config': None, 'summary': None, 'server': None, 'qps': [], 'p99_ns': []}
+    with open(logfile, 'r') as f:
+        for line in f:
+            if not line.startswith('{'):
+                continue
+            record = json.loads(line)
+            if record['kind'] == 'interval':
+                results['qps'].append(record['qps'])
+                results['p99_ns'].append(np.nan if record['p99_ns'] is None else record['p99_ns'])
+            else:
+                results[record['kind']] = record
+    results['qps'] = np.array(results['qps'])
+    results['p99_ns'] = np.array(results['p99_ns'])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Request/response service with a fixed CPU cost per request, '
+                                                 'and its open-loop client')
+    parser.add_argument('role', choices=['server', 'client'])
+    parser.add_argument('--host', default='127.0.0.1', help="the service's address, for the client")
+    parser.add_argument('--port', type=int, default=8533)
+    parser.add_argument('--work', type=int, default=2000, help='spin steps per request, for the server')
+    parser.add_argument('--rate', type=float, default=500, help='requests per second, for the client')
+    parser.add_argument('--connections', type=int, default=8, help='connections the client spreads requests over')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds the client sends for, or the longest the server waits for it')
+    args = parser.parse_args()
+
+    emit({'kind': 'config', 'role': args.role, 'host': args.host, 'port': args.port, 'work': args.work,
+          'rate': args.rate, 'connections': args.connections, 'duration': args.duration})
+    if args.role == 'server':
+        asyncio.run(serve(args.port, args.work, args.duration))
+    else:
+        report(args.rate, args.duration,
+               *asyncio.run(load(args.host, args.port, args.rate, args.connections, args.duration)))
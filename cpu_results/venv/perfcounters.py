@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+
+"""
+Count hardware and software events (cycles, instructions, LLC loads and misses, context switches, CPU
+migrations) for a container's cgroup with perf_event_open, and join them with the Linpack trials so a
+GFlops drop can be attributed to cache contention (IPC falls) or time-slicing (CPU share falls)
+"""
+
+import ctypes                       # the perf_event_open system call
+import json                         # column description next to the counters
+import os                           # event file descriptors
+import platform                     # system call number per architecture
+import struct                       # perf_event_attr and read_format layouts
+import sys                          # command line arguments
+from os import path                 # per-run files next to each log
+from threading import Event, Thread  # reading thread
+from time import thread_time, time  # reader overhead and clock
+import numpy as np                  # counter rows and per-trial series
+from sampler import cgroup_of, container_pid, load_samples  # resolve containers, shared file format
+from topology import SYSFS, parse_cpulist  # cpus to open per-cpu events on
+
+COLUMNS = ('time', 'time_enabled', 'time_running',
+           # hardware events, scaled for multiplexing
+           'cycles', 'instructions', 'llc_loads', 'llc_misses',
+           # software events; task_clock in nanoseconds
+           'context_switches', 'cpu_migrations', 'task_clock', 'page_faults')
+
+PERF_TYPE_HARDWARE = 0
+PERF_TYPE_SOFTWARE = 1
+PERF_TYPE_HW_CACHE = 3
+# (type, config) per counter; LLC configs are cache LL | op read << 8 | result << 16
+EVENTS = {'cycles': (PERF_TYPE_HARDWARE, 0),
+          'instructions': (PERF_TYPE_HARDWARE, 1),
+          'llc_loads': (PERF_TYPE_HW_CACHE, 0x00002),
+          'llc_misses': (PERF_TYPE_HW_CACHE, 0x10002),
+          'context_switches': (PERF_TYPE_SOFTWARE, 3),
+          'cpu_migrations': (PERF_TYPE_SOFTWARE, 4),
+          'task_clock': (PERF_TYPE_SOFTWARE, 1),
+          'page_faults': (PERF_TYPE_SOFTWARE, 2)}
+HARDWARE = ('cycles', 'instructions', 'llc_loads', 'llc_misses')
+
+PERF_FORMAT_TOTAL_TIME_ENABLED = 1
+PERF_FORMAT_TOTAL_TIME_RUNNING = 2
+PERF_FORMAT_GROUP = 8
+PERF_FLAG_PID_CGROUP = 4
+PERF_FLAG_FD_CLOEXEC = 8
+SYSCALL = {'x86_64': 298, 'aarch64': 241, 'i686': 336, 'armv7l': 364, 'ppc64le': 319, 's390x': 331}
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def perf_event_open(counter: str, cgroup_fd: int, cpu: int, group_fd: int=-1) -> int:
+    """
+    Open one counting event for every task of a cgroup on one cpu
+    :param counter: a name from EVENTS
+    :param cgroup_fd: an open file descriptor of the cgroup v2 directory
+    :param cpu: the cpu to count on; cgroup events are always per cpu
+    :param group_fd: the group leader, or -1 to start a new group
+    :return: the event's file descriptor
+    """
+    if platform.machine() not in SYSCALL:
+        raise OSError(f'perf_event_open is not known on {platform.machine()}')
+    kind, config = EVENTS[counter]
+    read_format = PERF_FORMAT_GROUP | PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING
+    # perf_event_attr up to config1 (PERF_ATTR_SIZE_VER0); every flag clear, so it counts straight away
+    attr = ctypes.create_string_buffer(struct.pack('IIQQQQQIIQ', kind, 64, config, 0, 0, read_format, 0, 0, 0, 0),
+                                       64)
+    fd = _libc.syscall(SYSCALL[platform.machine()], attr, cgroup_fd, cpu, group_fd,
+                       PERF_FLAG_PID_CGROUP | PERF_FLAG_FD_CLOEXEC)
+    if fd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f'{counter}: {os.strerror(errno)}')
+    return fd
+
+
+def proc_counters(tids: [int]) -> dict:
+    """
+    Software counters summed over threads from /proc, for hosts where perf_event_open is not allowed
+    :param tids: the thread ids, e.g. from the cgroup's cgroup.threads
+    :return: context switches, cpu migrations and CPU time in nanoseconds; threads that have exited are lost
+    """
+    totals = {'context_switches': 0.0, 'cpu_migrations': 0.0, 'task_clock': 0.0}
+    migrations = False
+    tick = 1e9 / os.sysconf('SC_CLK_TCK')
+    for tid in tids:
+        try:
+            with open(f'/proc/{tid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith(('voluntary_ctxt_switches', 'nonvoluntary_ctxt_switches')):
+                        totals['context_switches'] += float(line.split()[1])
+            with open(f'/proc/{tid}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+                totals['task_clock'] += (float(fields[11]) + float(fields[12])) * tick
+            # se.nr_migrations is only there on kernels built with CONFIG_SCHED_DEBUG
+            if path.exists(f'/proc/{tid}/sched'):
+                with open(f'/proc/{tid}/sched', 'r') as f:
+                    for line in f:
+                        if line.startswith('se.nr_migrations'):
+                            totals['cpu_migrations'] += float(line.split(':')[1])
+                            migrations = True
+        except (OSError, IndexError, ValueError):
+            continue
+    if not migrations:
+        totals['cpu_migrations'] = np.nan
+    return totals
+
+
+class Counters:
+    """
+    Background reader of one cgroup's event counters, batched at a low rate so the cost stays well under 1%
+    """
+
+    def __init__(self, filename: str, rate: float=10, container: str=None, cgroup: str=None, cpus: str=None,
+                 sysfs: str=SYSFS, capacity: int=1024):
+        """
+        :param filename: the binary file to write rows of float64 counters to, in the sampler.py format
+        :param rate: reads per second
+        :param container: a container to count; its cgroup is resolved once it is running
+        :param cgroup: a cgroup v2 directory to count, if any
+        :param cpus: the cpus the cgroup runs on, e.g. the container's cpuset; all online cpus by default
+        :param sysfs: the system directory listing online cpus
+        :param capacity: rows preallocated, grown as needed
+        """
+        self.filename = filename
+        self.period = 1.0 / rate
+        self.container = container
+        self.cgroup = cgroup
+        self.cpus = parse_cpulist(cpus) if cpus else self._online(sysfs)
+        self.mode = None
+        self.counters = []
+        self.reason = None
+        self.rows = np.full((max(capacity, 2), len(COLUMNS)), np.nan)
+        self.count = 0
+        self._groups = []
+        self._cgroup_fd = None
+        self._cpu_seconds = 0.0
+        self._next_resolve = 0.0
+        self._started = None
+        self._stop = Event()
+        self._thread = Thread(target=self._read, daemon=True)
+
+    @staticmethod
+    def _online(sysfs: str) -> [int]:
+        with open(path.join(sysfs, 'cpu', 'online'), 'r') as f:
+            return parse_cpulist(f.read())
+
+    def start(self):
+        """
+        Start counting in the background
+        """
+        self._started = time()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Take a last reading, close every event and write the counters and their description
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self._close()
+        if self.mode is None:
+            self.reason = self.reason or 'the cgroup was never found'
+
+        self.rows[:self.count].tofile(self.filename)
+        elapsed = time() - self._started
+        with open(self.filename + '.json', 'w') as f:
+            json.dump({'columns': COLUMNS, 'rate': 1.0 / self.period, 'container': self.container,
+                       'cgroup': self.cgroup, 'cpus': self.cpus, 'mode': self.mode, 'counters': self.counters,
+                       'reason': self.reason, 'overhead': self._cpu_seconds / elapsed if elapsed else None}, f)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _open(self) -> bool:
+        """
+        Open one event group per cpu, falling back from hardware to software events to /proc
+        :return: True once the cgroup is known and counting has begun
+        """
+        if self.cgroup is None and self.container is not None:
+            # A container that cannot be looked up (e.g. no docker CLI) is not found yet, rather than a failed open
+            try:
+                pid = container_pid(self.container)
+                self.cgroup = cgroup_of(pid) if pid is not None else None
+            except (OSError, ValueError) as e:
+                self.reason = str(e)
+        if self.cgroup is None:
+            return False
+
+        try:
+            self._cgroup_fd = os.open(self.cgroup, os.O_RDONLY)
+        except OSError as e:
+            self.reason = str(e)
+            self.mode = 'proc'
+            return True
+
+        # Probe each event once, so unsupported ones (e.g. LLC events in a VM) are simply left out
+        available = []
+        for counter in EVENTS:
+            try:
+                os.close(perf_event_open(counter, self._cgroup_fd, self.cpus[0]))
+                available.append(counter)
+            except OSError as e:
+                self.reason = self.reason or str(e)
+        if not available:
+            self.mode = 'proc'
+            return True
+        self.mode = 'hardware' if {'cycles', 'instructions'} <= set(available) else 'software'
+        if self.mode == 'software':
+            available = [c for c in available if c not in HARDWARE]
+        self.counters = available
+
+        for cpu in self.cpus:
+            fds = []
+            for counter in available:
+                fds.append(perf_event_open(counter, self._cgroup_fd, cpu, fds[0] if fds else -1))
+            self._groups.append((cpu, fds))
+        return True
+
+    def _close(self):
+        for _, fds in self._groups:
+            for fd in fds:
+                os.close(fd)
+        self._groups = []
+        if self._cgroup_fd is not None:
+            os.close(self._cgroup_fd)
+            self._cgroup_fd = None
+
+    def _tick(self, row: np.ndarray):
+        """
+        Fill one row with the counters summed over cpus, leaving unavailable ones as NaN
+        """
+        row[:] = np.nan
+        row[0] = time()
+        if self.cgroup is None:
+            return
+        if self.mode == 'proc':
+            try:
+                with open(path.join(self.cgroup, 'cgroup.threads'), 'r') as f:
+                    tids = [int(t) for t in f.read().split()]
+            except OSError:
+                return
+            for counter, value in proc_counters(tids).items():
+                row[COLUMNS.index(counter)] = value
+            return
+
+        # One read per cpu returns the whole group: nr, time_enabled, time_running, values...
+        totals = np.zeros(len(self.counters) + 2)
+        for _, fds in self._groups:
+            data = struct.unpack(f'{3 + len(self.counters)}Q', os.read(fds[0], 8 * (3 + len(self.counters))))
+            enabled, running, values = data[1], data[2], np.array(data[3:], dtype=float)
+            # A group multiplexed off the PMU part of the time is scaled up to the whole window
+            totals[2:] += values * (enabled / running) if running else 0.0
+            totals[:2] += enabled, running
+        row[1:3] = totals[:2]
+        for counter, value in zip(self.counters, totals[2:]):
+            row[COLUMNS.index(counter)] = value
+
+    def _grow(self):
+        self.rows = np.concatenate([self.rows, np.full(self.rows.shape, np.nan)])
+
+    def _read(self):
+        """
+        Reading thread: open the events once the cgroup exists, then one row per period and one at the end
+        """
+        opened = False
+        while True:
+            stopping = self._stop.wait(self.period)
+            began = thread_time()
+            # Look the container up at most twice a second until it is running
+            if not opened and time() >= self._next_resolve:
+                self._next_resolve = time() + 0.5
+                try:
+                    opened = self._open()
+                except OSError as e:
+                    # e.g. an event that opened on the first cpu but not on another
+                    self._close()
+                    self.reason = str(e)
+                    self.mode = 'proc'
+                    self.counters = []
+                    opened = True
+            if opened:
+                if self.count == len(self.rows):
+                    self._grow()
+                self._tick(self.rows[self.count])
+                self.count += 1
+            self._cpu_seconds += thread_time() - began
+            if stopping:
+                break
+
+
+def probe(cgroup: str, cpus: str=None) -> dict:
+    """
+    Find out which events a cgroup can be counted with on this host
+    :param cgroup: the cgroup v2 directory
+    :param cpus: the cpus to open events on, all online cpus by default
+    :return: the mode (hardware, software or proc), the counters opened and why others were not
+    """
+    counters = Counters(os.devnull, cgroup=cgroup, cpus=cpus)
+    try:
+        counters._open()
+    except OSError as e:
+        counters.reason = str(e)
+    counters._close()
+    return {'cgroup': cgroup, 'mode': counters.mode, 'counters': counters.counters, 'reason': counters.reason}
+
+
+def per_trial(trials: dict, counters: dict) -> dict:
+    """
+    Join counters with the Linpack trials: each trial spans the time since the previous trial arrived
+    :param trials: per-trial columns from LinpackStream.columns or load_trials
+    :param counters: counter columns from load_samples
+    :return: per-trial gflops, ipc, llc_miss_rate, llc_mpki, context_switches_per_sec, cpu_migrations_per_sec
+        and cpus_busy (task clock over wall clock); NaN where a counter or the trial's start is unknown
+    """
+    t = trials['timestamp']
+    joined = {'timestamp': t, 'gflops': trials['gflops']}
+    delta = {}
+    for c in COLUMNS[3:]:
+        if len(counters['time']) < 2 or np.isnan(counters[c]).all():
+            delta[c] = np.full(len(t), np.nan)
+            continue
+        at = np.interp(t, counters['time'], counters[c], left=np.nan, right=np.nan)
+        delta[c] = np.concatenate(([np.nan], np.diff(at)))[:len(t)]
+    seconds = np.concatenate(([np.nan], np.diff(t)))[:len(t)]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        joined['ipc'] = delta['instructions'] / delta['cycles']
+        joined['llc_miss_rate'] = delta['llc_misses'] / delta['llc_loads']
+        joined['llc_mpki'] = 1e3 * delta['llc_misses'] / delta['instructions']
+        joined['context_switches_per_sec'] = delta['context_switches'] / seconds
+        joined['cpu_migrations_per_sec'] = delta['cpu_migrations'] / seconds
+        joined['cpus_busy'] = delta['task_clock'] / 1e9 / seconds
+    return joined
+
+
+def join_trials(trials: dict, counters_file: str, filename: str) -> dict:
+    """
+    Join a run's trials with its counters and store the per-trial series
+    :param trials: per-trial columns
+    :param counters_file: the file written by Counters
+    :param filename: the .npz file to write
+    :return: the per-trial series
+    """
+    joined = per_trial(trials, load_samples(counters_file))
+    np.savez_compressed(filename, **joined)
+    return joined
+
+
+def medians(joined: dict) -> dict:
+    """
+    :param joined: a per-trial series from per_trial
+    :return: the median of every column over the trials where it is known
+    """
+    return {k: float(np.nanmedian(v)) if np.isfinite(v).any() else None
+            for k, v in joined.items() if k != 'timestamp'}
+
+
+def attribute(baseline: dict, contended: dict) -> dict:
+    """
+    Split a GFlops drop into its causes: GFlops ~ IPC x cycles per second x CPUs busy, so in log terms the
+    drop is the IPC change (cache and memory contention), the CPU share change (time-slicing) and the rest
+    (clock frequency, or IPC when only software events were available)
+    :param baseline: medians of the uncontended run
+    :param contended: medians of the contended run
+    :return: the gflops ratio and the share of the log drop explained by ipc, cpu share and other
+    """
+    def ratio(k):
+        b, c = baseline.get(k), contended.get(k)
+        return c / b if b and c else None
+
+    gflops = ratio('gflops')
+    result = {'gflops_ratio': gflops, 'ipc_ratio': ratio('ipc'), 'cpu_share_ratio': ratio('cpus_busy'),
+              'context_switch_ratio': ratio('context_switches_per_sec'),
+              'llc_miss_rate_ratio': ratio('llc_miss_rate')}
+    if gflops is None or gflops >= 1:
+        return result
+    total = np.log(gflops)
+    explained = 0.0
+    for cause, k in (('cache', 'ipc_ratio'), ('time_slicing', 'cpu_share_ratio')):
+        share = float(np.log(result[k]) / total) if result[k] else None
+        result[cause] = share
+        explained += share or 0.0
+    result['other'] = 1.0 - explained
+    return result
+
+
+def load_per_trial(logfile: str) -> dict:
+    """
+    :param logfile: a Linpack log run with counters
+    :return: its per-trial series stored next to it as <log>.perf.npz
+    """
+    with np.load(path.splitext(logfile)[0] + '.perf.npz') as data:
+        return {k: data[k] for k in data.files}
+
+
+if __name__ == '__main__':
+    # Usage: perfcounters.py --probe [cgroup]
+    #        perfcounters.py logfile [logfile ...]
+    # The probe shows which events a cgroup can be counted with; given logs, prints each run's medians and,
+    # against the first log as the baseline, how much of every later run's GFlops drop each cause explains
+    if sys.argv[1] == '--probe':
+        print(json.dumps(probe(sys.argv[2] if len(sys.argv) > 2 else cgroup_of(os.getpid()))))
+        sys.exit(0)
+
+    baseline = None
+    for logfile in sys.argv[1:]:
+        summary = medians(load_per_trial(logfile))
+        print(f'{logfile}: {summary}')
+        if baseline is None:
+            baseline = summary
+        else:
+            print(f'  against {sys.argv[1]}: {attribute(baseline, summary)}')
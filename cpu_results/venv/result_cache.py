@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+"""
+Reuse the results of scenarios whose configuration, images and host have not changed, and skip image
+builds whose Dockerfile and context have not changed
+"""
+
+import hashlib                      # scenario keys and context hashes
+import json                         # cache entries
+import platform                     # kernel release
+import shutil                       # copy results in and out of the cache
+import sys                          # command line arguments
+from glob import escape, glob       # every file a contender wrote next to its log
+from os import listdir, makedirs, path, walk  # cache directory and build context
+from subprocess import PIPE, run    # docker inspect and version when there is no API client
+from time import time               # entry age
+from topology import SYSFS          # cpufreq governors
+from docker_api import DockerError, default_client  # images and version without forking the docker CLI
+
+# Image label holding the hash of the Dockerfile and the context files it copies
+CONTEXT_LABEL = 'context_hash'
+
+# Results older than this are run again
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def docker_output(*args: str) -> str:
+    """
+    :param args: the docker subcommand and its arguments
+    :return: docker's stripped output, or None if it failed
+    """
+    try:
+        p = run(['docker', *args], universal_newlines=True, stdout=PIPE, stderr=PIPE)
+    except OSError:
+        return None
+    return p.stdout.strip() if p.returncode == 0 else None
+
+
+def image_info(img: str) -> dict:
+    """
+    Inspect an image over the Engine API
+    :param img: the image name
+    :return: the image's inspect record, {} if it does not exist, or None if there is no API client
+    """
+    api = default_client()
+    if api is None:
+        return None
+    try:
+        return api.inspect_image(img)
+    except DockerError as e:
+        if e.status == 404:
+            return {}
+        raise
+
+
+def image_digest(img: str) -> str:
+    """
+    :param img: the image name
+    :return: the local image id, or None if the image does not exist
+    """
+    info = image_info(img)
+    if info is not None:
+        return info.get('Id')
+    return docker_output('image', 'inspect', '--format', '{{.Id}}', img)
+
+
+def image_label(img: str, label: str) -> str:
+    """
+    :param img: the image name
+    :param label: the label to read
+    :return: the label's value, or None if the image or label does not exist
+    """
+    info = image_info(img)
+    if info is not None:
+        return ((info.get('Config') or {}).get('Labels') or {}).get(label) or None
+    value = docker_output('image', 'inspect', '--format', '{{ index .Config.Labels "' + label + '" }}', img)
+    return value if value and value != '<no value>' else None
+
+
+def host_fingerprint(sysfs: str=SYSFS) -> dict:
+    """
+    Everything about the host that changes what a benchmark measures
+    :param sysfs: the system directory holding the cpufreq governors
+    :return: the kernel release, CPU model, cpufreq governors and docker server version
+    """
+    model = None
+    with open('/proc/cpuinfo', 'r') as f:
+        for line in f:
+            # x86 reports "model name", arm "Processor" or "CPU part"
+            if line.startswith(('model name', 'Processor', 'CPU part')):
+                model = line.split(':', 1)[1].strip()
+                break
+    governors = set()
+    for filename in glob(path.join(sysfs, 'cpu', 'cpu[0-9]*', 'cpufreq', 'scaling_governor')):
+        with open(filename, 'r') as f:
+            governors.add(f.read().strip())
+    api = default_client()
+    docker = api.version().get('Version') if api is not None else \
+        docker_output('version', '--format', '{{.Server.Version}}')
+    return {'kernel': platform.release(), 'cpu_model': model, 'governor': ','.join(sorted(governors)) or None,
+            'docker': docker}
+
+
+def context_hash(dockerfile: str, context: str='.') -> str:
+    """
+    Hash a Dockerfile together with every file its COPY and ADD instructions take from the context
+    :param dockerfile: the Dockerfile
+    :param context: the build context directory
+    :return: the hex digest
+    """
+    digest = hashlib.sha256()
+    with open(dockerfile, 'rb') as f:
+        text = f.read()
+    digest.update(text)
+
+    for line in text.decode().splitlines():
+        words = line.split()
+        if len(words) < 3 or words[0].upper() not in ('COPY', 'ADD'):
+            continue
+        # Every argument but the destination and any --flag is a source
+        for source in (w for w in words[1:-1] if not w.startswith('--')):
+            matches = sorted(glob(path.join(context, source))) or [source]
+            for match in matches:
+                files = [match] if not path.isdir(match) else \
+                    sorted(path.join(d, n) for d, _, names in walk(match) for n in names)
+                for filename in files:
+                    digest.update(path.relpath(filename, context).encode())
+                    if path.isfile(filename):
+                        with open(filename, 'rb') as f:
+                            for block in iter(lambda: f.read(1 << 20), b''):
+                                digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Stored copies of every scenario's logs, keyed on a fingerprint of its configuration, images and host
+    """
+
+    def __init__(self, directory: str='./.scenario_cache', ttl: float=DEFAULT_TTL, force: bool=False):
+        """
+        :param directory: where the entries and their copies of the results live
+        :param ttl: seconds a stored result stays valid
+        :param force: True to run every scenario again, still storing the new results
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.force = force
+        self._host = None
+        self._digests = {}
+
+    def fingerprint(self, scenario: dict) -> dict:
+        """
+        :param scenario: an expanded scenario
+        :return: the host, the digest of every image and each contender's function and arguments
+        """
+        if self._host is None:
+            self._host = host_fingerprint()
+        jobs = []
+        for name, func, kwargs in scenario['jobs']:
+            # The pool only decides how a container is started, not what is measured
+            args = {k: v for k, v in kwargs.items() if k != 'pool'}
+            if 'img' in args and args['img'] not in self._digests:
+                self._digests[args['img']] = image_digest(args['img'])
+            jobs.append({'name': name, 'function': func.__name__, 'kwargs': args,
+                         'image': self._digests.get(args.get('img'))})
+        return {'host': self._host, 'jobs': jobs}
+
+    def key(self, scenario: dict) -> str:
+        """
+        :param scenario: an expanded scenario
+        :return: the hex digest of its fingerprint
+        """
+        text = json.dumps(self.fingerprint(scenario), sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def restore(self, scenario: dict) -> dict:
+        """
+        Put a scenario's stored results back in place of running it
+        :param scenario: an expanded scenario
+        :return: the stored exit status of every contender, or None if it has to run
+        """
+        if self.force:
+            return None
+        entry_dir = path.join(self.directory, self.key(scenario))
+        try:
+            with open(path.join(entry_dir, 'entry.json'), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time() - entry['time'] > self.ttl:
+            return None
+
+        for original, stored in entry['files'].items():
+            makedirs(path.dirname(original) or '.', exist_ok=True)
+            shutil.copy2(path.join(entry_dir, stored), original)
+        return entry['statuses']
+
+    def store(self, scenario: dict, statuses: dict):
+        """
+        Keep copies of every file a successful scenario wrote next to its contenders' logs
+        :param scenario: an expanded scenario that has just run
+        :param statuses: the exit status of every contender
+        """
+        fingerprint = self.fingerprint(scenario)
+        entry_dir = path.join(self.directory, self.key(scenario))
+        if path.isdir(entry_dir):
+            shutil.rmtree(entry_dir)
+        makedirs(entry_dir)
+
+        files = {}
+        for _, _, kwargs in scenario['jobs']:
+            for original in sorted(glob(escape(path.splitext(kwargs['logfile'])[0]) + '.*')):
+                stored = f'{len(files)}-{path.basename(original)}'
+                shutil.copy2(original, path.join(entry_dir, stored))
+                files[original] = stored
+        with open(path.join(entry_dir, 'entry.json'), 'w') as f:
+            json.dump({'scenario': scenario['name'], 'time': time(), 'statuses': statuses, 'files': files,
+                       'fingerprint': fingerprint}, f, default=str)
+
+    def entries(self) -> [dict]:
+        """
+        :return: every stored entry, with its key and age in seconds
+        """
+        entries = []
+        for key in sorted(listdir(self.directory)) if path.isdir(self.directory) else []:
+            try:
+                with open(path.join(self.directory, key, 'entry.json'), 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entries.append({'key': key, 'scenario': entry['scenario'], 'age': time() - entry['time'],
+                            'files': len(entry['files'])})
+        return entries
+
+    def prune(self) -> int:
+        """
+        Remove every entry older than the TTL
+        :return: the number of entries removed
+        """
+        expired = [e for e in self.entries() if e['age'] > self.ttl]
+        for entry in expired:
+            shutil.rmtree(path.join(self.directory, entry['key']))
+        return len(expired)
+
+
+if __name__ == '__main__':
+    # Usage: result_cache.py [cache_directory] [--prune]
+    # Lists the stored scenario results and their age, after removing expired ones with --prune
+    args = [a for a in sys.argv[1:] if a != '--prune']
+    cache = ResultCache(args[0] if args else './.scenario_cache')
+    if '--prune' in sys.argv:
+        print(f'removed {cache.prune()} expired entries')
+    for entry in cache.entries():
+        print(f'{entry["scenario"]}: {entry["files"]} files, {entry["age"] / 3600:.1f} h old ({entry["key"][:12]})')
+    print(json.dumps(host_fingerprint()))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+"""
+Persistent results store for Linpack logs, so re-analysis only parses logs that are new or changed
+"""
+
+import hashlib                      # content hash of each log
+import sqlite3                      # the results database
+import sys                          # command line arguments
+from os import listdir, path, stat  # scan the log directory
+import numpy as np                  # per-trial columns
+from linpack_stream import LinpackStream  # parse the logs
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS logs (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    sha1 TEXT,
+    trials INTEGER,
+    average REAL,
+    maximal REAL,
+    mean REAL,
+    min REAL,
+    p50 REAL,
+    p99 REAL,
+    stddev REAL,
+    cv REAL,
+    time BLOB,
+    gflops BLOB,
+    residual BLOB,
+    residual_norm BLOB,
+    passed BLOB
+)
+'''
+
+SUMMARY_COLUMNS = ('trials', 'average', 'maximal', 'mean', 'min', 'p50', 'p99', 'stddev', 'cv')
+
+
+def connect(db: str='./results.db') -> sqlite3.Connection:
+    """
+    Open the results database, creating it if needed
+    :param db: the database file
+    :return: the connection
+    """
+    conn = sqlite3.connect(db)
+    conn.execute(SCHEMA)
+    return conn
+
+
+def ingest(conn: sqlite3.Connection, directory: str='./graph_data/') -> [str]:
+    """
+    Bring the store up to date with the logs in a directory
+    :param conn: the results database
+    :param directory: the directory containing the Linpack logs
+    :return: the logs that were (re)parsed
+    """
+    known = {row[0]: row[1:] for row in conn.execute('SELECT path, mtime, size, sha1 FROM logs')}
+    present = set()
+    parsed = []
+
+    for f in sorted(listdir(directory)):
+        if not f.endswith('.log'):
+            continue
+        logfile = path.join(directory, f)
+        present.add(logfile)
+        st = stat(logfile)
+
+        # Unchanged mtime and size: skip without even reading the file
+        if logfile in known and known[logfile][:2] == (st.st_mtime, st.st_size):
+            continue
+
+        with open(logfile, 'rb') as fin:
+            content = fin.read()
+        sha1 = hashlib.sha1(content).hexdigest()
+
+        # Touched but identical content: only record the new mtime
+        if logfile in known and known[logfile][2] == sha1:
+            conn.execute('UPDATE logs SET mtime = ?, size = ? WHERE path = ?', (st.st_mtime, st.st_size, logfile))
+            continue
+
+        stream = LinpackStream()
+        for line in content.decode(errors='replace').splitlines():
+            stream.feed_line(line)
+        store(conn, logfile, st.st_mtime, st.st_size, sha1, stream)
+        parsed.append(logfile)
+
+    # Forget logs that have been removed from the directory
+    for logfile in set(known) - present:
+        if path.dirname(logfile) == path.dirname(path.join(directory, '')):
+            conn.execute('DELETE FROM logs WHERE path = ?', (logfile,))
+
+    conn.commit()
+    return parsed
+
+
+def store(conn: sqlite3.Connection, logfile: str, mtime: float, size: int, sha1: str, stream: LinpackStream):
+    """
+    Insert or replace one parsed log
+    :param conn: the results database
+    :param logfile: the log's path, which keys the row
+    :param mtime: the log's modification time
+    :param size: the log's size in bytes
+    :param sha1: the hash of the log's content
+    :param stream: the parsed trials
+    """
+    summary = stream.summary()
+    columns = stream.columns()
+    conn.execute('INSERT OR REPLACE INTO logs VALUES (' + ', '.join(['?'] * 18) + ')',
+                 [logfile, mtime, size, sha1] + [summary[c] for c in SUMMARY_COLUMNS] +
+                 [columns[c].tobytes() for c in LinpackStream.COLUMNS] + [columns['passed'].tobytes()])
+
+
+def averages(conn: sqlite3.Connection, directory: str='./graph_data/') -> [(str, float)]:
+    """
+    The average GFlops Linpack reported for every stored log, in file name order; runs stopped early
+    have no performance summary, so the mean of their trials stands in
+    :param conn: the results database
+    :param directory: only logs from this directory are returned
+    :return: a list of (file name, average) pairs for logs that have a performance summary or trials
+    """
+    rows = conn.execute('SELECT path, COALESCE(average, mean) FROM logs '
+                        'WHERE COALESCE(average, mean) IS NOT NULL ORDER BY path')
+    prefix = path.join(directory, '')
+    return [(p[len(prefix):], a) for p, a in rows if p.startswith(prefix)]
+
+
+def trials(conn: sqlite3.Connection, logfile: str) -> dict:
+    """
+    The per-trial columns of one stored log
+    :param conn: the results database
+    :param logfile: the log's path
+    :return: the per-trial columns, or None if the log is not in the store
+    """
+    row = conn.execute('SELECT time, gflops, residual, residual_norm, passed FROM logs WHERE path = ?',
+                       (logfile,)).fetchone()
+    if row is None:
+        return None
+
+    columns = {c: np.frombuffer(b, dtype=np.float64) for c, b in zip(LinpackStream.COLUMNS, row)}
+    columns['passed'] = np.frombuffer(row[-1], dtype=bool)
+    return columns
+
+
+if __name__ == '__main__':
+    # Usage: results_store.py [directory]
+    directory = sys.argv[1] if len(sys.argv) > 1 else './graph_data/'
+    conn = connect()
+    parsed = ingest(conn, directory)
+    print(f'parsed {len(parsed)} new or changed logs')
+    conn.close()
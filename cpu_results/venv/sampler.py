@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+"""
+Sample host, process, container cgroup and network counters alongside a benchmark, into a
+preallocated ring buffer that is flushed to disk as binary chunks by a background thread
+"""
+
+import json                         # column description next to the samples
+import signal                       # stop the command line sampler cleanly
+import sys                          # command line arguments
+from queue import Queue             # hand full chunks to the flusher
+from os import path                 # locate the cgroup v2 hierarchy
+from subprocess import PIPE, run    # resolve containers with docker inspect when there is no API client
+from threading import Event, Thread  # sampling and flushing threads
+from time import sleep, time        # sampling clock
+import numpy as np                  # ring buffer
+from docker_api import DockerError, default_client  # resolve containers without forking the docker CLI
+
+COLUMNS = ('time',
+           # /proc/stat, host-wide jiffies
+           'host_user', 'host_nice', 'host_system', 'host_idle', 'host_iowait', 'host_irq', 'host_softirq',
+           'host_steal',
+           # /proc/<pid>/stat, jiffies
+           'pid_utime', 'pid_stime',
+           # cgroup v2 cpu.stat (microseconds), memory.current (bytes) and io.stat (bytes)
+           'cg_usage_usec', 'cg_user_usec', 'cg_system_usec', 'cg_nr_throttled', 'cg_throttled_usec',
+           'cg_memory', 'cg_rbytes', 'cg_wbytes',
+           # /proc/net/dev, bytes summed over every interface but lo
+           'net_rx_bytes', 'net_tx_bytes')
+
+
+def container_pid(container: str) -> int:
+    """
+    The host pid of a running container's init process
+    :param container: the container name or id
+    :return: the pid, or None if the container is not running yet
+    """
+    api = default_client()
+    if api is not None:
+        try:
+            pid = api.inspect(container)['State']['Pid']
+        except DockerError as e:
+            if e.status == 404:
+                return None
+            raise
+        return pid if pid else None
+
+    p = run(['docker', 'inspect', '--format', '{{.State.Pid}}', container], universal_newlines=True, stdout=PIPE,
+            stderr=PIPE)
+    pid = p.stdout.strip()
+    return int(pid) if p.returncode == 0 and pid.isdigit() and int(pid) > 0 else None
+
+
+def cgroup_of(pid: int) -> str:
+    """
+    The cgroup v2 directory a process belongs to
+    :param pid: the process id
+    :return: the cgroup directory, or None on a cgroup v1 host
+    """
+    # Hybrid hosts mount the v2 hierarchy under unified/
+    root = '/sys/fs/cgroup/unified' if path.isdir('/sys/fs/cgroup/unified') else '/sys/fs/cgroup'
+    with open(f'/proc/{pid}/cgroup', 'r') as f:
+        for line in f:
+            if line.startswith('0::'):
+                return path.join(root, line[3:].strip().lstrip('/'))
+    return None
+
+
+class Sampler:
+    """
+    Background sampler that writes one row of COLUMNS per tick
+    """
+
+    def __init__(self, filename: str, rate: float=100, pid: int=None, container: str=None, cgroup: str=None,
+                 capacity: int=4096, chunk: int=256):
+        """
+        :param filename: the binary file to write rows of float64 samples to
+        :param rate: samples per second
+        :param pid: a process to sample, if any
+        :param container: a container to sample; its pid and cgroup are resolved once it is running
+        :param cgroup: a cgroup v2 directory to sample, if any
+        :param capacity: rows preallocated in the ring buffer
+        :param chunk: rows per flushed chunk; capacity must hold several chunks
+        """
+        self.filename = filename
+        self.period = 1.0 / rate
+        self.pid = pid
+        self.container = container
+        self.cgroup = cgroup
+        self.chunk = chunk
+        self.capacity = max(capacity // chunk, 2) * chunk
+        self.ring = np.full((self.capacity, len(COLUMNS)), np.nan)
+        self.rows = 0
+        self._chunks = Queue()
+        self._stop = Event()
+        self._files = {}
+        self._next_resolve = 0.0
+        self._threads = [Thread(target=self._sample, daemon=True), Thread(target=self._flush, daemon=True)]
+
+    def start(self):
+        """
+        Describe the columns next to the samples and start sampling
+        """
+        with open(self.filename + '.json', 'w') as f:
+            json.dump({'columns': COLUMNS, 'rate': 1.0 / self.period, 'pid': self.pid, 'container': self.container,
+                       'cgroup': self.cgroup}, f)
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        """
+        Stop sampling and wait until every sample is on disk
+        """
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        for f in self._files.values():
+            f.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _read(self, filename: str) -> str:
+        """
+        Re-read a counter file, keeping it open between ticks
+        """
+        f = self._files.get(filename)
+        if f is None:
+            f = self._files[filename] = open(filename, 'r')
+        f.seek(0)
+        return f.read()
+
+    def _resolve(self):
+        """
+        Find the container's pid and cgroup once it has started; a failed lookup is retried on a later tick
+        """
+        try:
+            pid = container_pid(self.container)
+        except (OSError, ValueError):
+            return
+        if pid is not None:
+            self.pid = self.pid or pid
+            self.cgroup = self.cgroup or cgroup_of(pid)
+            self.container = None
+
+    def _tick(self, row: np.ndarray):
+        """
+        Fill one row with the current counters, leaving unavailable ones as NaN
+        """
+        row[:] = np.nan
+        row[0] = time()
+
+        try:
+            host = self._read('/proc/stat').split('\n', 1)[0].split()
+            row[1:9] = [float(v) for v in host[1:9]]
+        except (OSError, ValueError):
+            pass
+
+        if self.pid is not None:
+            try:
+                # Fields after the parenthesised command name; utime and stime are the 14th and 15th
+                fields = self._read(f'/proc/{self.pid}/stat').rsplit(')', 1)[1].split()
+                row[9:11] = float(fields[11]), float(fields[12])
+            except (OSError, IndexError):
+                pass
+
+        if self.cgroup is not None:
+            try:
+                cpu = dict(line.split() for line in self._read(self.cgroup + '/cpu.stat').splitlines())
+                row[11:16] = [float(cpu.get(k, np.nan)) for k in ('usage_usec', 'user_usec', 'system_usec',
+                                                                 'nr_throttled', 'throttled_usec')]
+                row[16] = float(self._read(self.cgroup + '/memory.current'))
+                rbytes = wbytes = 0.0
+                for line in self._read(self.cgroup + '/io.stat').splitlines():
+                    stats = dict(kv.split('=') for kv in line.split()[1:])
+                    rbytes += float(stats.get('rbytes', 0))
+                    wbytes += float(stats.get('wbytes', 0))
+                row[17:19] = rbytes, wbytes
+            except (OSError, ValueError):
+                pass
+
+        try:
+            rx = tx = 0.0
+            for line in self._read('/proc/net/dev').splitlines()[2:]:
+                name, counters = line.split(':', 1)
+                if name.strip() != 'lo':
+                    counters = counters.split()
+                    rx += float(counters[0])
+                    tx += float(counters[8])
+            row[19:21] = rx, tx
+        except (OSError, ValueError, IndexError):
+            pass
+
+    def _sample(self):
+        """
+        Sampling thread: one row per period, handing every full chunk to the flusher
+        """
+        deadline = time()
+        try:
+            while not self._stop.is_set():
+                # Look the container up at most twice a second until it is running
+                if self.container is not None and time() >= self._next_resolve:
+                    self._next_resolve = time() + 0.5
+                    self._resolve()
+
+                i = self.rows % self.capacity
+                self._tick(self.ring[i])
+                self.rows += 1
+                if self.rows % self.chunk == 0:
+                    self._chunks.put((self.rows - self.chunk, self.rows))
+
+                deadline += self.period
+                sleep(max(deadline - time(), 0))
+        finally:
+            # Whatever stopped the loop, the flusher gets the last rows and its sentinel, so stop() returns
+            if self.rows % self.chunk:
+                self._chunks.put((self.rows - self.rows % self.chunk, self.rows))
+            self._chunks.put(None)
+
+    def _flush(self):
+        """
+        Flushing thread: append each chunk to the file as raw float64 rows
+        """
+        with open(self.filename, 'wb') as f:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is None:
+                    break
+                first, last = chunk
+                f.write(self.ring[first % self.capacity:(last - 1) % self.capacity + 1].tobytes())
+
+
+def load_samples(filename: str) -> dict:
+    """
+    Read samples written by a Sampler
+    :param filename: the binary samples file
+    :return: a dict mapping each column to its array
+    """
+    with open(filename + '.json', 'r') as f:
+        columns = json.load(f)['columns']
+    data = np.fromfile(filename, dtype=np.float64).reshape(-1, len(columns))
+    return {c: data[:, i] for i, c in enumerate(columns)}
+
+
+def align(samples: dict, timestamps: np.ndarray, column: str) -> np.ndarray:
+    """
+    Per-second rate of a counter over each interval between consecutive timestamps, e.g. the
+    container's CPU time during every Linpack trial or iperf3 interval
+    :param samples: samples from load_samples
+    :param timestamps: interval boundaries, in the same clock as the samples' time column
+    :param column: the counter to differentiate
+    :return: one rate per interval
+    """
+    t = samples['time']
+    values = np.interp(timestamps, t, samples[column])
+    return np.diff(values) / np.diff(timestamps)
+
+
+if __name__ == '__main__':
+    # Usage: sampler.py filename rate [container ...]
+    # Samples until interrupted; with containers, writes one file per container as filename-<container>
+    filename = sys.argv[1]
+    rate = float(sys.argv[2])
+    containers = sys.argv[3:]
+    samplers = [Sampler(filename + '-' + c, rate, container=c) for c in containers] or [Sampler(filename, rate)]
+
+    stop = Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    for s in samplers:
+        s.start()
+    stop.wait()
+    for s in samplers:
+        s.stop()
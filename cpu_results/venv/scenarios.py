@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+
+"""
+Expand declarative scenario specs into contender jobs and schedule them, running
+scenarios that do not contend for the same cores side by side
+"""
+
+import json                         # scenario specs
+import sys                          # command line arguments
+from concurrent.futures import ThreadPoolExecutor  # run packed scenarios side by side
+from itertools import product       # cartesian product of the matrix parameters
+from os import makedirs, path       # log directories
+from subprocess import Popen, STDOUT, TimeoutExpired  # generic command contenders
+from time import sleep              # staggered contender start
+
+from container_pool import ContainerPool
+from cpu_benchmarking import clean_containers, run_aggressor, run_concurrently, run_docker, run_microservice, run_native
+from memory_benchmarking import run_membench
+from io_benchmarking import IO_MAX_FLAGS, run_iobench
+from result_cache import DEFAULT_TTL, ResultCache
+from topology import SYSFS, Topology, plan
+
+# Fields every Linpack contender falls back to when neither the contender nor the defaults set them
+LINPACK_DEFAULTS = {'equations': '1000', 'leading_dimension': '1000', 'trials': '250', 'alignment': '64',
+                    'target_ci': None, 'min_trials': 30}
+
+# Workloads that run in their own container, and so can be placed by a scenario's placement policy
+CONTAINER_WORKLOADS = ('linpack', 'stress', 'aggressor', 'memory', 'io', 'microservice')
+
+
+def load_spec(filename: str) -> dict:
+    """
+    Read a scenario spec from a JSON file
+    :param filename: the spec file
+    :return: the parsed spec
+    """
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def fill(value, params: dict):
+    """
+    Substitute {placeholders} in a spec value with the current parameters
+    :param value: a string, list or plain value from the spec
+    :param params: the parameters in scope
+    :return: the value with every placeholder substituted
+    """
+    if isinstance(value, list):
+        return [fill(v, params) for v in value]
+    if not isinstance(value, str):
+        return value
+
+    # A lone placeholder keeps the parameter's type, so counts can come from the matrix
+    if value.startswith('{') and value.endswith('}') and value[1:-1] in params:
+        return params[value[1:-1]]
+    return value.format(**params)
+
+
+def cpus_of(cpuset: str) -> {str}:
+    """
+    Turn a --cpuset-cpus list such as '0,1' or '0-3' into the resources it occupies
+    :param cpuset: the cpuset, or None when the contender is unrestricted
+    :return: a set of resource names, where '*' means every core
+    """
+    if not cpuset:
+        return {'*'}
+
+    cpus = set()
+    for part in str(cpuset).split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update('cpu' + str(c) for c in range(int(first), int(last) + 1))
+        else:
+            cpus.add('cpu' + part.strip())
+    return cpus
+
+
+def run_command(logfile: str, argv: [str], delay: float=0, timeout: int=600):
+    """
+    Run a generic command contender, such as an iperf3 or wrk instance, and save its output
+    :param logfile: the file to save stdout and stderr
+    :param argv: the command and its arguments
+    :param delay: seconds to wait after the start barrier before launching
+    :param timeout: seconds the command may run before it is stopped
+    """
+    sleep(delay)
+    with open(logfile, 'w') as fileout:
+        p = Popen(argv, universal_newlines=True, stdout=fileout, stderr=STDOUT)
+        try:
+            p.wait(timeout=timeout)
+        except TimeoutExpired:
+            p.kill()
+            p.wait()
+            raise ValueError(f'{argv[0]} did not finish within {timeout} seconds.')
+
+    if p.returncode != 0:
+        raise ValueError(f'{argv[0]} did not exit correctly. Exit Status: {p.returncode} where expecting zero.')
+
+
+def contender_job(kind: str, logfile: str, name: str, contender: dict) -> (callable, dict):
+    """
+    Map one contender instance onto the function that runs it
+    :param kind: the workload kind (linpack, stress, aggressor, native, memory, io, microservice or command)
+    :param logfile: the file to save the contender's output
+    :param name: the container name
+    :param contender: the contender fields with every placeholder substituted
+    :return: the function and its keyword arguments
+    """
+    # A lone {i} placeholder gives an int, while docker takes the cpuset as a string
+    cpuset = None if contender.get('cpuset') is None else str(contender['cpuset'])
+    mems = None if contender.get('mems') is None else str(contender['mems'])
+    linpack = dict(total_equations=str(contender['equations']), leading_dimension=str(contender['leading_dimension']),
+                   trials=str(contender['trials']), alignment_value=str(contender['alignment']))
+    if contender.get('target_ci') is not None:
+        # Adaptive runs stop once mean GFlops is precise enough, with trials as the cap
+        linpack.update(target_ci=float(contender['target_ci']), min_trials=int(contender.get('min_trials', 30)))
+
+    if kind == 'linpack':
+        return run_docker, dict(logfile=logfile, img=contender['image'], container_name=name,
+                                cpuset=cpuset, mems=mems, **linpack)
+    if kind == 'stress':
+        # Optional workers and seconds for stress_benchmark.sh, e.g. to sweep the aggressor's intensity
+        args = [str(a) for a in contender['args']] if contender.get('args') else None
+        return run_docker, dict(logfile=logfile, img=contender['image'], container_name=name,
+                                cpuset=cpuset, mems=mems, stress=True, args=args)
+    if kind == 'aggressor':
+        # A duty-cycle load held at a utilisation per core, e.g. to sweep the aggressor's intensity
+        return run_aggressor, dict(logfile=logfile, img=contender['image'], container_name=name,
+                                   kernel=contender.get('kernel', 'int'),
+                                   utilization=float(contender.get('utilization', 50)),
+                                   workers=int(contender['workers']) if contender.get('workers') else None,
+                                   period=float(contender.get('period', 0.1)),
+                                   fraction=float(contender.get('fraction', 0.5)),
+                                   duration=float(contender.get('duration', 0)), cpuset=cpuset, mems=mems)
+    if kind == 'native':
+        return run_native, dict(logfile=logfile, **linpack)
+    if kind == 'memory':
+        return run_membench, dict(logfile=logfile, img=contender['image'], container_name=name,
+                                  cpuset=cpuset, mems=mems, kernel=contender.get('kernel', 'stream'),
+                                  level=contender.get('level', 'l3'), fraction=float(contender.get('fraction', 0.5)),
+                                  iterations=int(contender.get('iterations', 20)),
+                                  duration=float(contender.get('duration', 60)))
+    if kind == 'io':
+        io_max = {k: contender[k] for k in IO_MAX_FLAGS if contender.get(k)}
+        return run_iobench, dict(logfile=logfile, img=contender['image'], container_name=name,
+                                 target=contender['target'], device=contender.get('device'),
+                                 pattern=contender.get('pattern', 'rand'), op=contender.get('op', 'read'),
+                                 block=int(contender.get('block', 4096)), size=int(contender.get('size', 256)),
+                                 ops=int(contender['ops']) if contender.get('ops') else None,
+                                 duration=float(contender.get('duration', 20)),
+                                 direct=contender.get('access', 'buffered') == 'direct',
+                                 method=contender.get('method', 'pread'), io_max=io_max,
+                                 cpuset=cpuset, mems=mems)
+    if kind == 'microservice':
+        return run_microservice, dict(logfile=logfile, img=contender['image'], container_name=name,
+                                      role=contender.get('role', 'client'), port=int(contender.get('port', 8533)),
+                                      host=contender.get('host', '127.0.0.1'), work=int(contender.get('work', 2000)),
+                                      rate=float(contender.get('rate', 500)),
+                                      connections=int(contender.get('connections', 8)),
+                                      duration=float(contender.get('duration', 30)), cpuset=cpuset, mems=mems)
+    if kind == 'command':
+        return run_command, dict(logfile=logfile, argv=[str(a) for a in contender['argv']],
+                                 delay=float(contender.get('delay', 0)))
+
+    raise ValueError(f'Unknown workload "{kind}". '
+                     f'Expecting linpack, stress, aggressor, native, memory, io, microservice or command.')
+
+
+def expand(spec: dict) -> [dict]:
+    """
+    Expand every scenario in the spec over the cartesian product of its matrix
+    :param spec: the parsed scenario spec
+    :return: concrete scenarios, each with its name, jobs, containers, occupied resources and placement
+    """
+    defaults = dict(LINPACK_DEFAULTS, log_directory='./graph_data/')
+    defaults.update(spec.get('defaults', {}))
+    scenarios = []
+    topology = None
+
+    for scenario in spec['scenarios']:
+        matrix = scenario.get('matrix', {})
+        keys = sorted(matrix)
+
+        for values in product(*[matrix[k] for k in keys]):
+            params = dict(defaults, suite=scenario.get('suite', ''))
+            params.update(scenario.get('params', {}))
+            params.update(zip(keys, values))
+            scenario_name = fill(scenario['name'], params)
+            counts = [int(fill(c.get('count', 1), params)) for c in scenario['contenders']]
+
+            # A placement policy assigns cpusets and memory nodes to every container without an explicit cpuset
+            placed = [c['workload'] in CONTAINER_WORKLOADS and 'cpuset' not in c for c in scenario['contenders']]
+            assignments = []
+            if scenario.get('placement'):
+                placement = scenario['placement']
+                if not isinstance(placement, dict):
+                    placement = {'policy': placement}
+                placement = {k: fill(v, params) for k, v in placement.items()}
+                topology = topology or Topology(params.get('sysfs', SYSFS))
+                try:
+                    assignments = plan(placement['policy'], sum(n for p, n in zip(placed, counts) if p),
+                                       int(placement.get('cpus', 1)), topology)
+                except ValueError as e:
+                    # The same suite runs on small and large hosts, keeping the placements each host can offer
+                    print(f'skipping {scenario_name}: {e}')
+                    continue
+
+            jobs = []
+            containers = []
+            resources = set(fill(scenario.get('resources', []), params))
+            placements = {}
+            index = 0
+            for contender, count, place in zip(scenario['contenders'], counts, placed):
+                for i in range(1, count + 1):
+                    index += 1
+                    name = scenario_name if sum(counts) == 1 else scenario_name + '-' + str(index)
+                    local = dict(params, i=i, name=name)
+                    if 'base_port' in params:
+                        local['port'] = int(params['base_port']) + i - 1
+                    fields = {k: fill(v, local) for k, v in contender.items()}
+                    fields = dict({k: params[k] for k in LINPACK_DEFAULTS}, **fields)
+                    if assignments and place:
+                        placements[name] = dict(assignments[len(placements)], scenario=scenario_name,
+                                                host=topology.summary())
+                        fields.update(cpuset=placements[name]['cpuset'], mems=placements[name]['mems'])
+                    fields.setdefault('image', params.get(contender['workload'] + '_image'))
+                    if fields['workload'] == 'io':
+                        fields.setdefault('target', params.get('io_target'))
+                        fields.setdefault('device', params.get('io_device'))
+
+                    logfile = path.join(params['log_directory'], fill(contender.get('log', '{name}.log'), local))
+                    func, kwargs = contender_job(fields['workload'], logfile, name, fields)
+                    jobs.append((name, func, kwargs))
+
+                    if fields['workload'] in CONTAINER_WORKLOADS:
+                        containers.append(name)
+                    if fields['workload'] != 'command' or fields.get('cpuset'):
+                        resources |= cpus_of(fields.get('cpuset'))
+
+            scenarios.append({'name': scenario_name, 'jobs': jobs, 'containers': containers, 'resources': resources,
+                              'exclusive': scenario.get('exclusive', False), 'placement': placements})
+
+    return scenarios
+
+
+def pack(scenarios: [dict]) -> [[dict]]:
+    """
+    Greedily pack scenarios into waves whose members occupy disjoint resources
+    :param scenarios: the expanded scenarios, in spec order
+    :return: a list of waves, each a list of scenarios that can run side by side
+    """
+    waves = []
+    for scenario in scenarios:
+        placed = False
+        if not scenario['exclusive'] and '*' not in scenario['resources']:
+            for wave in waves:
+                if all(not s['exclusive'] and '*' not in s['resources'] and
+                       not s['resources'] & scenario['resources'] for s in wave):
+                    wave.append(scenario)
+                    placed = True
+                    break
+        if not placed:
+            waves.append([scenario])
+    return waves
+
+
+def run_scenario(scenario: dict, timeout: int, pool: ContainerPool=None, cache: ResultCache=None) -> dict:
+    """
+    Run one scenario's contenders together and remove its containers afterwards
+    :param scenario: an expanded scenario
+    :param timeout: seconds each contender may run
+    :param pool: warm containers for the docker contenders, which then leave nothing to remove
+    :param cache: stored results to reuse while the scenario, its images and the host are unchanged
+    :return: the exit status of every contender
+    """
+    if cache is not None:
+        statuses = cache.restore(scenario)
+        if statuses is not None:
+            print(f'{scenario["name"]}: reusing stored results')
+            return statuses
+
+    print(f'{scenario["name"]}: ' + ', '.join(name for name, _, _ in scenario['jobs']))
+    for name, func, kwargs in scenario['jobs']:
+        makedirs(path.dirname(kwargs['logfile']) or '.', exist_ok=True)
+        if pool is not None and func in (run_docker, run_membench):
+            kwargs['pool'] = pool
+        # Tag the contender's results with where it was placed, next to its log
+        if name in scenario['placement']:
+            with open(path.splitext(kwargs['logfile'])[0] + '.placement', 'w') as f:
+                json.dump(scenario['placement'][name], f)
+
+    statuses = {name: record['status'] for name, record in run_concurrently(scenario['jobs'], timeout).items()}
+    if pool is None:
+        clean_containers(scenario['containers'])
+    # Only complete results are worth reusing
+    if cache is not None and not any(statuses.values()):
+        cache.store(scenario, statuses)
+    return statuses
+
+
+def run_matrix(spec: dict, serial: bool=False, dry_run: bool=False, warm: bool=None,
+               cache: ResultCache=None) -> ([str], dict):
+    """
+    Expand and schedule every scenario in the spec
+    :param spec: the parsed scenario spec
+    :param serial: True to run one scenario at a time instead of packing them
+    :param dry_run: True to only print the schedule
+    :param warm: True to docker exec every container workload in a pool of warm containers, which are
+                 all removed once the matrix is done or has failed; defaults to the spec's "warm" field
+    :param cache: stored results to reuse instead of running unchanged scenarios again
+    :return: the container names and the exit status of every contender
+    """
+    scenarios = expand(spec)
+    timeout = int(spec.get('defaults', {}).get('timeout', 600))
+    waves = [[s] for s in scenarios] if serial or not spec.get('pack', True) else pack(scenarios)
+
+    warm = spec.get('warm', False) if warm is None else warm
+    containers = ContainerPool() if warm and not dry_run else None
+
+    names = []
+    statuses = {}
+    try:
+        for w, wave in enumerate(waves):
+            print(f'\nwave {w + 1}/{len(waves)}: ' + ', '.join(s['name'] for s in wave))
+            for scenario in wave:
+                names += scenario['containers']
+                for name, placement in scenario['placement'].items():
+                    print(f'  {name}: {placement["policy"]} cpus {placement["cpuset"]} mems {placement["mems"]}')
+            if dry_run:
+                continue
+
+            with ThreadPoolExecutor(max_workers=len(wave)) as pool:
+                for result in pool.map(lambda s: run_scenario(s, timeout, containers, cache), wave):
+                    statuses.update(result)
+    finally:
+        if containers is not None:
+            containers.close()
+
+    return names, statuses
+
+
+if __name__ == '__main__':
+    # Usage: scenarios.py spec.json [--serial] [--dry-run] [--warm] [--target-ci fraction]
+    #                     [--force | --no-cache] [--ttl hours]
+    spec = load_spec(sys.argv[1])
+    if '--target-ci' in sys.argv:
+        spec.setdefault('defaults', {})['target_ci'] = float(sys.argv[sys.argv.index('--target-ci') + 1])
+    ttl = float(sys.argv[sys.argv.index('--ttl') + 1]) * 3600 if '--ttl' in sys.argv else DEFAULT_TTL
+    cache = None if '--no-cache' in sys.argv else ResultCache(ttl=ttl, force='--force' in sys.argv)
+    names, statuses = run_matrix(spec, serial='--serial' in sys.argv, dry_run='--dry-run' in sys.argv,
+                                 warm=True if '--warm' in sys.argv else None, cache=cache)
+    print('\nDone!')
+    sys.exit(max(statuses.values(), default=0))
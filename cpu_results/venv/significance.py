@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+
+"""
+Decide whether a contended run really differs from its baseline, using bootstrap confidence
+intervals and Mann-Whitney/Welch tests over per-trial Linpack, per-interval iperf3, per-request
+wrk, per-iteration memory kernel, per-second or per-op I/O and per-request microservice samples, and summarise every
+scenario as an interference factor
+"""
+
+import csv                          # interference table for the graph scripts
+import json                         # comparison specs
+import sys                          # command line arguments
+from functools import partial       # one loader per memory kernel
+from glob import glob               # several logs per side of a comparison
+from os import path                 # locate the network test parsers and .npz stores
+import numpy as np                  # vectorised resampling
+from scipy import stats             # Mann-Whitney and Welch tests
+from linpack_stream import load_trials, read_log  # per-trial Linpack samples
+from membench import read_results   # per-iteration memory kernel samples
+import iobench                      # per-second throughput and latency histograms of I/O runs
+import microservice                 # latency histograms of the microservice victim's client
+
+# iperf3log.py and wrklog.py live with the network tests
+NETWORK_TESTS = path.join(path.dirname(path.abspath(__file__)), '..', '..', 'network', 'tests')
+
+# Whether a larger value of each kind's metric is better (throughput) or worse (latency)
+HIGHER_IS_BETTER = {'linpack': True, 'iperf3': True, 'wrk': False, 'copy': True, 'scale': True, 'add': True,
+                    'triad': True, 'chase': False, 'io': True, 'io_latency': False, 'microservice': False}
+
+TABLE_HEADER = ['Scenario', 'Kind', 'Baseline samples', 'Victim samples', 'Baseline mean', 'Victim mean',
+                'Interference factor', 'Factor CI low', 'Factor CI high', 'Mann-Whitney p', 'Welch p', 'Significant',
+                'Level']
+
+
+def _network_module(name: str):
+    """
+    Import one of the network test parsers on first use
+    """
+    if NETWORK_TESTS not in sys.path:
+        sys.path.append(NETWORK_TESTS)
+    return __import__(name)
+
+
+def linpack_samples(logfile: str) -> np.ndarray:
+    """
+    The per-trial GFlops of a Linpack run, from its .npz store when there is one
+    :param logfile: the Linpack text log
+    :return: one value per trial, Linpack's average alone when the log only has its summary, or none before the
+             scenario has run
+    """
+    npz = path.splitext(logfile)[0] + '.npz'
+    if not path.exists(logfile) and not path.exists(npz):
+        return np.array([])
+    if path.exists(npz):
+        return load_trials(npz)['gflops']
+
+    stream = read_log(logfile)
+    if stream.trials:
+        return stream.columns()['gflops']
+    return np.array([] if stream.average is None else [stream.average])
+
+
+def iperf3_samples(logfile: str) -> np.ndarray:
+    """
+    The per-interval throughput of an iperf3 run
+    :param logfile: the iperf3 text or --json log, or a .npz written by iperf3log.save_result
+    :return: one bits/second value per interval
+    """
+    if logfile.endswith('.npz'):
+        with np.load(logfile) as data:
+            bps = data['bits_per_second']
+    else:
+        bps = _network_module('iperf3log').parse_log(logfile)['bits_per_second']
+    return bps[~np.isnan(bps)]
+
+
+def wrk_samples(logfile: str) -> np.ndarray:
+    """
+    The per-request latency of a wrk run, from the histogram printed by latency.lua
+    :param logfile: the wrk log
+    :return: one latency in seconds per request, or the mean latency alone for logs without a histogram
+    """
+    result = _network_module('wrklog').parse_log(logfile)
+    if result['histogram']:
+        values, counts = zip(*result['histogram'])
+        return np.repeat(np.array(values), np.array(counts, dtype=np.int64))
+    return np.array([] if result['latency'] is None else [result['latency']])
+
+
+def membench_samples(logfile: str, kernel: str) -> np.ndarray:
+    """
+    The per-iteration results of one memory kernel
+    :param logfile: the membench log
+    :param kernel: copy, scale, add, triad (GB/s) or chase (ns/access)
+    :return: one value per iteration
+    """
+    results = read_results(logfile)
+    return results[kernel]['values'] if kernel in results else np.array([])
+
+
+def io_samples(logfile: str) -> np.ndarray:
+    """
+    The per-second throughput of an iobench run
+    :param logfile: the iobench log
+    :return: one MB/s value per interval
+    """
+    return iobench.read_results(logfile)['intervals']
+
+
+def histogram_samples(summary: dict) -> np.ndarray:
+    """
+    Expand a log-scale latency histogram, as iobench and microservice write it, into its samples
+    :param summary: the run's summary record, or None when the run did not finish
+    :return: one latency in nanoseconds per op, at the lower bound of its bucket
+    """
+    if summary is None or not summary['histogram']:
+        return np.array([])
+    values, counts = zip(*summary['histogram'])
+    return np.repeat(np.array(values, dtype=float), np.array(counts, dtype=np.int64))
+
+
+def io_latency_samples(logfile: str) -> np.ndarray:
+    """
+    The per-op latency of an iobench run, from its log-scale histogram
+    :param logfile: the iobench log
+    :return: one latency in nanoseconds per op, at the lower bound of its bucket
+    """
+    return histogram_samples(iobench.read_results(logfile)['summary'])
+
+
+def microservice_samples(logfile: str) -> np.ndarray:
+    """
+    The per-request latency the microservice client measured, queueing included, from its log-scale histogram
+    :param logfile: the client's log
+    :return: one latency in nanoseconds per request, at the lower bound of its bucket, or none before the
+             scenario has run
+    """
+    if not path.exists(logfile):
+        return np.array([])
+    return histogram_samples(microservice.read_results(logfile)['summary'])
+
+
+LOADERS = {'linpack': linpack_samples, 'iperf3': iperf3_samples, 'wrk': wrk_samples, 'io': io_samples,
+           'io_latency': io_latency_samples, 'microservice': microservice_samples}
+LOADERS.update({k: partial(membench_samples, kernel=k) for k in ('copy', 'scale', 'add', 'triad', 'chase')})
+
+
+def load_runs(kind: str, patterns: [str]) -> [np.ndarray]:
+    """
+    The samples of every log matching the patterns, one array per log
+    :param kind: linpack, iperf3, wrk, a membench kernel, io, io_latency or microservice
+    :param patterns: log paths or glob patterns
+    :return: one array per log that has samples
+    """
+    files = sorted(f for p in patterns for f in (glob(p) or [p]))
+    return [a for a in (LOADERS[kind](f) for f in files) if len(a)]
+
+
+def load_samples(kind: str, patterns: [str]) -> np.ndarray:
+    """
+    Pool the samples of every log matching the patterns
+    :param kind: linpack, iperf3, wrk, a membench kernel, io, io_latency or microservice
+    :param patterns: log paths or glob patterns
+    :return: the samples of every matching log, concatenated
+    """
+    arrays = load_runs(kind, patterns)
+    return np.concatenate(arrays) if arrays else np.array([])
+
+
+def bootstrap_means(samples: np.ndarray, resamples: int=10000, rng: np.random.RandomState=None,
+                    max_elements: int=1 << 22) -> np.ndarray:
+    """
+    The means of resamples drawn with replacement, a whole block of resamples at a time
+    :param samples: the observed samples
+    :param resamples: the number of resamples
+    :param rng: the random generator, for reproducible intervals
+    :param max_elements: bound on the indices drawn at once, to keep memory flat for long runs
+    :return: one mean per resample
+    """
+    rng = rng or np.random.RandomState()
+    n = len(samples)
+    means = np.empty(resamples)
+    values, counts = np.unique(samples, return_counts=True)
+
+    if len(values) * 4 < n:
+        # Drawing n samples with replacement is drawing multinomial counts over the distinct values,
+        # which keeps per-request latency histograms with millions of requests cheap
+        block = max(max_elements // len(values), 1)
+        for first in range(0, resamples, block):
+            last = min(first + block, resamples)
+            means[first:last] = rng.multinomial(n, counts / n, size=last - first).dot(values) / n
+        return means
+
+    block = max(max_elements // n, 1)
+    for first in range(0, resamples, block):
+        last = min(first + block, resamples)
+        means[first:last] = samples[rng.randint(0, n, size=(last - first, n))].mean(axis=1)
+    return means
+
+
+def bootstrap_ci(samples: np.ndarray, resamples: int=10000, confidence: float=0.95,
+                 rng: np.random.RandomState=None) -> (float, float, float):
+    """
+    Percentile bootstrap confidence interval of the mean
+    :param samples: the observed samples
+    :param resamples: the number of resamples
+    :param confidence: the confidence level
+    :param rng: the random generator
+    :return: the mean and the interval's low and high ends, which are NaN with fewer than 2 samples
+    """
+    samples = np.asarray(samples, dtype=float)
+    if len(samples) < 2:
+        return (float(samples.mean()) if len(samples) else np.nan), np.nan, np.nan
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(bootstrap_means(samples, resamples, rng), [alpha, 1 - alpha])
+    return float(samples.mean()), float(low), float(high)
+
+
+def interference(baseline: np.ndarray, victim: np.ndarray, higher_is_better: bool=True, resamples: int=10000,
+                 confidence: float=0.95, rng: np.random.RandomState=None) -> dict:
+    """
+    Compare a contended run's samples with its baseline
+    :param baseline: samples of the uncontended run
+    :param victim: samples of the contended run
+    :param higher_is_better: True for throughput, False for latency
+    :param resamples: the number of bootstrap resamples
+    :param confidence: the confidence level of the factor's interval
+    :param rng: the random generator
+    :return: sample counts, means, the interference factor with its bootstrap interval, the Mann-Whitney and Welch p-values, and whether the difference is significant
+    """
+    baseline = np.asarray(baseline, dtype=float)
+    victim = np.asarray(victim, dtype=float)
+    result = {'baseline_n': len(baseline), 'victim_n': len(victim),
+              'baseline_mean': float(baseline.mean()) if len(baseline) else np.nan,
+              'victim_mean': float(victim.mean()) if len(victim) else np.nan,
+              'factor': np.nan, 'factor_low': np.nan, 'factor_high': np.nan,
+              'mannwhitney_p': np.nan, 'welch_p': np.nan, 'significant': False}
+    if not len(baseline) or not len(victim):
+        return result
+
+    # The factor is above 1 whenever the victim does worse, whichever direction is better
+    if higher_is_better:
+        result['factor'] = result['baseline_mean'] / result['victim_mean']
+    else:
+        result['factor'] = result['victim_mean'] / result['baseline_mean']
+    if len(baseline) < 2 or len(victim) < 2:
+        return result
+
+    # The factor's interval comes from resampling both sides independently
+    rng = rng or np.random.RandomState()
+    base_means = bootstrap_means(baseline, resamples, rng)
+    victim_means = bootstrap_means(victim, resamples, rng)
+    factors = base_means / victim_means if higher_is_better else victim_means / base_means
+    alpha = (1 - confidence) / 2
+    result['factor_low'], result['factor_high'] = (float(q) for q in np.quantile(factors, [alpha, 1 - alpha]))
+
+    result['mannwhitney_p'] = float(stats.mannwhitneyu(baseline, victim, alternative='two-sided')[1])
+    result['welch_p'] = float(stats.ttest_ind(baseline, victim, equal_var=False)[1])
+    result['significant'] = bool(max(result['mannwhitney_p'], result['welch_p']) < 1 - confidence and
+                                 not result['factor_low'] <= 1 <= result['factor_high'])
+    return result
+
+
+def aggregate(runs: [np.ndarray]) -> [np.ndarray]:
+    """
+    Sum concurrent streams interval by interval, over the intervals every stream has
+    :param runs: one array of per-interval samples per stream
+    :return: the aggregate as a single run, or no runs
+    """
+    if not runs:
+        return []
+    length = min(len(run) for run in runs)
+    return [np.sum([run[:length] for run in runs], axis=0)]
+
+
+def interference_table(spec: dict, resamples: int=10000, confidence: float=0.95, seed: int=None) -> [dict]:
+    """
+    Compare every scenario in a comparison spec with its baseline
+    :param spec: {"comparisons": [{"name", "kind", "baseline": [logs], "victim": [logs]}, ...]}, where logs may
+                 be glob patterns relative to the current directory; with "aggregate": true, the logs of each side
+                 are concurrent streams and are summed interval by interval, e.g. N iperf3 clients sharing a link
+    :param resamples: the number of bootstrap resamples
+    :param confidence: the confidence level
+    :param seed: seed for reproducible intervals
+    :return: one row per comparison, with its name, kind and level (sample, or run when run means are compared)
+             added to the result of interference
+    """
+    rng = np.random.RandomState(seed)
+    rows = []
+    for comparison in spec['comparisons']:
+        kind = comparison.get('kind', 'linpack')
+        baseline = load_runs(kind, comparison['baseline'])
+        victim = load_runs(kind, comparison['victim'])
+        if comparison.get('aggregate'):
+            baseline, victim = aggregate(baseline), aggregate(victim)
+        level = 'sample'
+        if any(len(run) == 1 for run in baseline + victim):
+            # A log with only its summary is one run's mean, not a sample of the per-trial distribution,
+            # so both sides are compared run mean against run mean
+            baseline = [run.mean(keepdims=True) for run in baseline]
+            victim = [run.mean(keepdims=True) for run in victim]
+            level = 'run'
+        row = interference(np.concatenate(baseline) if baseline else np.array([]),
+                           np.concatenate(victim) if victim else np.array([]),
+                           comparison.get('higher_is_better', HIGHER_IS_BETTER[kind]), resamples, confidence, rng)
+        rows.append(dict(row, name=comparison['name'], kind=kind, level=level))
+    return rows
+
+
+def write_table(filename: str, rows: [dict]):
+    """
+    Store the interference table as a CSV for the graph scripts
+    :param filename: the CSV file
+    :param rows: rows from interference_table
+    """
+    keys = ['name', 'kind', 'baseline_n', 'victim_n', 'baseline_mean', 'victim_mean', 'factor', 'factor_low',
+            'factor_high', 'mannwhitney_p', 'welch_p', 'significant', 'level']
+    with open(filename, 'w', newline='') as f:
+        wr = csv.writer(f, delimiter=',')
+        wr.writerow(TABLE_HEADER)
+        for row in rows:
+            wr.writerow(['' if isinstance(row[k], float) and np.isnan(row[k]) else row[k] for k in keys])
+
+
+if __name__ == '__main__':
+    # Usage: significance.py [comparisons.json [table.csv]]
+    with open(sys.argv[1] if len(sys.argv) > 1 else 'interference.json', 'r') as f:
+        spec = json.load(f)
+    rows = interference_table(spec, seed=spec.get('seed'))
+    write_table(sys.argv[2] if len(sys.argv) > 2 else './csv/interference.csv', rows)
+
+    for row in rows:
+        ci = f'[{row["factor_low"]:.3f}, {row["factor_high"]:.3f}]' if not np.isnan(row['factor_low']) else '[n/a]'
+        verdict = 'significant' if row['significant'] else 'not significant'
+        print(f'{row["name"]}: factor {row["factor"]:.3f} {ci}, {row["baseline_n"]} vs {row["victim_n"]} {row["level"]}s, '
+              f'Mann-Whitney p {row["mannwhitney_p"]:.3g}, Welch p {row["welch_p"]:.3g}, {verdict}')
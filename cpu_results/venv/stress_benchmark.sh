@@ -0,0 +1,4 @@
+#!/bin/bash
+
+# Usage: stress_benchmark.sh [workers [seconds]]
+time stress --cpu ${1:-2} --timeout ${2:-60}s --verbose
@@ -0,0 +1,68 @@
+"""
+Checks that run_concurrently overlaps its contenders, with a stand-in docker executable on PATH
+Usage: python3 -m unittest test_concurrency
+"""
+import os                           # PATH and DOCKER_HOST for the stand-in docker
+import stat                         # make the stand-in executable
+import tempfile                     # scratch directory for the stand-in, logs and windows
+import unittest                     # test runner
+from cpu_benchmarking import run_concurrently, run_docker  # the code under test
+
+# Answers Linpack's five prompts, runs for a second, prints two trials and records its own window
+STUB_DOCKER = '''#!/usr/bin/env python3
+import os, sys, time
+if sys.argv[1] != 'run':
+    sys.exit(0)
+name = sys.argv[sys.argv.index('--name') + 1]
+start = time.time()
+for prompt in ['Press enter', 'Number of equations', 'Leading dimension', 'Trials', 'Alignment']:
+    print(prompt + ':', flush=True)
+    sys.stdin.readline()
+time.sleep(1)
+print('Size   LDA    Align. Time(s)    GFlops   Residual     Residual(norm) Check', flush=True)
+for _ in range(2):
+    print('1000   1000   64     0.010      66.6667  1.0e-12      1.0e-02        pass', flush=True)
+with open(os.path.join(os.environ['STUB_WINDOWS'], name), 'w') as f:
+    f.write('{} {}'.format(start, time.time()))
+'''
+
+
+class RunConcurrentlyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        docker = os.path.join(self.directory.name, 'docker')
+        with open(docker, 'w') as f:
+            f.write(STUB_DOCKER)
+        os.chmod(docker, os.stat(docker).st_mode | stat.S_IXUSR)
+        self.environ = dict(os.environ)
+        # No daemon socket, so the contenders fork the (stand-in) docker CLI
+        os.environ.update(PATH=self.directory.name + os.pathsep + os.environ['PATH'],
+                          DOCKER_HOST='unix://' + os.path.join(self.directory.name, 'docker.sock'),
+                          STUB_WINDOWS=self.directory.name)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.directory.cleanup()
+
+    def test_windows_overlap(self):
+        names = ['contender_1', 'contender_2']
+        jobs = [(name, run_docker, dict(logfile=os.path.join(self.directory.name, name + '.log'), img='linpack',
+                                        container_name=name, trials='2', sample_rate=0, counter_rate=0))
+                for name in names]
+        results = run_concurrently(jobs, timeout=30)
+
+        for name in names:
+            self.assertEqual(results[name]['status'], 0, results[name]['error'])
+            self.assertEqual(results[name]['result'].trials, 2)
+        # Each contender started before any other finished, both as seen by the driver and by the containers
+        self.assertLess(max(r['start'] for r in results.values()), min(r['end'] for r in results.values()))
+        windows = []
+        for name in names:
+            with open(os.path.join(self.directory.name, name)) as f:
+                windows.append([float(t) for t in f.read().split()])
+        self.assertLess(max(start for start, _ in windows), min(end for _, end in windows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,293 @@
+"""
+Checks DockerClient and Lifecycle against a fake Engine API served on a unix socket
+Usage: python3 -m unittest test_docker_api
+"""
+import json                         # request and reply bodies
+import os                           # socket path
+import socket                       # the attached container's stream
+import socketserver                 # the fake daemon's threaded unix socket server
+import struct                       # multiplexed log frames
+import tempfile                     # scratch directory for the socket
+import unittest                     # test runner
+from http.server import BaseHTTPRequestHandler  # the fake daemon's HTTP handling
+from threading import Condition, Event, Thread  # container state shared between handlers
+from time import sleep, time_ns     # event timestamps and polling
+from urllib.parse import parse_qs, unquote, urlparse  # request routing
+from docker_api import DockerClient, DockerError, Lifecycle, demux  # the code under test
+from result_cache import host_fingerprint, image_digest, image_label  # image lookups over the API
+from sampler import container_pid   # container lookups over the API
+
+
+class FakeDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Just enough of the Engine API for DockerClient: containers are records, and a started container either
+    echoes what it reads from its attached stdin or, without an attach, writes to its logs and exits
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        self.containers = {}
+        self.images = {'linpack': {'Id': 'sha256:1234', 'Config': {'Labels': {'context': 'abcd'}}}}
+        self.events = []
+        self.changed = Condition()
+        super().__init__(socket_path, FakeHandler)
+
+    def event(self, name: str, action: str, **attributes):
+        with self.changed:
+            self.events.append({'Type': 'container', 'Action': action, 'timeNano': time_ns(),
+                                'Actor': {'Attributes': dict(name=name, **attributes)}})
+            self.changed.notify_all()
+
+    def finish(self, container: dict, code: int):
+        with self.changed:
+            container['running'] = False
+            container['code'] = code
+            self.changed.notify_all()
+        self.event(container['name'], 'die', exitCode=str(code))
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def address_string(self) -> str:
+        return 'unix'
+
+    def reply(self, status: int, body=None):
+        data = b'' if body is None else body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain' if isinstance(body, bytes) else 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def chunked(self):
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+        self.wfile.flush()
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method: str):
+        daemon = self.server
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        parts = [unquote(p) for p in url.path.split('/') if p]
+
+        if url.path == '/_ping':
+            return self.reply(200, b'OK')
+        if url.path == '/version':
+            return self.reply(200, {'Version': 'fake'})
+        if parts[:1] == ['images'] and parts[2:] == ['json']:
+            if parts[1] not in daemon.images:
+                return self.reply(404, {'message': f'No such image: {parts[1]}'})
+            return self.reply(200, daemon.images[parts[1]])
+        if url.path == '/containers/create':
+            name = query['name']
+            if name in daemon.containers:
+                return self.reply(409, {'message': f'Conflict. The container name "/{name}" is already in use'})
+            daemon.containers[name] = {'name': name, 'config': json.loads(body), 'running': False, 'code': None,
+                                       'sock': None, 'detached': None, 'out': b''}
+            daemon.event(name, 'create')
+            return self.reply(201, {'Id': name + '-id'})
+        if url.path == '/events':
+            self.chunked()
+            sent = 0
+            try:
+                while True:
+                    with daemon.changed:
+                        while sent >= len(daemon.events):
+                            daemon.changed.wait()
+                        new, sent = daemon.events[sent:], len(daemon.events)
+                    for event in new:
+                        self.chunk(json.dumps(event).encode() + b'\n')
+            except OSError:
+                self.close_connection = True
+            return
+        if parts[:1] != ['containers'] or len(parts) < 2:
+            return self.reply(404, {'message': 'page not found'})
+
+        container = daemon.containers.get(parts[1])
+        if container is None:
+            return self.reply(404, {'message': f'No such container: {parts[1]}'})
+        op = parts[2] if len(parts) > 2 else None
+        if method == 'DELETE':
+            if container['running']:
+                if query.get('force') != '1':
+                    return self.reply(409, {'message': 'You cannot remove a running container'})
+                daemon.finish(container, 137)
+            del daemon.containers[parts[1]]
+            daemon.event(container['name'], 'destroy')
+            return self.reply(204)
+        if op == 'json':
+            # A running container's init is this process, so its cgroup can be looked up
+            return self.reply(200, {'Name': '/' + container['name'],
+                                    'State': {'Running': container['running'],
+                                              'Pid': os.getpid() if container['running'] else 0},
+                                    'Config': {'Tty': container['config'].get('Tty', False)}})
+        if op == 'attach':
+            # The connection belongs to the container until it exits, from before the client can start it
+            container['sock'] = self.connection
+            container['detached'] = Event()
+            self.send_response(101)
+            self.send_header('Connection', 'Upgrade')
+            self.send_header('Upgrade', 'tcp')
+            self.end_headers()
+            self.wfile.flush()
+            container['detached'].wait()
+            self.close_connection = True
+            return
+        if op == 'start':
+            container['running'] = True
+            daemon.event(container['name'], 'start')
+            Thread(target=self.run, args=(container,), daemon=True).start()
+            return self.reply(204)
+        if op == 'wait':
+            with daemon.changed:
+                while container['running']:
+                    daemon.changed.wait()
+            return self.reply(200, {'StatusCode': container['code']})
+        if op == 'logs':
+            self.chunked()
+            with daemon.changed:
+                while container['running'] and query.get('follow') == '1':
+                    daemon.changed.wait()
+            self.chunk(struct.pack('>BxxxL', 1, len(container['out'])) + container['out'])
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.reply(404, {'message': 'page not found'})
+
+    def run(self, container: dict):
+        sock = container['sock']
+        if sock is None:
+            container['out'] = ' '.join(container['config'].get('Cmd') or []).encode() + b'\n'
+            self.server.finish(container, 0)
+            return
+        # A tty container: raw bytes both ways, one line echoed back
+        line = b''
+        while not line.endswith(b'\n'):
+            data = sock.recv(1)
+            if not data:
+                break
+            line += data
+        sock.sendall(b'echo ' + line)
+        sock.shutdown(socket.SHUT_RDWR)
+        container['detached'].set()
+        self.server.finish(container, 3 if line.strip() == b'fail' else 0)
+
+
+class DockerClientTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        socket_path = os.path.join(self.directory.name, 'docker.sock')
+        self.daemon = FakeDaemon(socket_path)
+        Thread(target=self.daemon.serve_forever, daemon=True).start()
+        self.client = DockerClient(socket_path)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        self.directory.cleanup()
+
+    def test_ping(self):
+        self.assertTrue(self.client.ping())
+
+    def test_create_conflict(self):
+        self.assertEqual(self.client.create('c1', 'linpack', cpuset='0,1'), 'c1-id')
+        self.assertEqual(self.daemon.containers['c1']['config']['HostConfig']['CpusetCpus'], '0,1')
+        with self.assertRaises(DockerError) as raised:
+            self.client.create('c1', 'linpack')
+        self.assertEqual(raised.exception.status, 409)
+
+    def test_attach_start_wait(self):
+        for name, line, code in [('ok', b'hello', 0), ('bad', b'fail', 3)]:
+            self.client.create(name, 'linpack', tty=True, stdin=True)
+            sock = self.client.attach(name)
+            self.client.start(name)
+            sock.sendall(line + b'\n')
+            output = b''
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                output += data
+            sock.close()
+            self.assertEqual(output, b'echo ' + line + b'\n')
+            self.assertEqual(self.client.wait(name), code)
+
+    def test_logs(self):
+        self.client.create('c1', 'stress', cmd=['2', '60'])
+        self.client.start('c1')
+        self.assertEqual(b''.join(data for _, data in self.client.logs('c1', follow=True)), b'2 60\n')
+
+    def test_remove_many(self):
+        names = [f'c{i}' for i in range(8)]
+        for name in names:
+            self.client.create(name, 'linpack')
+        self.client.start('c0')
+        # Containers that do not exist are not failures
+        self.assertEqual(self.client.remove_many(names + ['missing']), [])
+        self.assertEqual(self.daemon.containers, {})
+        self.assertFalse(self.client.exists('c0'))
+
+    def test_events(self):
+        names = ['c1', 'c2']
+        with Lifecycle(self.client, names) as lifecycle:
+            for name in names + ['other']:
+                self.client.create(name, 'stress')
+            self.assertEqual(self.client.start_many(names), [])
+            self.assertEqual(self.client.wait_many(names), [0, 0])
+            self.assertEqual(self.client.remove_many(names), [])
+            # The destroy events reach the subscriber shortly after the removals return
+            for _ in range(100):
+                if all('destroy' in lifecycle.times.get(name, {}) for name in names):
+                    break
+                sleep(0.05)
+        self.assertEqual(set(lifecycle.times), set(names))
+        for name in names:
+            self.assertEqual(list(lifecycle.times[name]), ['create', 'start', 'die', 'destroy'])
+        self.assertEqual(lifecycle.exit_codes, {'c1': 0, 'c2': 0})
+        self.assertGreaterEqual(lifecycle.skew('start'), 0)
+
+    def test_lookups_without_cli(self):
+        environ = dict(os.environ)
+        # No docker CLI, so every lookup has to go through the API
+        os.environ.update(DOCKER_HOST='unix://' + self.client.socket_path, PATH=self.directory.name)
+        try:
+            self.client.create('c1', 'linpack')
+            self.assertIsNone(container_pid('c1'))
+            self.daemon.containers['c1']['running'] = True
+            self.assertEqual(container_pid('c1'), os.getpid())
+            self.assertIsNone(container_pid('missing'))
+            self.assertEqual(image_digest('linpack'), 'sha256:1234')
+            self.assertIsNone(image_digest('missing'))
+            self.assertEqual(image_label('linpack', 'context'), 'abcd')
+            self.assertIsNone(image_label('linpack', 'other'))
+            self.assertEqual(host_fingerprint()['docker'], 'fake')
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+    def test_demux(self):
+        frames = struct.pack('>BxxxL', 1, 3) + b'out' + struct.pack('>BxxxL', 2, 3) + b'err'
+        self.assertEqual(list(demux([frames[:5], frames[5:]])), [(1, b'out'), (2, b'err')])
+
+
+if __name__ == '__main__':
+    unittest.main()
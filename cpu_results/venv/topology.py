@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+"""
+Read the host's CPU topology (SMT siblings, last-level caches and NUMA nodes) from sysfs and plan
+cpuset and cpuset.mems assignments for N containers under a placement policy
+"""
+
+import json                         # plans on the command line
+import sys                          # command line arguments
+from os import cpu_count, listdir, path  # sysfs layout
+
+SYSFS = '/sys/devices/system'
+
+# How containers are placed relative to each other:
+#   isolate     whole physical cores each, spread over last-level caches and nodes
+#   share_llc   whole physical cores each, all under one last-level cache
+#   split_smt   SMT siblings of the same physical cores split between containers
+#   cross_numa  whole physical cores each, every container on a different NUMA node
+POLICIES = ('isolate', 'share_llc', 'split_smt', 'cross_numa')
+
+
+def parse_cpulist(cpulist: str) -> [int]:
+    """
+    Turn a sysfs or cpuset list such as '0-3,8' into cpu numbers
+    :param cpulist: the list
+    :return: the sorted cpu numbers
+    """
+    cpus = set()
+    for part in cpulist.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpulist(cpus: [int]) -> str:
+    """
+    The compact list docker takes for --cpuset-cpus and --cpuset-mems, e.g. '0-3,8'
+    :param cpus: cpu (or node) numbers
+    :return: the list, with runs collapsed into ranges
+    """
+    ranges = []
+    for c in sorted(set(cpus)):
+        if ranges and ranges[-1][1] == c - 1:
+            ranges[-1][1] = c
+        else:
+            ranges.append([c, c])
+    return ','.join(str(a) if a == b else f'{a}-{b}' for a, b in ranges)
+
+
+def _read(filename: str, default: str=None) -> str:
+    """
+    The stripped content of a sysfs file, or default when it cannot be read
+    """
+    try:
+        with open(filename, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+class Topology:
+    """
+    Online cpus grouped into physical cores, last-level cache domains and NUMA nodes
+    """
+
+    def __init__(self, root: str=SYSFS):
+        """
+        :param root: the sysfs directory holding cpu/ and node/, which tests can point at a copy
+        """
+        cpu_dir = path.join(root, 'cpu')
+        online = _read(path.join(cpu_dir, 'online'))
+        self.cpus = parse_cpulist(online) if online else list(range(cpu_count() or 1))
+
+        # Every cpu falls back to its own core, one shared cache and node 0 when sysfs does not say
+        self.node = {c: 0 for c in self.cpus}
+        node_dir = path.join(root, 'node')
+        if path.isdir(node_dir):
+            for entry in listdir(node_dir):
+                if entry.startswith('node') and entry[4:].isdigit():
+                    for c in parse_cpulist(_read(path.join(node_dir, entry, 'cpulist'), '')):
+                        self.node[c] = int(entry[4:])
+
+        self.core = {}
+        self.llc = {}
+        for c in self.cpus:
+            topo = path.join(cpu_dir, f'cpu{c}', 'topology')
+            siblings = _read(path.join(topo, 'thread_siblings_list')) or _read(path.join(topo, 'core_cpus_list'))
+            self.core[c] = min(parse_cpulist(siblings)) if siblings else c
+            self.llc[c] = self._llc_of(path.join(cpu_dir, f'cpu{c}', 'cache'))
+
+    def _llc_of(self, cache_dir: str) -> int:
+        """
+        The lowest cpu sharing the cpu's highest-level data or unified cache, which names its domain
+        """
+        level, shared = 0, None
+        if path.isdir(cache_dir):
+            for index in listdir(cache_dir):
+                d = path.join(cache_dir, index)
+                if not index.startswith('index') or _read(path.join(d, 'type')) == 'Instruction':
+                    continue
+                lvl = int(_read(path.join(d, 'level'), '0'))
+                cpus = _read(path.join(d, 'shared_cpu_list'))
+                if lvl > level and cpus:
+                    level, shared = lvl, cpus
+        return min(parse_cpulist(shared)) if shared else 0
+
+    def cores(self) -> [[int]]:
+        """
+        The online SMT siblings of every physical core, ordered by node, cache domain and cpu
+        """
+        cores = {}
+        for c in self.cpus:
+            cores.setdefault(self.core[c], []).append(c)
+        return sorted(cores.values(), key=lambda t: (self.node[t[0]], self.llc[t[0]], t[0]))
+
+    def domains(self, key: dict) -> [[[int]]]:
+        """
+        Physical cores grouped by last-level cache (key=self.llc) or by node (key=self.node)
+        """
+        groups = {}
+        for core in self.cores():
+            groups.setdefault(key[core[0]], []).append(core)
+        return [groups[k] for k in sorted(groups)]
+
+    def summary(self) -> dict:
+        """
+        The shape of the host, stored with every placement so results from different hosts can be told apart
+        """
+        cores = self.cores()
+        return {'cpus': len(self.cpus), 'cores': len(cores), 'threads_per_core': max(len(t) for t in cores),
+                'llcs': len(set(self.llc.values())), 'nodes': len(set(self.node.values()))}
+
+
+def _take(domain: [[int]], count: int) -> [[int]]:
+    """
+    Remove and return the first count cores of a domain
+    """
+    taken = domain[:count]
+    del domain[:count]
+    return taken
+
+
+def plan(policy: str, count: int, cpus: int=1, topology: Topology=None) -> [dict]:
+    """
+    Assign cpus and memory nodes to containers under a placement policy
+    :param policy: isolate, share_llc, split_smt or cross_numa
+    :param count: the number of containers
+    :param cpus: cpus per container
+    :param topology: the host topology, read from sysfs when not given
+    :return: one {'policy', 'cpuset', 'mems'} per container, with docker's list syntax
+    """
+    topology = topology or Topology()
+    if policy not in POLICIES:
+        raise ValueError(f'Unknown placement "{policy}". Expecting {", ".join(POLICIES)}.')
+
+    cores = topology.cores()
+    threads = max(len(t) for t in cores)
+    # Whole-core policies give each container enough physical cores that no sibling is shared
+    needed = -(-cpus // threads)
+    assignments = []
+
+    if policy == 'split_smt':
+        if threads < 2:
+            raise ValueError('split_smt needs SMT siblings, which this host does not have.')
+        # Each group of `threads` containers shares the same cores, one sibling each
+        smt = [core for core in cores if len(core) == threads]
+        groups = -(-count // threads)
+        if groups * cpus > len(smt):
+            raise ValueError(f'split_smt needs {groups * cpus} SMT cores, the host has {len(smt)}.')
+        for k in range(count):
+            group = smt[(k // threads) * cpus:(k // threads + 1) * cpus]
+            assignments.append([core[k % threads] for core in group])
+
+    elif policy == 'share_llc':
+        fits = [d for d in topology.domains(topology.llc) if len(d) >= needed * count]
+        if not fits:
+            raise ValueError(f'share_llc needs {needed * count} cores under one last-level cache.')
+        domain = fits[0]
+        for _ in range(count):
+            assignments.append([c for core in _take(domain, needed) for c in core][:cpus])
+
+    else:
+        # isolate spreads containers over cache domains, cross_numa over nodes
+        domains = topology.domains(topology.node if policy == 'cross_numa' else topology.llc)
+        if policy == 'cross_numa' and count > 1 and len(domains) < 2:
+            raise ValueError('cross_numa needs at least 2 NUMA nodes, the host has 1.')
+        for k in range(count):
+            # Round-robin over the domains, moving on to any domain with room when one is full
+            order = domains[k % len(domains):] + domains[:k % len(domains)]
+            domain = next((d for d in order if len(d) >= needed), None)
+            if domain is None or (policy == 'cross_numa' and domain is not order[0]):
+                raise ValueError(f'{policy} needs {needed} free cores for container {k + 1} of {count}.')
+            assignments.append([c for core in _take(domain, needed) for c in core][:cpus])
+
+    return [{'policy': policy, 'cpuset': format_cpulist(a), 'mems': format_cpulist(topology.node[c] for c in a)}
+            for a in assignments]
+
+
+if __name__ == '__main__':
+    # Usage: topology.py [policy count [cpus [sysfs]]]
+    topology = Topology(sys.argv[4] if len(sys.argv) > 4 else SYSFS)
+    print(json.dumps(topology.summary()))
+    policies = [sys.argv[1]] if len(sys.argv) > 1 else POLICIES
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    cpus = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    for policy in policies:
+        try:
+            print(policy + ': ' + json.dumps(plan(policy, count, cpus, topology)))
+        except ValueError as e:
+            print(policy + ': ' + str(e))
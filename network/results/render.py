@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+
+import sys
+import os
+import json
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# The plotting stack is imported once, before the worker processes are forked,
+# and always draws with the non-interactive Agg backend.
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn
+import pandas
+
+# This script renders every figure declared in figures.json from its CSV,
+# replacing the one-script-per-graph list that makegraphs used to run.
+#
+# Script usage:
+#
+#   render.py [figures.json] [--force] [--jobs n]
+#
+#     Renders the figures in parallel with n worker processes (default: one
+#     per core). A figure is skipped when its PNG exists and neither its CSV
+#     nor its entry in figures.json changed since it was last rendered; the
+#     hashes are kept in .render_cache next to figures.json. --force renders
+#     every figure.
+#
+# Figure entries:
+#
+#   {"name": "test3_graph1", "x": "Download type", "y": "Throughput (Mbps)",
+#    "hue": null, "kind": "bar", "title": "...", "xlabel": "...",
+#    "ylabel": "...", "yticks": [0, 901, 100], "ylim": [0, 950]}
+#
+#     Draws a seaborn catplot of name.csv (or "csv") into name.png (or
+#     "png"). Only name, x and y are required; yticks are range() arguments.
+
+cache_name = '.render_cache'
+
+seaborn.set()
+
+def paths(figure, directory):
+    csv = os.path.join(directory, figure.get('csv', figure['name'] + '.csv'))
+    png = os.path.join(directory, figure.get('png', figure['name'] + '.png'))
+    return csv, png
+
+def digest(figure, directory):
+    # Covers the data, the figure's declaration and the plotting stack, so a
+    # changed label or a seaborn upgrade also re-renders the figure.
+    csv, png = paths(figure, directory)
+    h = hashlib.sha1(json.dumps(figure, sort_keys=True).encode())
+    h.update((matplotlib.__version__ + seaborn.__version__).encode())
+    with open(csv, 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+def render(figure, directory):
+    csv, png = paths(figure, directory)
+    data = pandas.read_csv(csv)
+    graph = seaborn.catplot(x=figure['x'], y=figure['y'], hue=figure.get('hue'),
+                            kind=figure.get('kind', 'bar'), data=data)
+    graph.set(**{k: figure[k] for k in ('xlabel', 'ylabel', 'title') if k in figure})
+    if 'yticks' in figure:
+        graph.ax.set_yticks(range(*figure['yticks']))
+    if 'ylim' in figure:
+        graph.ax.set_ylim(*figure['ylim'])
+    graph.savefig(png)
+
+    # Closing every figure keeps a worker's memory flat however many it draws.
+    plt.close(graph.fig)
+    return png
+
+def load_cache(filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def render_all(spec_file, force=False, jobs=None):
+    directory = os.path.dirname(os.path.abspath(spec_file))
+    with open(spec_file) as f:
+        figures = json.load(f)['figures']
+    cache_file = os.path.join(directory, cache_name)
+    cache = load_cache(cache_file)
+
+    stale = []
+    for figure in figures:
+        h = digest(figure, directory)
+        if force or cache.get(figure['name']) != h or not os.path.exists(paths(figure, directory)[1]):
+            stale.append((figure, h))
+
+    if stale:
+        with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count() or 1, len(stale))) as pool:
+            futures = [(figure, h, pool.submit(render, figure, directory)) for figure, h in stale]
+            for figure, h, future in futures:
+                print(future.result())
+                cache[figure['name']] = h
+
+    # Figures that are no longer declared are forgotten.
+    names = {figure['name'] for figure in figures}
+    with open(cache_file, 'w') as f:
+        json.dump({k: v for k, v in cache.items() if k in names}, f, indent=1, sort_keys=True)
+    return len(stale), len(figures)
+
+if __name__ == "__main__":
+    # Script usage.
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    jobs = int(sys.argv[sys.argv.index('--jobs') + 1]) if '--jobs' in sys.argv else None
+    if jobs is not None:
+        args.remove(str(jobs))
+    spec_file = args[0] if args else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'figures.json')
+
+    start = time.time()
+    rendered, total = render_all(spec_file, '--force' in sys.argv, jobs)
+    print('rendered {} of {} figures in {:.1f}s'.format(rendered, total, time.time() - start))
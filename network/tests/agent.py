@@ -0,0 +1,281 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+import subprocess
+import socketserver
+from runcmd import gated, kill
+from iperf3log import split_interval
+from sampling import start_sampler, stop_sampler
+from netlab import native
+import test1
+import test2
+
+# This file contains the agent that runs one role (the iperf3 servers or
+# the iperf3 clients) of test1.py or test2.py on its host, for
+# coordinator.py to drive both hosts of a split-host test at once.
+#
+# The agent answers requests on a TCP port, one JSON object per line, with
+# one JSON line per reply:
+#
+#   {"op": "clock"}
+#     -> {"time": t}, the agent's time.time(), for the coordinator to
+#        estimate the offset between the two hosts' clocks.
+#   {"op": "start", "role": "server" | "client", "test": "test1", "n": n,
+#    "host": host, "time": 60, "bandwidth": "116M", "native": false}
+#     -> {"job": id}. Removes the role's old logs (server<i>.log or
+#        client<i>.log under rawlogs), then runs the role's n instances,
+#        held at a gate and released together. Every instance's output is
+#        piped (iperf3 with --forceflush) into its log as it arrives, and
+#        the arrival time of every interval line is recorded. "native"
+#        runs the clients' iperf3 without Docker, e.g. on loopback.
+#   {"op": "listening", "ports": [5201, ...], "wait": 10}
+#     -> {"listening": true} once every port is listening, or false after
+#        wait seconds. Checked with ss, since connecting to an iperf3 -s -1
+#        port would use up its one test.
+#   {"op": "wait", "job": id, "timeout": s}
+#     -> the job's role, done, launched times, return codes, logs and
+#        interval arrival times (stamps, per log), once it is done or
+#        after timeout seconds.
+#   {"op": "fetch", "path": filename}
+#     -> {"size": bytes}, followed by the file's raw bytes. Only the logs
+#        listed by a job can be fetched.
+#
+# Script usage:
+#
+#   agent.py [--listen address] [--port 5300]
+#
+#   The agent listens on 127.0.0.1 unless given an address, and has no
+#   authentication: only listen on a network the coordinator alone can reach.
+#
+#   Example, one agent on each host:
+#
+#     agent.py --listen 10.0.0.1 --port 5300
+#
+# Python function usage:
+#
+#   request(address, message)
+#
+#     Sends one request to the agent at (host, port) and returns its reply.
+#   fetch(address, filename, destination)
+#
+#     Copies a file from the agent's host to destination.
+
+default_port = 5300
+tests = {'test1': test1, 'test2': test2}
+jobs = dict()
+jobs_lock = threading.Lock()
+
+def piped(command):
+    # The agent writes the log itself, so iperf3 prints to stdout, flushing
+    # every interval line.
+    command = list(command)
+    if '--logfile' in command:
+        i = command.index('--logfile')
+        del command[i:i + 2]
+    if '--forceflush' not in command:
+        command.append('--forceflush')
+    return command
+
+def listening(ports):
+    listed = subprocess.run(['ss', '-Hltn'], stdout=subprocess.PIPE, universal_newlines=True).stdout
+    open_ports = {int(line.split()[3].rsplit(':', 1)[1]) for line in listed.splitlines()}
+    return set(ports) <= open_ports
+
+def copy_output(process, logfile, stamps):
+    in_summary = False
+    with open(logfile, 'w') as f:
+        for line in process.stdout:
+            now = time.time()
+            f.write(line)
+            in_summary = in_summary or line.startswith('- - -')
+            if not in_summary and split_interval(line) is not None:
+                stamps.append(now)
+
+def run_role(job, test, role, n, native_client):
+    if role == 'server':
+        commands = [piped(test.server_getcmd(i)) for i in range(1, n + 1)]
+        logfiles = [test.server_logfile_format.format(i) for i in range(1, n + 1)]
+    else:
+        commands = [piped(test.client_getcmd(i)) for i in range(1, n + 1)]
+        if native_client:
+            commands = [native(command) for command in commands]
+        logfiles = [test.client_logfile_format.format(i) for i in range(1, n + 1)]
+    job['logs'] = logfiles
+    job['stamps'] = {logfile: list() for logfile in logfiles}
+
+    samples = os.path.join(test.log_directory, '{}.samples'.format(role))
+    containers = [] if role == 'server' or native_client else \
+        [test.container_name_format.format(i) for i in range(1, n + 1)]
+    sampler = start_sampler(samples, containers)
+    processes = [subprocess.Popen(gated(command, False), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT, universal_newlines=True, start_new_session=True)
+                 for command in commands]
+    readers = [threading.Thread(target=copy_output, args=(p, logfile, job['stamps'][logfile]), daemon=True)
+               for p, logfile in zip(processes, logfiles)]
+    for reader in readers:
+        reader.start()
+
+    # Release every instance at once.
+    for i, p in enumerate(processes):
+        p.stdin.write('\n')
+        p.stdin.close()
+        job['launched'][i] = time.time()
+
+    deadline = time.time() + test.time + 60
+    for i, p in enumerate(processes):
+        try:
+            job['returncodes'][i] = p.wait(timeout=max(deadline - time.time(), 0))
+        except subprocess.TimeoutExpired:
+            kill(p)
+            job['returncodes'][i] = p.wait()
+    for reader in readers:
+        reader.join()
+    stop_sampler(sampler)
+    if role == 'client' and not native_client:
+        test.remove_docker_containers(n)
+    # The host's samples, and each container's.
+    job['logs'] += sorted(glob.glob(samples + '*'))
+
+def start(message):
+    test = tests[message.get('test', 'test1')]
+    role = message['role']
+    n = int(message['n'])
+    # The command builders read these module globals.
+    test.host = message.get('host', 'localhost')
+    test.time = int(message.get('time', test.time))
+    if test is test2:
+        test.bandwidth = message['bandwidth']
+
+    os.makedirs(test.log_directory, exist_ok=True)
+    logfile_format = test.server_logfile_format if role == 'server' else test.client_logfile_format
+    samples = os.path.join(test.log_directory, '{}.samples'.format(role))
+    for filename in glob.glob(logfile_format.format('*')) + glob.glob(samples + '*'):
+        os.remove(filename)
+
+    with jobs_lock:
+        job_id = len(jobs) + 1
+        job = jobs[job_id] = {'role': role, 'done': threading.Event(), 'launched': [None] * n,
+                              'returncodes': [None] * n, 'logs': list(), 'stamps': dict(), 'error': None}
+
+    def run():
+        try:
+            run_role(job, test, role, n, message.get('native', False))
+        except Exception as e:
+            job['error'] = str(e)
+        job['done'].set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return {'job': job_id}
+
+def wait(message):
+    job = jobs[int(message['job'])]
+    job['done'].wait(message.get('timeout'))
+    return {'role': job['role'], 'done': job['done'].is_set(), 'launched': job['launched'],
+            'returncodes': job['returncodes'], 'logs': job['logs'], 'stamps': job['stamps'],
+            'error': job['error']}
+
+def read_log(message):
+    path = os.path.realpath(message['path'])
+    with jobs_lock:
+        logs = {os.path.realpath(log) for job in jobs.values() for log in job['logs']}
+    if path not in logs:
+        raise ValueError('{} is not a log of any job'.format(message['path']))
+    with open(path, 'rb') as f:
+        return f.read()
+
+def wait_listening(message):
+    deadline = time.time() + float(message.get('wait', 10))
+    while True:
+        if listening(message['ports']):
+            return {'listening': True}
+        if time.time() > deadline:
+            return {'listening': False}
+        time.sleep(0.01)
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            message = json.loads(line.decode())
+            op = message['op']
+            if op == 'fetch':
+                try:
+                    data = read_log(message)
+                except Exception as e:
+                    self.wfile.write(json.dumps({'error': str(e)}).encode() + b'\n')
+                    continue
+                self.wfile.write(json.dumps({'size': len(data)}).encode() + b'\n' + data)
+                continue
+            try:
+                if op == 'clock':
+                    reply = {'time': time.time()}
+                elif op == 'start':
+                    reply = start(message)
+                elif op == 'listening':
+                    reply = wait_listening(message)
+                elif op == 'wait':
+                    reply = wait(message)
+                else:
+                    reply = {'error': 'unknown op {}'.format(op)}
+            except Exception as e:
+                reply = {'error': str(e)}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class Connection:
+    # One connection to an agent, for requests made one after another.
+    def __init__(self, address):
+        import socket
+        self.sock = socket.create_connection(address)
+        self.file = self.sock.makefile('rb')
+
+    def send(self, message):
+        self.sock.sendall(json.dumps(message).encode() + b'\n')
+        reply = json.loads(self.file.readline().decode())
+        if reply.get('error'):
+            raise RuntimeError('agent: {}'.format(reply['error']))
+        return reply
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def request(address, message):
+    connection = Connection(address)
+    try:
+        return connection.send(message)
+    finally:
+        connection.close()
+
+def fetch(address, filename, destination):
+    connection = Connection(address)
+    try:
+        size = connection.send({'op': 'fetch', 'path': filename})['size']
+        with open(destination, 'wb') as f:
+            while size > 0:
+                chunk = connection.file.read(min(size, 1 << 20))
+                if not chunk:
+                    raise RuntimeError('agent: {} was cut short'.format(filename))
+                f.write(chunk)
+                size -= len(chunk)
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    # Script usage.
+    parser = argparse.ArgumentParser(description='runs one role of the iperf3 tests for coordinator.py')
+    parser.add_argument('--listen', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=default_port)
+    args = parser.parse_args()
+
+    server = Server((args.listen, args.port), Handler)
+    print('Agent listening on {}:{}'.format(args.listen, args.port), file=sys.stderr)
+    server.serve_forever()
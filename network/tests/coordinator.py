@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+from agent import Connection, default_port, fetch, request
+from iperf3log import parse_log, save_result
+import test1
+
+# This file runs both halves of test1.py or test2.py as one command, through
+# an agent.py on the server host and one on the client host (the same host
+# twice for loopback runs).
+#
+# The coordinator:
+#
+#   1. estimates each agent's clock offset from the round trip with the
+#      smallest delay out of a few clock requests,
+#   2. starts the n servers, waits until ports base_port through
+#      base_port + n - 1 are all listening, then starts the n clients at
+#      once, so there is no dead time between the two phases,
+#   3. waits for both roles, then fetches every log from both agents in
+#      parallel into out/n=<n>/, the layout iperf3log.py reads, and
+#   4. stores each log's parsed intervals next to it (<log>.npz), with the
+#      arrival time of every interval line on the coordinator's clock
+#      ("arrival") and the test's start on that clock ("timestamp"), so the
+#      server's and the clients' intervals line up with each other.
+#
+# Script usage:
+#
+#   coordinator.py n --server host[:port] --client host[:port] [--test test1 | test2]
+#     [-b bandwidth] [-t seconds] [--native] [--out directory]
+#
+#   host is where the agent runs and, for --server, the address the clients
+#   connect to. --native runs the clients' iperf3 without Docker. out
+#   defaults to the test's name, e.g. test1/n=64/.
+#
+#   Example, 64 streams over loopback:
+#
+#     agent.py --port 5300 &
+#     agent.py --port 5301 &
+#     coordinator.py 64 --server 127.0.0.1:5300 --client 127.0.0.1:5301 --native
+#
+# Python function usage:
+#
+#   clock_offset(address, samples=8)
+#
+#     Returns how far the agent's clock is ahead of this host's, in seconds.
+#
+#   run(n, server, client, test='test1', duration=60, bandwidth=None, native=False, out=None)
+#
+#     Runs one coordinated test and returns its directory.
+
+def address(text):
+    host, _, port = text.partition(':')
+    return (host, int(port) if port else default_port)
+
+def clock_offset(address, samples=8):
+    connection = Connection(address)
+    try:
+        best = None
+        for _ in range(samples):
+            sent = time.time()
+            remote = connection.send({'op': 'clock'})['time']
+            received = time.time()
+            # The reply's time falls within the round trip; assume its middle.
+            if best is None or received - sent < best[0]:
+                best = (received - sent, remote - (sent + received) / 2)
+        return best[1]
+    finally:
+        connection.close()
+
+def to_shared(times, offset):
+    return [None if t is None else t - offset for t in times]
+
+def skew(times):
+    times = [t for t in times if t is not None]
+    return max(times) - min(times) if times else None
+
+def run(n, server, client, test='test1', duration=60, bandwidth=None, native=False, out=None):
+    out = os.path.join(out or test, 'n={}'.format(n))
+    os.makedirs(out, exist_ok=True)
+    agents = {'server': server, 'client': client}
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        offsets = dict(zip(agents, pool.map(clock_offset, agents.values())))
+    for role, offset in offsets.items():
+        print('{} agent clock offset: {:+.6f} s'.format(role, offset))
+
+    job = {'op': 'start', 'test': test, 'n': n, 'host': server[0], 'time': duration,
+           'bandwidth': bandwidth, 'native': native}
+    jobs = {'server': request(server, dict(job, role='server'))['job']}
+    ports = list(range(test1.base_port, test1.base_port + n))
+    if not request(server, {'op': 'listening', 'ports': ports, 'wait': 30})['listening']:
+        raise RuntimeError('the servers are not listening on ports {}-{}'.format(ports[0], ports[-1]))
+    listening = time.time()
+    jobs['client'] = request(client, dict(job, role='client'))['job']
+
+    def wait(role):
+        return request(agents[role], {'op': 'wait', 'job': jobs[role]})
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        replies = dict(zip(agents, pool.map(wait, agents)))
+    for role, reply in replies.items():
+        if reply['error']:
+            raise RuntimeError('{} agent: {}'.format(role, reply['error']))
+        failed = [i for i, code in enumerate(reply['returncodes'], 1) if code != 0]
+        if failed:
+            print('{} instances {} exited with an error'.format(role, failed))
+
+    server_launched = to_shared(replies['server']['launched'], offsets['server'])
+    client_launched = to_shared(replies['client']['launched'], offsets['client'])
+    print('Server launch skew: {:.6f} s'.format(skew(server_launched)))
+    print('Client launch skew: {:.6f} s'.format(skew(client_launched)))
+    print('Dead time from servers listening to clients launched: {:.6f} s'.format(min(client_launched) - listening))
+
+    # Every log from both agents at once.
+    fetches = [(agents[role], log, os.path.join(out, os.path.basename(log)), offsets[role], reply['stamps'].get(log))
+               for role, reply in replies.items() for log in reply['logs']]
+    with ThreadPoolExecutor(max_workers=min(len(fetches), 32)) as pool:
+        for f in [pool.submit(fetch, agent, log, destination) for agent, log, destination, _, _ in fetches]:
+            f.result()
+
+    for _, _, destination, offset, stamps in fetches:
+        if stamps is None:
+            continue
+        result = parse_log(destination)
+        arrival = numpy.array(to_shared(stamps, offset), dtype=float)
+        result['arrival'] = arrival
+        if len(arrival) and len(arrival) == len(result['end']):
+            # Each line is printed as its interval ends.
+            result['timestamp'] = float(numpy.median(arrival - result['end']))
+        save_result(result, destination[:-len('.log')] + '.npz')
+    return out
+
+if __name__ == "__main__":
+    # Script usage.
+    parser = argparse.ArgumentParser(description='runs the servers and clients of test1.py or test2.py '
+                                                 'through agent.py on each host')
+    parser.add_argument('n', type=int)
+    parser.add_argument('--server', type=address, required=True)
+    parser.add_argument('--client', type=address, required=True)
+    parser.add_argument('--test', choices=['test1', 'test2'], default='test1')
+    parser.add_argument('-b', '--bandwidth')
+    parser.add_argument('-t', '--time', type=int, default=60)
+    parser.add_argument('--native', action='store_true')
+    parser.add_argument('--out')
+    args = parser.parse_args()
+    if args.test == 'test2' and args.bandwidth is None:
+        parser.error('test2 needs -b bandwidth')
+
+    out = run(args.n, args.server, args.client, args.test, args.time, args.bandwidth, args.native, args.out)
+    print('Logs in {}'.format(out), file=sys.stderr)
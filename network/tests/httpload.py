@@ -0,0 +1,371 @@
+#!/usr/bin/python3
+
+import json
+import math
+import time
+import resource
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+from multiprocessing import Pool
+
+# uvloop is used when it is installed; plain asyncio otherwise.
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# This file contains an asyncio HTTP/1.1 load generator that stands in for
+# wrk (and wrk2's constant-rate mode), and a script to run it from the
+# command line. Its report has the same layout as wrk's, including the JSON
+# line latency.lua prints, so wrklog.py parses both the same way.
+#
+# Script usage:
+#
+#   httpload.py [-c connections] [-d duration] [-R rate] [-p processes]
+#               [--timeout seconds] url
+#
+#     Without -R the test is closed-loop, like wrk: every connection sends
+#     its next request as soon as the last response is in. With -R the test
+#     is open-loop at a constant rate, like wrk2: request i is due at
+#     start + i / rate whether or not earlier ones have finished, and its
+#     latency is measured from when it was due, so a stalled server is not
+#     hidden by requests that were never sent (coordinated omission).
+#     Requests that time out are recorded at the time they were given up
+#     on, so stalls stay in the histogram.
+#     Connections are kept alive and reused; in open-loop mode up to
+#     -c connections are opened on demand.
+#
+#     -p splits the connections (and rate) over that many processes, each
+#     with its own event loop, and merges their histograms, so thousands of
+#     connections do not queue behind one Python interpreter.
+#
+#   Example:
+#
+#     httpload.py -c 64 -d 60s -R 2000 http://127.0.0.1:8081/1kb.dat
+#
+# Python function usage:
+#
+#   run(url, connections=10, duration=10, rate=None, timeout=60)
+#
+#     Runs one test in the calling process and returns a Stats object with
+#     the latency histogram, request, byte and error counts.
+#
+#   Histogram(precision=7)
+#
+#     Compact log-linear latency histogram in microseconds: every power of
+#     two is split into 2 ** precision buckets, so a recorded value is kept
+#     to within 1 / 2 ** precision (under 1% by default) in a few hundred
+#     buckets however many requests are recorded. record(us), merge(other),
+#     percentile(p) and items() give the counts back.
+
+# Percentiles reported in the JSON line, as latency.lua does.
+percentiles = (50, 75, 90, 99, 99.9, 99.99)
+
+# Bytes read from a response body at a time, so multi-GB downloads are
+# streamed rather than held in memory.
+read_chunk = 1 << 20
+
+class Histogram:
+    def __init__(self, precision=7):
+        self.precision = precision
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.min = None
+        self.max = None
+
+    def bucket(self, us):
+        # Values below 2 ** precision are exact; above, the shift drops the
+        # bits below the precision'th significant one.
+        shift = max(us.bit_length() - self.precision - 1, 0)
+        return (shift << self.precision) + (us >> shift)
+
+    def value(self, bucket):
+        # The middle of the bucket's range.
+        shift = max((bucket >> self.precision) - 1, 0)
+        low = (bucket - (shift << self.precision)) << shift
+        return low + ((1 << shift) >> 1)
+
+    def record(self, us):
+        us = max(int(us), 0)
+        b = self.bucket(us)
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.count += 1
+        self.total += us
+        self.squares += us * us
+        self.min = us if self.min is None else min(self.min, us)
+        self.max = us if self.max is None else max(self.max, us)
+
+    def merge(self, other):
+        for b, c in other.counts.items():
+            self.counts[b] = self.counts.get(b, 0) + c
+        self.count += other.count
+        self.total += other.total
+        self.squares += other.squares
+        for m, pick in (('min', min), ('max', max)):
+            values = [v for v in (getattr(self, m), getattr(other, m)) if v is not None]
+            setattr(self, m, pick(values) if values else None)
+
+    def items(self):
+        return [(self.value(b), self.counts[b]) for b in sorted(self.counts)]
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def stdev(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(self.squares - self.total ** 2 / self.count, 0.0) / (self.count - 1))
+
+    def percentile(self, p):
+        rank = p / 100 * self.count
+        seen = 0
+        for value, count in self.items():
+            seen += count
+            if seen >= rank:
+                return min(value, self.max)
+        return self.max or 0
+
+class Stats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.requests = 0
+        self.bytes = 0
+        self.errors = {'connect': 0, 'read': 0, 'write': 0, 'status': 0, 'timeout': 0}
+        self.duration = 0.0
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.requests += other.requests
+        self.bytes += other.bytes
+        for k, v in other.errors.items():
+            self.errors[k] += v
+        self.duration = max(self.duration, other.duration)
+
+def raise_file_limit():
+    # Thousands of connections need as many file descriptors.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+async def connect(host, port, stats):
+    try:
+        return await asyncio.open_connection(host, port)
+    except OSError:
+        stats.errors['connect'] += 1
+        return None
+
+async def fetch(conn, request):
+    # Sends one request on a kept-alive connection and reads the response,
+    # discarding the body. Returns the status, the bytes read and whether
+    # the server will close the connection.
+    reader, writer = conn
+    writer.write(request)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    nbytes = len(status_line)
+    status = int(status_line.split()[1])
+    length = 0
+    close = status_line.startswith(b'HTTP/1.0')
+    while True:
+        line = await reader.readline()
+        nbytes += len(line)
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection':
+            close = value.strip().lower() == b'close'
+
+    remaining = length
+    while remaining:
+        chunk = await reader.read(min(remaining, read_chunk))
+        if not chunk:
+            raise ConnectionError('connection closed mid-body')
+        remaining -= len(chunk)
+    return status, nbytes + length, close
+
+async def request(conn, req, timeout, stats, since):
+    # Runs one request and accounts for it, recording its latency from since
+    # (loop time) once the response is in. A request that times out is
+    # recorded too, at the time it was given up on, so stalls stay in the
+    # histogram. Returns whether the response was complete and whether the
+    # connection can be reused.
+    loop = asyncio.get_running_loop()
+    try:
+        status, nbytes, close = await asyncio.wait_for(fetch(conn, req), timeout)
+    except asyncio.TimeoutError:
+        stats.errors['timeout'] += 1
+        stats.latency.record((loop.time() - since) * 1e6)
+        return False, False
+    except (OSError, ConnectionError, ValueError, IndexError):
+        stats.errors['read'] += 1
+        return False, False
+    stats.latency.record((loop.time() - since) * 1e6)
+    stats.requests += 1
+    stats.bytes += nbytes
+    if not 200 <= status < 400:
+        stats.errors['status'] += 1
+    return True, not close
+
+def close_conn(conn):
+    if conn is not None:
+        conn[1].close()
+
+async def closed_loop(host, port, req, connections, duration, timeout, stats):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def worker():
+        conn = None
+        while loop.time() < deadline:
+            if conn is None:
+                conn = await connect(host, port, stats)
+                if conn is None:
+                    # Do not spin on a refused connection.
+                    await asyncio.sleep(0.01)
+                    continue
+            _, reusable = await request(conn, req, timeout, stats, loop.time())
+            if not reusable:
+                close_conn(conn)
+                conn = None
+        close_conn(conn)
+
+    await asyncio.gather(*[worker() for _ in range(connections)])
+
+async def open_loop(host, port, req, connections, duration, rate, timeout, stats):
+    loop = asyncio.get_running_loop()
+    idle = asyncio.Queue()
+    # At most one request in flight per connection; a connection the server
+    # closed frees its slot for a new one.
+    slots = asyncio.Semaphore(connections)
+    start = loop.time()
+    total = int(duration * rate)
+
+    async def one(due):
+        # Waiting for a free connection counts towards the latency, which is
+        # measured from when the request was due.
+        async with slots:
+            conn = idle.get_nowait() if not idle.empty() else await connect(host, port, stats)
+            if conn is None:
+                return
+            _, reusable = await request(conn, req, timeout, stats, due)
+            if reusable:
+                idle.put_nowait(conn)
+            else:
+                close_conn(conn)
+
+    tasks = set()
+    for i in range(total):
+        due = start + i / rate
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(one(due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    while not idle.empty():
+        close_conn(idle.get_nowait())
+
+def run(url, connections=10, duration=10, rate=None, timeout=60):
+    parts = urlsplit(url)
+    host = parts.hostname
+    port = parts.port or 80
+    target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+    req = 'GET {} HTTP/1.1\r\nHost: {}\r\nConnection: keep-alive\r\n\r\n'.format(target, parts.netloc).encode()
+
+    raise_file_limit()
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    stats = Stats()
+    start = time.perf_counter()
+    if rate:
+        asyncio.run(open_loop(host, port, req, connections, duration, rate, timeout, stats))
+    else:
+        asyncio.run(closed_loop(host, port, req, connections, duration, timeout, stats))
+    stats.duration = time.perf_counter() - start
+    return stats
+
+def run_share(args):
+    # One process's share of a multi-process test.
+    return run(*args)
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return '{:.2f}us'.format(seconds * 1e6)
+    if seconds < 1:
+        return '{:.2f}ms'.format(seconds * 1e3)
+    return '{:.2f}s'.format(seconds)
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return '{:.2f}{}'.format(n, unit)
+        n /= 1024
+
+def report(url, processes, connections, stats, rate=None):
+    # wrk's text report, followed by the JSON line latency.lua prints.
+    h = stats.latency
+    lines = ['Running {} test @ {}'.format(format_time(stats.duration), url),
+             '  {} threads and {} connections'.format(processes, connections),
+             '  Thread Stats   Avg      Stdev     Max',
+             '    Latency   {}  {}  {}'.format(format_time(h.mean() / 1e6), format_time(h.stdev() / 1e6),
+                                             format_time((h.max or 0) / 1e6)),
+             '  Latency Distribution']
+    for p in (50, 75, 90, 99):
+        lines.append('  {:>3}%  {}'.format(p, format_time(h.percentile(p) / 1e6)))
+    lines.append('  {} requests in {}, {} read'.format(stats.requests, format_time(stats.duration),
+                                                       format_bytes(stats.bytes)))
+    e = stats.errors
+    if e['connect'] or e['read'] or e['write'] or e['timeout']:
+        lines.append('  Socket errors: connect {}, read {}, write {}, timeout {}'.format(
+            e['connect'], e['read'], e['write'], e['timeout']))
+    if e['status']:
+        lines.append('  Non-2xx or 3xx responses: {}'.format(e['status']))
+    lines.append('Requests/sec: {:10.2f}'.format(stats.requests / stats.duration))
+    lines.append('Transfer/sec: {:>10}'.format(format_bytes(stats.bytes / stats.duration)))
+
+    summary = {'requests': stats.requests, 'duration_us': int(stats.duration * 1e6), 'bytes': stats.bytes,
+               'errors': sum(e.values()), 'mode': 'open' if rate else 'closed', 'rate': rate,
+               'latency_us': {'min': h.min or 0, 'max': h.max or 0, 'mean': h.mean(), 'stdev': h.stdev(),
+                              'percentiles': {'{:g}'.format(p): h.percentile(p) for p in percentiles},
+                              'histogram': h.items()}}
+    lines.append(json.dumps(summary, separators=(',', ':')))
+    return '\n'.join(lines)
+
+def to_seconds(text):
+    # wrk-style durations: 60, 60s, 2m, 1h.
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    return float(text[:-1]) * units[text[-1]] if text[-1] in units else float(text)
+
+if __name__ == "__main__":
+    # Script usage.
+    parser = argparse.ArgumentParser(description='asyncio HTTP load generator')
+    parser.add_argument('-c', '--connections', type=int, default=10)
+    parser.add_argument('-d', '--duration', type=to_seconds, default=10.0)
+    parser.add_argument('-R', '--rate', type=float, default=None, help='requests/sec, for an open-loop test')
+    parser.add_argument('-p', '--processes', type=int, default=1)
+    parser.add_argument('--timeout', type=to_seconds, default=60.0, help='seconds a request may take')
+    parser.add_argument('url')
+    args = parser.parse_args()
+
+    processes = max(min(args.processes, args.connections), 1)
+    shares = [(args.url, args.connections // processes + (i < args.connections % processes), args.duration,
+               args.rate / processes if args.rate else None, args.timeout) for i in range(processes)]
+    if processes == 1:
+        stats = run(*shares[0])
+    else:
+        with Pool(processes) as pool:
+            stats = Stats()
+            for share in pool.map(run_share, shares):
+                stats.merge(share)
+    print(report(args.url, processes, args.connections, stats, args.rate))
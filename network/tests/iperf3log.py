@@ -0,0 +1,341 @@
+#!/usr/bin/python3
+
+import sys
+import json
+import glob
+import os
+import math
+import time
+import codecs
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy
+
+# The Engine API client is shared with the CPU suite.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cpu_results', 'venv'))
+from docker_api import default_client
+
+# This file contains functions to collect and parse iperf3 logs, and a script
+# that turns the raw logs of a test into the CSVs used by ../results.
+#
+# Script usage:
+#
+#   iperf3log.py test1 [test_directory [results_directory]]
+#   iperf3log.py test2 [test_directory [results_directory]]
+#
+#     test1 - writes test1_graph1.csv (combined throughput per number of
+#       benchmarks) and test1_graph2.csv (min/median/max per benchmark) from
+#       the client logs in test_directory/n=*/.
+#     test2 - writes test2_graph1.csv (throughput per benchmark instance) from
+#       the client logs in the single subdirectory of test_directory.
+#
+#   test_directory defaults to the test name, results_directory to
+#   ../results.
+#
+# Python function usage:
+#
+#   parse_log(filename)
+#
+#     Parses an iperf3 log in either the text format or the --json format.
+#     Returns a dictionary with per-interval numpy arrays (start, end, bytes,
+#     bits_per_second, retransmits, cwnd) and the sender and receiver
+#     bits_per_second from the summary. Values the log does not contain
+#     (e.g. retransmits and cwnd in server logs) are NaN or None. For --json
+#     logs, "timestamp" is the test's start time in seconds since the epoch,
+#     so timestamp + start lines the intervals up with sampler.py samples.
+#
+#   save_result(result, filename)
+#
+#     Stores a parsed log's per-interval arrays and summary in a .npz file.
+#
+#   store_logs(filenames)
+#
+#     Parses every log and stores it next to the log as <log>.npz, unless a
+#     .npz newer than the log is already there (e.g. one coordinator.py wrote
+#     with arrival times). Returns the parsed logs. test1.py and test2.py call
+#     it for the client logs they collect, and so does the CSV script.
+#
+#   copy_logs(n, log_format, container_name_format)
+#
+#     Streams the logs of containers 1 through n into log_format.format(i),
+#     all at the same time.
+#
+#   log_lines(cname)
+#
+#     Yields a container's output line by line until it exits. This and the
+#     other container operations here go over the Engine API on the docker
+#     socket (cpu_results/venv/docker_api.py), so n containers do not fork n
+#     docker CLI processes; without access to the socket they fall back to
+#     the docker CLI.
+#
+#   follow_until_converged(cname, logfile, target, min_intervals=10)
+#
+#     Streams one client container's log into logfile and stops the client
+#     with SIGINT as soon as the 95% confidence interval on its per-interval
+#     throughput is narrower than target (e.g. 0.01 for +/-1% of the mean),
+#     after at least min_intervals intervals. The client's -t is the cap.
+#     Returns the number of intervals counted and whether it stopped early.
+
+# Two-sided normal quantile of the 95% interval used to stop runs early.
+z95 = 1.96
+
+# Multipliers from iperf3's unit prefixes to plain bytes or bits.
+units = {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+byte_units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+columns = ['start', 'end', 'bytes', 'bits_per_second', 'retransmits', 'cwnd']
+
+def to_bytes(value, unit):
+    # e.g. ('13.7', 'MBytes')
+    return float(value) * byte_units[unit[:-5]]
+
+def to_bits(value, unit):
+    # e.g. ('115', 'Mbits/sec')
+    return float(value) * units[unit[:-8]]
+
+def new_result(rows):
+    result = {'sender': None, 'receiver': None, 'timestamp': None}
+    for k, column in zip(columns, zip(*rows) if rows else [[]] * len(columns)):
+        result[k] = numpy.array(column, dtype=float)
+    return result
+
+def split_interval(line):
+    # Interval lines look like:
+    # [  5]   0.00-1.00   sec  20.7 MBytes   173 Mbits/sec   43    116 KBytes
+    # and with -P there are also [SUM] lines adding up every stream. Returns
+    # the kind, start, end, bytes, bits/sec and remaining fields, or None for
+    # any other line.
+    if not line.startswith('[') or ']' not in line:
+        return None
+    fields = line[line.index(']') + 1:].split()
+    if len(fields) < 6 or fields[1] != 'sec' or '-' not in fields[0]:
+        return None
+
+    kind = 'sum' if line.startswith('[SUM]') else 'streams'
+    start, end = (float(t) for t in fields[0].split('-'))
+    return kind, start, end, to_bytes(fields[2], fields[3]), to_bits(fields[4], fields[5]), fields[6:]
+
+def parse_text(text):
+    rows = {'streams': list(), 'sum': list()}
+    summary = {'streams': dict(), 'sum': dict()}
+    in_summary = False
+
+    for line in text.splitlines():
+        if line.startswith('- - -'):
+            in_summary = True
+            continue
+        interval = split_interval(line)
+        if interval is None:
+            continue
+        kind, start, end, transferred, bps, rest = interval
+
+        if in_summary:
+            # Summary lines end with "sender" or "receiver".
+            if rest and rest[-1] in ('sender', 'receiver'):
+                summary[kind][rest[-1]] = bps
+            continue
+
+        retransmits = float(rest[0]) if len(rest) >= 3 else numpy.nan
+        cwnd = to_bytes(rest[1], rest[2]) if len(rest) >= 3 else numpy.nan
+        rows[kind].append((start, end, transferred, bps, retransmits, cwnd))
+
+    kind = 'sum' if rows['sum'] else 'streams'
+    result = new_result(rows[kind])
+    result.update(summary[kind])
+    return result
+
+def parse_json(text):
+    data = json.loads(text)
+    rows = list()
+
+    for interval in data.get('intervals', []):
+        s = interval['sum']
+        # Retransmits and cwnd are only reported by the sender, per stream.
+        streams = interval.get('streams', [])
+        retransmits = s.get('retransmits', numpy.nan)
+        cwnd = sum(st['snd_cwnd'] for st in streams) if streams and 'snd_cwnd' in streams[0] else numpy.nan
+        rows.append((s['start'], s['end'], s['bytes'], s['bits_per_second'], retransmits, cwnd))
+
+    result = new_result(rows)
+    result['timestamp'] = data.get('start', {}).get('timestamp', {}).get('timesecs')
+    end = data.get('end', {})
+    if 'sum_sent' in end:
+        result['sender'] = end['sum_sent']['bits_per_second']
+    if 'sum_received' in end:
+        result['receiver'] = end['sum_received']['bits_per_second']
+    return result
+
+def parse_log(filename):
+    with open(filename) as f:
+        text = f.read()
+
+    # --json output is a single JSON object; the text format never starts with {.
+    if text.lstrip().startswith('{'):
+        return parse_json(text)
+    return parse_text(text)
+
+def save_result(result, filename):
+    numpy.savez_compressed(filename, **{k: numpy.asarray(numpy.nan if v is None else v) for k, v in result.items()})
+
+def npz_filename(filename):
+    return os.path.splitext(filename)[0] + '.npz'
+
+def parse_and_store(filename):
+    result = parse_log(filename)
+    npz = npz_filename(filename)
+    if not os.path.exists(npz) or os.path.getmtime(npz) < os.path.getmtime(filename):
+        save_result(result, npz)
+    return result
+
+def log_lines(cname):
+    api = default_client()
+    if api is None:
+        p = subprocess.Popen(['docker', 'logs', '--follow', cname], stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, universal_newlines=True)
+        yield from p.stdout
+        p.wait()
+        return
+
+    # stdout and stderr are interleaved, like 2>&1.
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    partial = ''
+    for _, chunk in api.logs(cname, follow=True):
+        lines = (partial + decoder.decode(chunk)).split('\n')
+        partial = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    partial += decoder.decode(b'', final=True)
+    if partial:
+        yield partial
+
+def follow_log(cname, logfile):
+    with open(logfile, 'w') as f:
+        for line in log_lines(cname):
+            f.write(line)
+
+def copy_logs(n, log_format, container_name_format='iperf3_{}'):
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        for i in range(1, n+1):
+            pool.submit(follow_log, container_name_format.format(i), log_format.format(i))
+
+def container_exists(cname):
+    api = default_client()
+    if api is not None:
+        return api.exists(cname)
+    return subprocess.run(['docker', 'inspect', cname], stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL).returncode == 0
+
+def interrupt_container(cname):
+    api = default_client()
+    if api is not None:
+        api.kill(cname, 'INT')
+        return
+    subprocess.run(['docker', 'kill', '--signal', 'INT', cname],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_for_container(cname, wait):
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        if container_exists(cname):
+            return True
+        time.sleep(0.1)
+    return False
+
+def follow_until_converged(cname, logfile, target, min_intervals=10, wait=60):
+    # Streams the container's log like follow_log, keeping running statistics
+    # of the per-interval throughput. Once at least min_intervals have
+    # arrived and the 95% interval on their mean is within target (a fraction
+    # of the mean), iperf3 is sent SIGINT, which stops the test and still
+    # prints the summary. The client needs --forceflush for its intervals to
+    # arrive while it runs.
+    n, mean, m2 = 0, 0.0, 0.0
+    stopped = False
+    if not wait_for_container(cname, wait):
+        return n, stopped
+
+    in_summary = False
+    has_sum = False
+    with open(logfile, 'w') as f:
+        for line in log_lines(cname):
+            f.write(line)
+            in_summary = in_summary or line.startswith('- - -')
+            interval = split_interval(line)
+            if interval is None or in_summary or stopped:
+                continue
+
+            # With -P only the [SUM] lines are counted.
+            kind, bps = interval[0], interval[4]
+            if kind == 'sum' and not has_sum:
+                has_sum = True
+                n, mean, m2 = 0, 0.0, 0.0
+            if kind == 'streams' and has_sum:
+                continue
+
+            n += 1
+            delta = bps - mean
+            mean += delta / n
+            m2 += delta * (bps - mean)
+            if n >= max(min_intervals, 2) and mean > 0 and \
+               z95 * math.sqrt(m2 / (n - 1) / n) / mean <= target:
+                interrupt_container(cname)
+                stopped = True
+    return n, stopped
+
+def parse_logs(filenames):
+    # Parsing is independent per log, so spread it over the available cores.
+    with ProcessPoolExecutor() as pool:
+        return list(pool.map(parse_log, filenames))
+
+def store_logs(filenames):
+    with ProcessPoolExecutor() as pool:
+        return list(pool.map(parse_and_store, filenames))
+
+def client_logs(directory):
+    # Sort client1.log, client2.log, ..., client10.log numerically.
+    logs = glob.glob(os.path.join(directory, 'client*.log'))
+    return sorted(logs, key=lambda f: int(os.path.basename(f)[6:-4]))
+
+def mbps(result):
+    return result['receiver'] / 1e6
+
+def write_csv(filename, header, rows):
+    with open(filename, 'w') as f:
+        f.write(','.join(header) + '\n')
+        for row in rows:
+            f.write(','.join('{:g}'.format(v) if isinstance(v, float) else str(v) for v in row) + '\n')
+
+def test1_csvs(test_directory, results_directory):
+    combined = list()
+    spread = list()
+    runs = glob.glob(os.path.join(test_directory, 'n=*'))
+    for run in sorted(runs, key=lambda d: int(d.split('=')[-1])):
+        n = int(run.split('=')[-1])
+        throughput = numpy.array([mbps(r) for r in store_logs(client_logs(run))])
+        combined.append((n, round(float(throughput.sum()), 2)))
+        spread.append((n, 'Min', float(throughput.min())))
+        spread.append((n, 'Median', float(numpy.median(throughput))))
+        spread.append((n, 'Max', float(throughput.max())))
+
+    write_csv(os.path.join(results_directory, 'test1_graph1.csv'),
+              ['Number of simultaneous benchmarks', 'Combined throughput (Mbps)'], combined)
+    write_csv(os.path.join(results_directory, 'test1_graph2.csv'),
+              ['Number of benchmarks', 'Type', 'Throughput (Mbps)'], spread)
+
+def test2_csvs(test_directory, results_directory):
+    run = sorted(d for d in glob.glob(os.path.join(test_directory, '*')) if os.path.isdir(d))[0]
+    rows = [(i, mbps(r)) for i, r in enumerate(store_logs(client_logs(run)), 1)]
+    write_csv(os.path.join(results_directory, 'test2_graph1.csv'),
+              ['Benchmark instance', 'Throughput (Mbps)'], rows)
+
+if __name__ == "__main__":
+    # Script usage.
+    test = sys.argv[1]
+    test_directory = sys.argv[2] if len(sys.argv) > 2 else test
+    results_directory = sys.argv[3] if len(sys.argv) > 3 else '../results'
+
+    if test == 'test1':
+        test1_csvs(test_directory, results_directory)
+    elif test == 'test2':
+        test2_csvs(test_directory, results_directory)
+    else:
+        raise ValueError("The first argument must be either test1 or test2.")
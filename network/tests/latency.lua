@@ -0,0 +1,32 @@
+-- wrk script that dumps the full latency distribution as a single line of
+-- JSON once the run is done, after wrk's own text report.
+--
+-- Usage:
+--
+--   ./wrk -d 60s --latency -s latency.lua http://host:port/file
+--
+-- Latencies are in microseconds. "histogram" lists every distinct latency
+-- value wrk recorded together with how many requests took that long.
+
+done = function(summary, latency, requests)
+   local histogram = {}
+   for i = 1, #latency do
+      local value, count = latency(i)
+      histogram[#histogram + 1] = string.format("[%d,%d]", value, count)
+   end
+
+   local percentiles = {}
+   for _, p in ipairs({50, 75, 90, 99, 99.9, 99.99}) do
+      percentiles[#percentiles + 1] = string.format('"%g":%d', p, latency:percentile(p))
+   end
+
+   local e = summary.errors
+   local errors = e.connect + e.read + e.write + e.status + e.timeout
+
+   io.write(string.format('{"requests":%d,"duration_us":%d,"bytes":%d,"errors":%d,' ..
+                          '"latency_us":{"min":%d,"max":%d,"mean":%f,"stdev":%f,' ..
+                          '"percentiles":{%s},"histogram":[%s]}}\n',
+                          summary.requests, summary.duration, summary.bytes, errors,
+                          latency.min, latency.max, latency.mean, latency.stdev,
+                          table.concat(percentiles, ","), table.concat(histogram, ",")))
+end
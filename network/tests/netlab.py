@@ -0,0 +1,317 @@
+#!/usr/bin/python3
+
+import os
+import json
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from runcmd import runcmd
+from iperf3log import parse_log
+from sampling import start_sampler, stop_sampler
+import test1
+import test2
+
+# This file builds a network-namespace lab on one Linux host, so the iperf3
+# tests of test1.py and test2.py can run without a second machine or a real
+# link. Needs root, iproute2 (ip, tc, ss) and iperf3.
+#
+# The lab is one server namespace and k "container" namespaces, each joined
+# by a veth pair to a bridge in a switch namespace:
+#
+#   netlab_c1 (10.77.0.11) --+
+#   netlab_c2 (10.77.0.12) --+-- br0 in netlab_sw --p0-- netlab_srv (10.77.0.1)
+#   ...                    --+
+#
+# The bottleneck is p0, the switch port facing the server, which carries
+# the iperf3 data from the clients. Its qdisc emulates the link speed:
+#
+#   none     - no shaping, as fast as veth goes on this host.
+#   tbf      - a token bucket at the link rate, one FIFO for every flow.
+#   fq_codel - an HTB class at the link rate with fq_codel, so flows share
+#              it fairly and standing queues are kept short.
+#   htb      - one HTB class per container, each guaranteed its share of
+#              the link (--shares, equal by default) and able to borrow up
+#              to the full rate, with fq_codel inside. This is the per-
+#              container QoS mitigation.
+#
+# The RTT is emulated by netem delaying the server's ACKs, so it does not
+# interfere with the shaping qdisc.
+#
+# Flow i runs test1's (or test2's) server_getcmd(i) in the server namespace
+# and client_getcmd(i) in container namespace (i - 1) % k + 1, all at once
+# through runcmd. The client runs iperf3 natively in its namespace; the
+# namespace stands in for the container's network.
+#
+# Script usage:
+#
+#   netlab.py setup [lab options]
+#   netlab.py teardown
+#   netlab.py run n [lab options] [-t time] [--test test2 -b bandwidth] [--keep]
+#   netlab.py sweep [lab options] [-t time] [--rates 1G,10G,25G]
+#                   [--flows 1,2,4,8,16,32,64]
+#
+#   Lab options: [--containers k] [--rate 1G] [--rtt 1ms]
+#                [--qdisc none|tbf|fq_codel|htb] [--shares 2,1,...]
+#
+#   run starts n flows through a fresh lab, writing rawlogs/netlab_client<i>.log
+#   and rawlogs/netlab_server<i>.log, and appends a summary (total, per-flow
+#   and per-container Mbps, Jain's fairness index) to netlab_runs.jsonl.
+#   sweep does this for every rate and number of flows. On small hosts veth
+#   itself tops out well below 25 Gbps; the none qdisc shows where.
+#
+#   Example:
+#
+#     netlab.py sweep --containers 4 --qdisc htb --shares 4,1,1,1 --rtt 10ms
+#
+# Python function usage:
+#
+#   setup(containers=1, rate='1G', rtt='1ms', qdisc='tbf', shares=None)
+#   teardown()
+#   run(n, test=test1, duration=60, bandwidth=None, label=None)
+#
+#     setup tears down whatever it built if any step fails. run expects a lab
+#     built by setup and returns the summary it records.
+
+prefix = 'netlab'
+server_ns = prefix + '_srv'
+switch_ns = prefix + '_sw'
+container_ns_format = prefix + '_c{}'
+server_address = '10.77.0.1'
+container_address_format = '10.77.0.{}'
+qdiscs = ['none', 'tbf', 'fq_codel', 'htb']
+
+log_directory = 'rawlogs'
+client_logfile_format = '{}/netlab_client{{}}.log'.format(log_directory)
+server_logfile_format = '{}/netlab_server{{}}.log'.format(log_directory)
+sampler_filename = '{}/netlab_host.samples'.format(log_directory)
+store = 'netlab_runs.jsonl'
+
+# The lab built by setup, recorded with each run.
+lab = dict()
+
+units = {'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+
+def to_bits(text):
+    # e.g. 25G or a plain number of bits/sec.
+    return float(text[:-1]) * units[text[-1].upper()] if text[-1].upper() in units else float(text)
+
+def tc_rate(bits):
+    return '{}bit'.format(int(bits))
+
+def burst(bits):
+    # At least 1 ms of traffic, and never less than a few GSO packets.
+    return str(max(int(bits / 8 / 1000), 256 * 1024))
+
+def sh(*args):
+    subprocess.run(args, check=True)
+
+def netns(ns, *args):
+    return ['ip', 'netns', 'exec', ns] + list(args)
+
+def container_ns(k):
+    return container_ns_format.format(k)
+
+def container_address(k):
+    return container_address_format.format(10 + k)
+
+def container_of(i):
+    return (i - 1) % lab['containers'] + 1
+
+def namespaces():
+    listed = subprocess.run(['ip', 'netns', 'list'], stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return [line.split()[0] for line in listed.splitlines() if line.startswith(prefix + '_')]
+
+def teardown():
+    # Deleting a namespace also deletes the veth ends inside it.
+    for ns in namespaces():
+        sh('ip', 'netns', 'del', ns)
+    lab.clear()
+
+def attach(ns, port, address):
+    # A veth pair from the bridge's port to eth0 in ns.
+    sh('ip', 'netns', 'add', ns)
+    sh('ip', '-n', switch_ns, 'link', 'add', port, 'type', 'veth', 'peer', 'name', 'eth0', 'netns', ns)
+    sh('ip', '-n', switch_ns, 'link', 'set', port, 'master', 'br0', 'up')
+    sh('ip', '-n', ns, 'addr', 'add', address + '/24', 'dev', 'eth0')
+    sh('ip', '-n', ns, 'link', 'set', 'eth0', 'up')
+    sh('ip', '-n', ns, 'link', 'set', 'lo', 'up')
+
+def shape(rate, qdisc, shares):
+    bits = to_bits(rate)
+    tc = ['tc', '-n', switch_ns]
+    htb = ['rate', tc_rate(bits), 'ceil', tc_rate(bits), 'burst', burst(bits), 'cburst', burst(bits),
+           'quantum', '65536']
+    if qdisc == 'tbf':
+        sh(*tc, 'qdisc', 'add', 'dev', 'p0', 'root', 'handle', '1:', 'tbf',
+           'rate', tc_rate(bits), 'burst', burst(bits), 'latency', '50ms')
+    elif qdisc == 'fq_codel':
+        sh(*tc, 'qdisc', 'add', 'dev', 'p0', 'root', 'handle', '1:', 'htb', 'default', '10')
+        sh(*tc, 'class', 'add', 'dev', 'p0', 'parent', '1:', 'classid', '1:10', 'htb', *htb)
+        sh(*tc, 'qdisc', 'add', 'dev', 'p0', 'parent', '1:10', 'fq_codel')
+    elif qdisc == 'htb':
+        sh(*tc, 'qdisc', 'add', 'dev', 'p0', 'root', 'handle', '1:', 'htb')
+        sh(*tc, 'class', 'add', 'dev', 'p0', 'parent', '1:', 'classid', '1:1', 'htb', *htb)
+        for k, share in enumerate(shares, 1):
+            guaranteed = bits * share / sum(shares)
+            classid = '1:{}'.format(10 + k)
+            sh(*tc, 'class', 'add', 'dev', 'p0', 'parent', '1:1', 'classid', classid, 'htb',
+               'rate', tc_rate(guaranteed), *htb[2:])
+            sh(*tc, 'qdisc', 'add', 'dev', 'p0', 'parent', classid, 'fq_codel')
+            sh(*tc, 'filter', 'add', 'dev', 'p0', 'parent', '1:', 'protocol', 'ip', 'prio', '1',
+               'u32', 'match', 'ip', 'src', container_address(k) + '/32', 'flowid', classid)
+    elif qdisc != 'none':
+        raise ValueError('The qdisc must be one of {}.'.format(', '.join(qdiscs)))
+
+def setup(containers=1, rate='1G', rtt='1ms', qdisc='tbf', shares=None):
+    shares = [1] * containers if shares is None else list(shares)
+    if containers < 1 or containers > 200:
+        raise ValueError('containers should be between 1 and 200.')
+    if len(shares) != containers:
+        raise ValueError('There must be one share per container.')
+
+    teardown()
+    try:
+        sh('ip', 'netns', 'add', switch_ns)
+        sh('ip', '-n', switch_ns, 'link', 'add', 'br0', 'type', 'bridge')
+        sh('ip', '-n', switch_ns, 'link', 'set', 'br0', 'up')
+        attach(server_ns, 'p0', server_address)
+        for k in range(1, containers + 1):
+            attach(container_ns(k), 'p{}'.format(k), container_address(k))
+
+        shape(rate, qdisc, shares)
+        if float(rtt.rstrip('smu')) > 0:
+            # A large limit, so netem never drops at high bandwidth-delay products.
+            sh('tc', '-n', server_ns, 'qdisc', 'add', 'dev', 'eth0', 'root', 'netem', 'delay', rtt,
+               'limit', '1000000')
+    except BaseException:
+        # A half-built lab (e.g. a qdisc the kernel refuses) leaves no namespaces behind.
+        teardown()
+        raise
+    lab.update({'containers': containers, 'rate': rate, 'rtt': rtt, 'qdisc': qdisc, 'shares': shares})
+
+def listening(ports):
+    listed = subprocess.run(netns(server_ns, 'ss', '-Hltn'), stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    open_ports = {int(line.split()[3].rsplit(':', 1)[1]) for line in listed.splitlines()}
+    return set(ports) <= open_ports
+
+def wait_for_servers(n, wait=10):
+    ports = range(test1.base_port, test1.base_port + n)
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        if listening(ports):
+            return True
+        time.sleep(0.05)
+    return False
+
+def native(command):
+    # Drops "docker run ... iperf3" so the client runs straight in its namespace.
+    return command[command.index('iperf3') + 1:] if command[0] == 'docker' else command
+
+def flow_mbps(filename):
+    # The receiver's rate is what got through the bottleneck.
+    result = parse_log(filename)
+    bps = result['receiver'] if result['receiver'] is not None else result['sender']
+    return None if bps is None else bps / 1e6
+
+def jain(values):
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values)) if any(values) else None
+
+def run(n, test=test1, duration=60, bandwidth=None, label=None):
+    if not lab:
+        raise ValueError('The lab must be set up before a run.')
+    if test is test2 and bandwidth is None:
+        raise ValueError('test2 needs a bandwidth for iperf3 -b.')
+
+    # The command builders read these module globals.
+    test.host = server_address
+    test.time = duration
+    test.bandwidth = bandwidth
+    test.server_logfile_format = server_logfile_format
+
+    def server_getcmd(i):
+        return netns(server_ns, *test.server_getcmd(i))
+
+    def client_getcmd(i):
+        return netns(container_ns(container_of(i)), *native(test.client_getcmd(i)),
+                     '--logfile', client_logfile_format.format(i))
+
+    os.makedirs(log_directory, exist_ok=True)
+    for i in range(1, n + 1):
+        for filename in (client_logfile_format.format(i), server_logfile_format.format(i)):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        servers = pool.submit(runcmd, n, server_getcmd, timeout=duration + 60)
+        if not wait_for_servers(n):
+            raise RuntimeError('The iperf3 servers did not start.')
+        sampler = start_sampler(sampler_filename)
+        results = runcmd(n, client_getcmd, timeout=duration + 60)
+        stop_sampler(sampler)
+        servers.result()
+
+    flows = [flow_mbps(client_logfile_format.format(i)) if r['returncode'] == 0 else None
+             for i, r in enumerate(results, 1)]
+    per_container = [0.0] * lab['containers']
+    for i, mbps in enumerate(flows, 1):
+        per_container[container_of(i) - 1] += mbps or 0.0
+    completed = [mbps for mbps in flows if mbps is not None]
+
+    summary = dict(lab, label=label or test.__name__, duration=duration, flows=n, bandwidth=bandwidth,
+                   finished=len(completed), total_mbps=sum(completed), flow_mbps=flows,
+                   container_mbps=per_container, flow_jain=jain(completed),
+                   container_jain=jain(per_container))
+    summary['started'] = min(r['launched'] for r in results)
+    with open(store, 'a') as f:
+        f.write(json.dumps(summary) + '\n')
+    return summary
+
+def report(summary):
+    print('{rate} {qdisc} rtt {rtt}, {flows} flows in {containers} containers: {total_mbps:.1f} Mbps, '
+          'fairness {fairness}'.format(fairness='n/a' if summary['flow_jain'] is None
+                                       else '{:.3f}'.format(summary['flow_jain']), **summary))
+    if summary['qdisc'] == 'htb':
+        print('  per container: ' + ', '.join('{:.1f}'.format(m) for m in summary['container_mbps']))
+
+if __name__ == "__main__":
+    # Script usage.
+    parser = argparse.ArgumentParser(description='network-namespace lab for the iperf3 tests')
+    parser.add_argument('action', choices=['setup', 'teardown', 'run', 'sweep'])
+    parser.add_argument('n', type=int, nargs='?', default=1)
+    parser.add_argument('--containers', type=int, default=1)
+    parser.add_argument('--rate', default='1G')
+    parser.add_argument('--rtt', default='1ms')
+    parser.add_argument('--qdisc', choices=qdiscs, default='tbf')
+    parser.add_argument('--shares', default=None)
+    parser.add_argument('-t', '--time', type=int, default=60)
+    parser.add_argument('--test', choices=['test1', 'test2'], default='test1')
+    parser.add_argument('-b', '--bandwidth', default=None)
+    parser.add_argument('--keep', action='store_true', help='leave the lab up after run')
+    parser.add_argument('--rates', default='1G,10G,25G')
+    parser.add_argument('--flows', default='1,2,4,8,16,32,64')
+    args = parser.parse_args()
+
+    shares = None if args.shares is None else [float(s) for s in args.shares.split(',')]
+    test = test1 if args.test == 'test1' else test2
+
+    if args.action == 'teardown':
+        teardown()
+    elif args.action == 'setup':
+        setup(args.containers, args.rate, args.rtt, args.qdisc, shares)
+    elif args.action == 'run':
+        try:
+            setup(args.containers, args.rate, args.rtt, args.qdisc, shares)
+            report(run(args.n, test, args.time, args.bandwidth))
+        finally:
+            if not args.keep:
+                teardown()
+    else:
+        try:
+            for rate in args.rates.split(','):
+                setup(args.containers, rate, args.rtt, args.qdisc, shares)
+                for n in (int(f) for f in args.flows.split(',')):
+                    report(run(n, test, args.time, args.bandwidth))
+        finally:
+            teardown()
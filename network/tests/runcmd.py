@@ -1,6 +1,10 @@
 #!/usr/bin/python3
 
+import os
 import sys
+import time
+import signal
+import asyncio
 import subprocess
 
 # This file contains a function to run multiple instances of a command
@@ -11,7 +15,7 @@ import subprocess
 #   This script runs one or many instances of a given command, in parallel.
 #
 #   Usage:
-#   
+#
 #     run n command [args...]
 #
 #     n - number of instance of the command to spawn in parallel.
@@ -31,15 +35,32 @@ import subprocess
 #
 # Python function usage:
 #
-#   runcmd(n, command, shell=False)
+#   runcmd(n, command, shell=False, sync=True, stagger=0, timeout=None,
+#          capture=False, fail_fast=False, cleanup=None)
 #
 #     n - same as above.
 #     command - either a valid argument to subprocess.run's arg parameter
 #       (a single string or an array of strings) or a function of the form
 #       f(i) that accepts an index i and returns either of the above.
 #       Indexes passed to the function will range from 1 to n (inclusive).
-#     shell - optional. Passed to subprocess.Popen.
-#     
+#     shell - optional. Run each command through the shell.
+#     sync - optional. Spawn every instance first, held at a gate, then
+#       release them all at once, so launch skew does not depend on how long
+#       it takes to fork the later instances.
+#     stagger - optional. Seconds to wait between releasing instances, for a
+#       staggered rather than synchronized start.
+#     timeout - optional. Seconds each instance may run before it is killed.
+#     capture - optional. Capture each instance's stdout and stderr into its
+#       own buffer instead of passing them through.
+#     fail_fast - optional. As soon as one instance fails or times out, kill
+#       all the others.
+#     cleanup - optional. Same form as command; run for every instance that
+#       was killed, e.g. to remove its Docker container.
+#
+#     Returns a list with one dictionary per instance, holding its index,
+#     returncode, stdout and stderr (bytes, when captured), launched and
+#     finished times (time.time()) and whether it timed_out or was
+#     cancelled. launched - min(launched) is the launch skew.
 #
 #   Example:
 #
@@ -48,31 +69,126 @@ import subprocess
 #
 #     runcmd(4, logeach)
 
-def runcmd(n, command, shell=False):
-  if type(n) is not int or n < 1:
-    raise ValueError("n should be an integer no less than 1.")
+# Holds a spawned instance until a line arrives on stdin, then becomes the
+# real command. "$0" is the command for shell=True, otherwise "$@" is.
+gate_shell = 'read _ && exec sh -c "$0"'
+gate_exec = 'read _ && exec "$@"'
+
+def getarg(command, i):
+  return command(i) if callable(command) else command
+
+def gated(arg, shell):
+  if shell:
+    return ['sh', '-c', gate_shell, arg]
+  if isinstance(arg, str):
+    arg = [arg]
+  return ['sh', '-c', gate_exec, 'gate'] + list(arg)
+
+async def spawn(arg, shell, sync, capture):
+  pipe = asyncio.subprocess.PIPE if capture else None
+  stdin = asyncio.subprocess.PIPE if sync else None
+  if sync:
+    return await asyncio.create_subprocess_exec(*gated(arg, shell), stdin=stdin, stdout=pipe,
+                                                stderr=pipe, start_new_session=True)
+  if shell:
+    return await asyncio.create_subprocess_shell(arg, stdout=pipe, stderr=pipe, start_new_session=True)
+  if isinstance(arg, str):
+    arg = [arg]
+  return await asyncio.create_subprocess_exec(*arg, stdout=pipe, stderr=pipe, start_new_session=True)
+
+async def drain(stream, buffer):
+  # Stream output into the instance's buffer as it is produced.
+  while True:
+    chunk = await stream.read(65536)
+    if not chunk:
+      break
+    buffer.extend(chunk)
+
+def kill(process):
+  # Each instance leads its own session, so this reaches its children too.
+  try:
+    os.killpg(process.pid, signal.SIGKILL)
+  except ProcessLookupError:
+    pass
+
+async def wait(process, result, timeout):
+  readers = list()
+  if process.stdout is not None:
+    readers.append(drain(process.stdout, result['stdout']))
+    readers.append(drain(process.stderr, result['stderr']))
+  try:
+    await asyncio.wait_for(asyncio.gather(process.wait(), *readers), timeout)
+  except asyncio.TimeoutError:
+    result['timed_out'] = True
+    kill(process)
+    await process.wait()
+  except asyncio.CancelledError:
+    result['cancelled'] = True
+    kill(process)
+    await process.wait()
+  result['returncode'] = process.returncode
+  result['finished'] = time.time()
+  return result
 
-  # List of processes to wait for.
+async def runall(n, command, shell, sync, stagger, timeout, capture, fail_fast, cleanup):
+  results = [{'index': i, 'returncode': None, 'stdout': bytearray(), 'stderr': bytearray(),
+              'launched': None, 'finished': None, 'timed_out': False, 'cancelled': False}
+             for i in range(1, (n+1))]
+
+  # Spawn every instance; with sync they wait at the gate.
   processes = list()
+  for result in results:
+    processes.append(await spawn(getarg(command, result['index']), shell, sync, capture))
+    if not sync:
+      result['launched'] = time.time()
+      if stagger:
+        await asyncio.sleep(stagger)
+
+  if sync:
+    # Release the gate for every instance as close together as possible.
+    for process, result in zip(processes, results):
+      process.stdin.write(b'\n')
+      result['launched'] = time.time()
+      if stagger:
+        await process.stdin.drain()
+        await asyncio.sleep(stagger)
+    for process in processes:
+      await process.stdin.drain()
+      process.stdin.close()
+
+  tasks = [asyncio.ensure_future(wait(p, r, timeout)) for p, r in zip(processes, results)]
+  pending = set(tasks)
+  while pending:
+    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    failed = [t.result() for t in done if t.result()['returncode'] != 0]
+    if fail_fast and failed and pending:
+      for t in pending:
+        t.cancel()
+      await asyncio.gather(*pending, return_exceptions=True)
+      pending = set()
 
-  if callable(command):
-    # command is a function.
-    for i in range(1, (n+1)):
-      arg = command(i)
-      processes.append(subprocess.Popen(arg, shell))
-
-  else:
-    # command is a string.
-    for i in range(1, (n+1)):
-      processes.append(subprocess.Popen(command, shell))
-  
-  # Now wait for the open processes to complete.
-  for p in processes:
-      p.wait()
+  # Tear down whatever was killed, e.g. the instance's container.
+  if cleanup is not None:
+    for result in results:
+      if result['timed_out'] or result['cancelled']:
+        arg = getarg(cleanup, result['index'])
+        subprocess.run(arg, shell=isinstance(arg, str),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+  for result in results:
+    result['stdout'] = bytes(result['stdout']) if capture else None
+    result['stderr'] = bytes(result['stderr']) if capture else None
+  return results
+
+def runcmd(n, command, shell=False, sync=True, stagger=0, timeout=None, capture=False,
+           fail_fast=False, cleanup=None):
+  if type(n) is not int or n < 1:
+    raise ValueError("n should be an integer no less than 1.")
+
+  return asyncio.run(runall(n, command, shell, sync, stagger, timeout, capture, fail_fast, cleanup))
 
 if __name__ == "__main__":
   # Script usage.
 
-  runcmd(int(sys.argv[1]), sys.argv[2:])
-  sys.exit()
-
+  results = runcmd(int(sys.argv[1]), sys.argv[2:])
+  sys.exit(1 if any(r['returncode'] != 0 for r in results) else 0)
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+
+import os
+import subprocess
+
+# This file contains functions to run the host-side resource sampler
+# (cpu_results/venv/sampler.py) next to a network test.
+#
+# Python function usage:
+#
+#   start_sampler(filename, containers=[], rate=100)
+#
+#     Starts sampling /proc/stat, /proc/net/dev and, for each container,
+#     its cgroup counters in a separate process, so sampling does not
+#     compete with the test driver. Samples go to filename (host only) or
+#     filename-<container> (one file per container). Returns the process.
+#
+#   stop_sampler(process)
+#
+#     Stops the sampler and waits for every sample to be written.
+
+sampler = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', '..', 'cpu_results', 'venv', 'sampler.py')
+
+def start_sampler(filename, containers=[], rate=100):
+    return subprocess.Popen(['python3', sampler, filename, str(rate)] + list(containers))
+
+def stop_sampler(process):
+    process.terminate()
+    process.wait()
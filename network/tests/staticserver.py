@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+
+import os
+import asyncio
+import argparse
+from multiprocessing import Process
+
+# uvloop is used when it is installed; plain asyncio otherwise.
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# This file contains a small asyncio static-file HTTP/1.1 server that stands
+# in for the NGINX containers of tests 3-5, so the small-vs-large download
+# experiment can be run on loopback with httpload.py or wrk.
+#
+# Script usage:
+#
+#   staticserver.py [-p port] [--root directory] [--file name=size ...]
+#                   [--workers n]
+#
+#     Serves the files under --root (default ../images/nginx/static, which
+#     holds 1kb.dat) with keep-alive. Every --file adds a synthetic file of
+#     the given size (e.g. fedora29.iso=1800M, big.dat=4G) whose content is
+#     zeros streamed from memory, so multi-GB downloads need no disk space.
+#     Real files are sent with sendfile where the event loop supports it.
+#     --workers forks that many processes sharing the port (SO_REUSEPORT),
+#     for thousands of connections.
+#
+#   Example:
+#
+#     staticserver.py -p 8082 --file fedora29.iso=1800M
+#
+# Python function usage:
+#
+#   serve(port, root, files, host='0.0.0.0')
+#
+#     Runs the server in the calling process until it is killed. files maps
+#     a synthetic file's name to its size in bytes.
+
+default_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'images', 'nginx', 'static')
+
+# Zeros written per chunk of a synthetic file.
+zeros = bytes(1 << 20)
+
+sizes = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+def to_bytes(text):
+    # e.g. 1800M, 4G or a plain number of bytes.
+    return int(float(text[:-1]) * sizes[text[-1].upper()]) if text[-1].upper() in sizes else int(text)
+
+def header(status, length, keep_alive):
+    return ('HTTP/1.1 {}\r\nServer: staticserver\r\nContent-Type: application/octet-stream\r\n'
+            'Content-Length: {}\r\nConnection: {}\r\n\r\n').format(
+                status, length, 'keep-alive' if keep_alive else 'close').encode()
+
+def resolve(root, target):
+    # Maps a request path onto a file under root, refusing anything outside it.
+    name = target.split('?', 1)[0].lstrip('/')
+    filename = os.path.realpath(os.path.join(root, name))
+    if not filename.startswith(os.path.realpath(root) + os.sep) or not os.path.isfile(filename):
+        return None
+    return filename
+
+async def send_file(writer, filename):
+    loop = asyncio.get_running_loop()
+    with open(filename, 'rb') as f:
+        await loop.sendfile(writer.transport, f)
+
+async def send_zeros(writer, size):
+    view = memoryview(zeros)
+    while size:
+        n = min(size, len(zeros))
+        writer.write(view[:n])
+        await writer.drain()
+        size -= n
+
+def handler(root, files):
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = not request_line.rstrip().endswith(b'HTTP/1.0')
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.partition(b':')
+                    if name.strip().lower() == b'connection':
+                        keep_alive = value.strip().lower() != b'close'
+
+                fields = request_line.decode('latin-1').split()
+                method, target = (fields + ['', ''])[:2]
+                name = target.split('?', 1)[0].lstrip('/')
+                filename = resolve(root, target) if name not in files else None
+                if method not in ('GET', 'HEAD') or (name not in files and filename is None):
+                    writer.write(header('404 Not Found', 0, keep_alive))
+                elif name in files:
+                    writer.write(header('200 OK', files[name], keep_alive))
+                    if method == 'GET':
+                        await send_zeros(writer, files[name])
+                else:
+                    writer.write(header('200 OK', os.path.getsize(filename), keep_alive))
+                    if method == 'GET':
+                        await writer.drain()
+                        await send_file(writer, filename)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+async def start(port, root, files, host):
+    server = await asyncio.start_server(handler(root, files), host, port, reuse_port=True, backlog=4096)
+    async with server:
+        await server.serve_forever()
+
+def serve(port, root, files, host='0.0.0.0'):
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    try:
+        asyncio.run(start(port, root, files, host))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    # Script usage.
+    parser = argparse.ArgumentParser(description='asyncio static-file server')
+    parser.add_argument('-p', '--port', type=int, default=8080)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--root', default=default_root)
+    parser.add_argument('--file', action='append', default=[], help='a synthetic file, as name=size')
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    files = {name: to_bytes(size) for name, size in (f.split('=', 1) for f in args.file)}
+    workers = [Process(target=serve, args=(args.port, args.root, files, args.host)) for _ in range(args.workers - 1)]
+    for w in workers:
+        w.start()
+    try:
+        serve(args.port, args.root, files, args.host)
+    finally:
+        for w in workers:
+            w.terminate()
+            w.join()
@@ -1,8 +1,17 @@
 #!/usr/bin/python3
 
+import os
 import sys
+import glob
 import subprocess
 from runcmd import runcmd
+from concurrent.futures import ThreadPoolExecutor
+from iperf3log import copy_logs, follow_until_converged, store_logs
+from sampling import start_sampler, stop_sampler
+
+# The Engine API client is shared with the CPU suite.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cpu_results', 'venv'))
+from docker_api import Lifecycle, default_client
 
 # Usages: 
 #
@@ -23,18 +32,33 @@ from runcmd import runcmd
 # e.g. n=3 will use 5201 through 5203.
 #
 # Note: the server will run natively; the client will run in Docker.
+# Once the clients are done, every client log's per-interval throughput,
+# retransmits and cwnd are stored next to it as <log>.npz.
+#
+# To run both halves as one command, with the clients started as soon as
+# every server port is listening, run agent.py on each host and
+# coordinator.py from anywhere (see coordinator.py).
+#
+# With --adaptive target after the client arguments, each client stops as
+# soon as the 95% confidence interval on its throughput is within target
+# (e.g. 0.01 for +/-1%), after at least min_intervals seconds; time is
+# then the cap.
 
 host = None
+bandwidth = None
 log_directory = 'rawlogs'
 client_logfile_format = '{}/client{{}}.log'.format(log_directory)
 server_logfile_format = '{}/server{{}}.log'.format(log_directory)
+sampler_filename = '{}/host.samples'.format(log_directory)
 time = 60
+adaptive_target = None
+min_intervals = 10
 base_port = 5201
 container_name_format = 'iperf3_{}'
 
 def client_getcmd(i):
     port = base_port + i - 1
-    return ['docker', 'run',
+    command = ['docker', 'run',
             '--name', container_name_format.format(i),
             '-p', '{}:{}'.format(port, port),
             'iperf3', # image name
@@ -42,23 +66,29 @@ def client_getcmd(i):
             '-c', host, '-t', str(time), 
             # '--logfile', client_logfile_format.format(i),
             '-p', str(port),
-            '-b', sys.argv[4]]
+            '-b', bandwidth]
+    if adaptive_target is not None:
+        # Intervals must reach the log while the client runs to stop early.
+        command.append('--forceflush')
+    return command
 
 def server_getcmd(i):
     return ['iperf3', '-s', '-1', 
             '--logfile', server_logfile_format.format(i), 
             '-p', str(base_port + i - 1)]
 
-def copy_logs(n, log_format):
-    for i in range(1, n+1):
-        cname = container_name_format.format(i)
-        logfile = log_format.format(i)
-        command = "docker logs {} &> {}".format(cname, logfile)
-        subprocess.run(command, shell=True)
+def remove_container_getcmd(i):
+    return ['docker', 'rm', '-f', container_name_format.format(i)]
 
 def remove_docker_containers(n):
-    for i in range(1, n+1):
-        cname = container_name_format.format(i)
+    names = [container_name_format.format(i) for i in range(1, n+1)]
+    api = default_client()
+    if api is not None:
+        # One pooled API connection per removal instead of a docker CLI each.
+        for cname in api.remove_many(names, force=False):
+            print('Could not remove {}'.format(cname))
+        return
+    for cname in names:
         command = "docker container rm {}".format(cname)
         subprocess.run(command, shell=True)
 
@@ -66,22 +96,58 @@ if __name__ == "__main__":
     n = int(sys.argv[1])
 
     # Delete existing raw logs.
-    subprocess.run("rm {}/*.log".format(log_directory), shell=True)
+    for filename in glob.glob(os.path.join(log_directory, '*.log')):
+      os.remove(filename)
 
     if sys.argv[2] == '-c':
       # Client mode.
 
-      # Start Docker containers.
+      # Start Docker containers, sampling the host and each container.
       host = sys.argv[3]
-      runcmd(n, client_getcmd)
+      bandwidth = sys.argv[4]
+      if '--adaptive' in sys.argv:
+        adaptive_target = float(sys.argv[sys.argv.index('--adaptive') + 1])
+      sampler = start_sampler(sampler_filename,
+                              [container_name_format.format(i) for i in range(1, n+1)])
+      # The daemon's own start times, from its event stream.
+      api = default_client()
+      lifecycle = None
+      if api is not None:
+        lifecycle = Lifecycle(api, [container_name_format.format(i) for i in range(1, n+1)]).start()
+      with ThreadPoolExecutor(max_workers=n) as pool:
+        # In adaptive mode, follow every client while it runs, writing its logfile.
+        watchers = list()
+        if adaptive_target is not None:
+          for i in range(1, n+1):
+            watchers.append(pool.submit(follow_until_converged, container_name_format.format(i),
+                                        client_logfile_format.format(i), adaptive_target,
+                                        min_intervals))
+        # A client stopped early exits non-zero, which must not stop the others.
+        results = runcmd(n, client_getcmd, timeout=time + 60, fail_fast=adaptive_target is None,
+                         cleanup=remove_container_getcmd)
+      stop_sampler(sampler)
+      launched = [r['launched'] for r in results]
+      print('Launch skew: {:.6f} s'.format(max(launched) - min(launched)))
+      if lifecycle is not None:
+        lifecycle.stop()
+        if lifecycle.skew('start') is not None:
+          print('Container start skew: {:.6f} s'.format(lifecycle.skew('start')))
+      for i, w in enumerate(watchers, 1):
+        intervals, stopped = w.result()
+        print('Client {}: {} intervals{}'.format(i, intervals, ', stopped early' if stopped else ''))
 
-      # Copy logfiles.
-      copy_logs(n, client_logfile_format)
+      # Copy logfiles, all containers at once.
+      if adaptive_target is None:
+        copy_logs(n, client_logfile_format, container_name_format)
+      # Every client's per-interval throughput, retransmits and cwnd, as <log>.npz.
+      store_logs([f for f in (client_logfile_format.format(i) for i in range(1, n+1)) if os.path.exists(f)])
 
       # Remove Docker containers.
       remove_docker_containers(n)
     elif sys.argv[2] == '-s':
       # Server mode.
+      sampler = start_sampler(sampler_filename)
       runcmd(n, server_getcmd)
+      stop_sampler(sampler)
     else:
       raise ValueError("The second argument must be either -c or -s.")
@@ -2,6 +2,8 @@
 
 import sys
 import subprocess
+from wrklog import parse_log, record_run
+from sampling import start_sampler, stop_sampler
 
 # Usage: 
 #
@@ -12,16 +14,26 @@ import subprocess
 # 
 # Host should not have a trailing slash (/), and file should not
 # have a leading slash (/).
+#
+# Each run's throughput and latency percentiles (from --latency and
+# latency.lua) are appended to wrk_runs.jsonl.
 
 benchmarks = [
-    './wrk -d 60s http://192.168.1.135:81/1kb.dat > rawlogs/test5small.log', \
-    './wrk -d 60s http://192.168.1.135:82/fedora29.iso > rawlogs/test5big.log', \
+    ('test5small', './wrk -d 60s --latency -s latency.lua http://192.168.1.135:81/1kb.dat'), \
+    ('test5big', './wrk -d 60s --latency -s latency.lua http://192.168.1.135:82/fedora29.iso'), \
 ]
+logfile_format = 'rawlogs/{}.log'
 
 if __name__ == "__main__":
+    sampler = start_sampler(logfile_format.format('host') + '.samples')
     procs = list()
-    for command in benchmarks:
-        procs.append(subprocess.Popen(command, shell=True))
+    for name, command in benchmarks:
+        procs.append(subprocess.Popen('{} > {}'.format(command, logfile_format.format(name)), shell=True))
     for  p in procs:
         p.wait()
+    stop_sampler(sampler)
+
+    # Record each run.
+    for name, command in benchmarks:
+        record_run(name, parse_log(logfile_format.format(name)))
 
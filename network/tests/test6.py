@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+from wrklog import parse_log, record_run
+from sampling import start_sampler, stop_sampler
+
+# Usage:
+#
+#   test6.py [-d duration] [-c connections] [-R rate] [-p processes]
+#            [--big-size size] [--dedicated small_cpus big_cpus]
+#
+# Reproduces tests 4 and 5 (a small and a large download competing) on
+# loopback, with staticserver.py standing in for the two NGINX containers
+# and httpload.py for wrk. The small-file server listens on port 8081 and
+# serves 1kb.dat; the large-file server listens on port 8082 and serves a
+# synthetic fedora29.iso of --big-size (default 1800M).
+#
+# Both downloads run at the same time, like test 4. With --dedicated, each
+# server and its load generator are pinned with taskset to their own cpus
+# (e.g. --dedicated 0,1 2,3), like test 5. -R makes the small-file client
+# open-loop at that many requests/sec, so its latency is not hidden by
+# coordinated omission; -c and -p scale it to thousands of connections.
+#
+# Writes rawlogs/test6small.log and rawlogs/test6big.log in wrk's format
+# and appends each run to wrk_runs.jsonl.
+
+here = os.path.dirname(os.path.abspath(__file__))
+logfile_format = 'rawlogs/{}.log'
+
+def pinned(command, cpus):
+    return (['taskset', '-c', cpus] if cpus else []) + command
+
+def wait_for_port(port, wait=10):
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='small vs large downloads on loopback')
+    parser.add_argument('-d', '--duration', default='60s')
+    parser.add_argument('-c', '--connections', type=int, default=10)
+    parser.add_argument('-R', '--rate', default=None)
+    parser.add_argument('-p', '--processes', type=int, default=1)
+    parser.add_argument('--big-size', default='1800M')
+    parser.add_argument('--dedicated', nargs=2, metavar=('small_cpus', 'big_cpus'), default=[None, None])
+    args = parser.parse_args()
+
+    small_cpus, big_cpus = args.dedicated
+    server = [sys.executable, os.path.join(here, 'staticserver.py'), '--host', '127.0.0.1']
+    client = [sys.executable, os.path.join(here, 'httpload.py'), '-d', args.duration]
+    benchmarks = [
+        ('test6small', pinned(server + ['-p', '8081', '--workers', str(args.processes)], small_cpus),
+         pinned(client + ['-c', str(args.connections), '-p', str(args.processes)] +
+                (['-R', args.rate] if args.rate else []) + ['http://127.0.0.1:8081/1kb.dat'], small_cpus)),
+        ('test6big', pinned(server + ['-p', '8082', '--file', 'fedora29.iso=' + args.big_size], big_cpus),
+         pinned(client + ['-c', '1', 'http://127.0.0.1:8082/fedora29.iso'], big_cpus)),
+    ]
+    os.makedirs('rawlogs', exist_ok=True)
+
+    servers = [subprocess.Popen(s) for _, s, _ in benchmarks]
+    try:
+        for port in (8081, 8082):
+            if not wait_for_port(port):
+                raise RuntimeError('The server on port {} did not start.'.format(port))
+
+        sampler = start_sampler(logfile_format.format('test6host') + '.samples')
+        procs = list()
+        for name, _, command in benchmarks:
+            with open(logfile_format.format(name), 'w') as f:
+                procs.append(subprocess.Popen(command, stdout=f))
+        for p in procs:
+            p.wait()
+        stop_sampler(sampler)
+    finally:
+        for s in servers:
+            s.terminate()
+            s.wait()
+
+    # Record each run.
+    for name, _, _ in benchmarks:
+        run = record_run(name, parse_log(logfile_format.format(name)))
+        print('{}: {:.1f} Mbps, {:.0f} requests/sec, p99 {:.2f} ms'.format(
+            name, run['mbps'], run['requests_per_sec'], run['p99_ms']))
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import stat
+import time
+import socket
+import tempfile
+import unittest
+import subprocess
+from agent import fetch, request
+
+# This file runs coordinator.py against two agent.py processes on 127.0.0.1,
+# with a stand-in iperf3 on PATH (it sends for the test's duration and
+# prints one interval line per second), so the whole agent protocol can be
+# checked without iperf3 or Docker.
+#
+# Script usage:
+#
+#   test_loopback.py
+#
+#   or python3 -m unittest test_loopback, from this directory.
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+stub_iperf3 = '''#!/usr/bin/env python3
+import sys, time, socket
+args = sys.argv[1:]
+port = int(args[args.index('-p') + 1])
+if '-s' in args:
+    s = socket.socket()
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind(('', port))
+    s.listen(1)
+    c, _ = s.accept()
+    total = 0
+    while True:
+        b = c.recv(1 << 16)
+        if not b:
+            break
+        total += len(b)
+    print('received {} bytes'.format(total), flush=True)
+else:
+    c = socket.create_connection((args[args.index('-c') + 1], port))
+    duration = float(args[args.index('-t') + 1])
+    buf = bytes(1 << 12)
+    start = last = time.time()
+    total = sent = 0
+    while time.time() - start < duration:
+        total += c.send(buf)
+        now = time.time()
+        if now - last >= 1:
+            rate = (total - sent) * 8 / (now - last) / 1e6
+            print('[  5]   {:.2f}-{:.2f}   sec  {:.1f} MBytes  {:.0f} Mbits/sec    0    100 KBytes'.format(
+                last - start, now - start, (total - sent) / 2 ** 20, rate), flush=True)
+            last, sent = now, total
+    elapsed = time.time() - start
+    print('- - - - - - - - - - - - - - - - - - - - - - - - -')
+    for side in ('sender', 'receiver'):
+        print('[  5]   0.00-{:.2f}   sec  {:.1f} MBytes  {:.0f} Mbits/sec                  {}'.format(
+            elapsed, total / 2 ** 20, total * 8 / elapsed / 1e6, side), flush=True)
+    c.close()
+'''
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_agent(address, timeout=10):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return request(address, {'op': 'clock'})
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+class LoopbackTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = self.directory.name
+        stubs = os.path.join(self.cwd, 'bin')
+        os.mkdir(stubs)
+        iperf3 = os.path.join(stubs, 'iperf3')
+        with open(iperf3, 'w') as f:
+            f.write(stub_iperf3)
+        os.chmod(iperf3, os.stat(iperf3).st_mode | stat.S_IXUSR)
+        self.env = dict(os.environ, PATH=stubs + os.pathsep + os.environ['PATH'])
+
+        self.agents = list()
+        self.addresses = list()
+        for _ in range(2):
+            address = ('127.0.0.1', free_port())
+            self.agents.append(subprocess.Popen(
+                [sys.executable, os.path.join(here, 'agent.py'), '--port', str(address[1])],
+                cwd=self.cwd, env=self.env, stderr=subprocess.DEVNULL))
+            self.addresses.append(address)
+        for address in self.addresses:
+            wait_for_agent(address)
+
+    def tearDown(self):
+        for agent in self.agents:
+            agent.terminate()
+            agent.wait()
+        self.directory.cleanup()
+
+    def test_coordinated_run(self):
+        n = 2
+        out = os.path.join(self.cwd, 'out')
+        server, client = ['{}:{}'.format(*address) for address in self.addresses]
+        subprocess.run([sys.executable, os.path.join(here, 'coordinator.py'), str(n),
+                        '--server', server, '--client', client, '--native', '-t', '2', '--out', out],
+                       cwd=self.cwd, env=self.env, check=True, stdout=subprocess.DEVNULL, timeout=120)
+        logs = os.path.join(out, 'n={}'.format(n))
+        for i in range(1, n + 1):
+            with open(os.path.join(logs, 'client{}.log'.format(i))) as f:
+                self.assertIn('receiver', f.read())
+            with open(os.path.join(logs, 'server{}.log'.format(i))) as f:
+                self.assertIn('received', f.read())
+            self.assertTrue(os.path.exists(os.path.join(logs, 'client{}.npz'.format(i))))
+
+    def test_fetch_only_serves_logs(self):
+        destination = os.path.join(self.cwd, 'copy')
+        with self.assertRaisesRegex(RuntimeError, 'not a log'):
+            fetch(self.addresses[0], '/etc/hostname', destination)
+        # The agent is still answering.
+        wait_for_agent(self.addresses[0], timeout=0)
+
+if __name__ == "__main__":
+    # Script usage.
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+
+import sys
+import os
+import re
+import json
+import time
+
+# This file contains functions to parse wrk output, and a script that records
+# runs and turns the raw wrk logs of tests 3-5 into the CSVs used by
+# ../results.
+#
+# Script usage:
+#
+#   wrklog.py record label logfile [store]
+#
+#     Parses logfile and appends one JSON line for it to store (default
+#     wrk_runs.jsonl), tagged with label, so p50/p90/p99/p99.9 latency of
+#     every run is tracked.
+#
+#   wrklog.py csv [results_directory]
+#
+#     Writes test3_graph1.csv, test4_graph1.csv, test5_graph1.csv,
+#     test345_graph1.csv and nginx_latency.csv (default ../results) from
+#     test3/test3{big,small}.log, test4/test4{big,small}.log and
+#     test5/test5{big,small}.log.
+#
+# Python function usage:
+#
+#   parse_log(filename)
+#
+#     Parses wrk's text output, including the block printed by --latency
+#     and the JSON line printed by latency.lua, into a dictionary. Times are
+#     in seconds and sizes in bytes. "percentiles" maps a percentile (e.g.
+#     99.9) to its latency; it comes from latency.lua when available and
+#     from the --latency block otherwise.
+
+seconds = {'us': 1e-6, 'ms': 1e-3, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+sizes = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+def to_seconds(text):
+    # e.g. '1.48ms'
+    match = re.match(r'^([\d.]+)([a-z]+)$', text)
+    return float(match.group(1)) * seconds[match.group(2)]
+
+def to_bytes(text):
+    # e.g. '563.82MB'
+    match = re.match(r'^([\d.]+)([KMGT]?B)$', text)
+    return float(match.group(1)) * sizes[match.group(2)]
+
+def stat_or_none(convert, text):
+    # Runs without any completed request report 0.00us and -nan%.
+    try:
+        return convert(text)
+    except (AttributeError, ValueError):
+        return None
+
+def parse_wrk(text):
+    result = {'url': None, 'threads': None, 'connections': None,
+              'latency': None, 'latency_stdev': None, 'latency_max': None,
+              'requests': None, 'duration': None, 'bytes': None,
+              'requests_per_sec': None, 'transfer_per_sec': None,
+              'errors': 0, 'percentiles': dict(), 'histogram': None}
+    in_distribution = False
+
+    for line in text.splitlines():
+        line = line.strip()
+        fields = line.split()
+        if not fields:
+            continue
+
+        if line.startswith('Running'):
+            # Running 1m test @ http://192.168.1.135:81/1kb.dat
+            result['url'] = fields[-1]
+        elif 'threads and' in line:
+            result['threads'] = int(fields[0])
+            result['connections'] = int(fields[3])
+        elif fields[0] == 'Latency' and len(fields) >= 4:
+            result['latency'] = stat_or_none(to_seconds, fields[1])
+            result['latency_stdev'] = stat_or_none(to_seconds, fields[2])
+            result['latency_max'] = stat_or_none(to_seconds, fields[3])
+        elif line == 'Latency Distribution':
+            in_distribution = True
+            continue
+        elif in_distribution and fields[0].endswith('%') and len(fields) == 2:
+            result['percentiles'][float(fields[0][:-1])] = to_seconds(fields[1])
+            continue
+        elif 'requests in' in line:
+            # 462625 requests in 1.00m, 563.82MB read
+            result['requests'] = int(fields[0])
+            result['duration'] = to_seconds(fields[3].rstrip(','))
+            result['bytes'] = to_bytes(fields[4])
+        elif line.startswith('Socket errors:'):
+            result['errors'] += sum(int(f.rstrip(',')) for f in fields[3::2])
+        elif line.startswith('Non-2xx or 3xx responses:'):
+            result['errors'] += int(fields[-1])
+        elif line.startswith('Requests/sec:'):
+            result['requests_per_sec'] = float(fields[1])
+        elif line.startswith('Transfer/sec:'):
+            result['transfer_per_sec'] = to_bytes(fields[1])
+        elif line.startswith('{'):
+            # The JSON line printed by latency.lua has the full distribution.
+            data = json.loads(line)
+            latency = data['latency_us']
+            result['percentiles'].update({float(p): v * 1e-6 for p, v in latency['percentiles'].items()})
+            result['histogram'] = [(v * 1e-6, c) for v, c in latency['histogram']]
+        in_distribution = False
+
+    return result
+
+def parse_log(filename):
+    with open(filename) as f:
+        return parse_wrk(f.read())
+
+def mbps(result):
+    # The team's CSVs convert wrk's Transfer/sec as MB * 8.
+    return result['transfer_per_sec'] * 8 / sizes['MB']
+
+def latency_ms(result):
+    return result['latency'] * 1e3
+
+def record_run(label, result, store='wrk_runs.jsonl'):
+    run = {'label': label, 'time': time.time(), 'url': result['url'],
+           'requests_per_sec': result['requests_per_sec'], 'mbps': mbps(result),
+           'latency_ms': None if result['latency'] is None else latency_ms(result),
+           'errors': result['errors']}
+    for p in (50, 90, 99, 99.9):
+        value = result['percentiles'].get(float(p))
+        run['p{:g}_ms'.format(p)] = None if value is None else value * 1e3
+    with open(store, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+    return run
+
+def write_csv(filename, header, rows):
+    with open(filename, 'w') as f:
+        f.write(','.join(header) + '\n')
+        for row in rows:
+            f.write(','.join('{:g}'.format(round(v, 3)) if isinstance(v, float) else str(v) for v in row) + '\n')
+
+def test345_csvs(results_directory):
+    configurations = [('test3', 'Fedora', '1 KB file', 'Solo'),
+                      ('test4', 'Shared CPU', 'Shared CPU', 'Shared CPU'),
+                      ('test5', 'w/ cgroups', 'w/ cgroups', 'With cgroups')]
+    combined = list()
+    latency = list()
+
+    for test, big_label, small_label, environment in configurations:
+        big = parse_log(os.path.join(test, test + 'big.log'))
+        small = parse_log(os.path.join(test, test + 'small.log'))
+        latency.append((environment, latency_ms(small)))
+
+        if test == 'test3':
+            # Test 3 ran each download on its own.
+            rows = [('Fedora ISO', mbps(big)), ('1 KB file', mbps(small))]
+            combined += [(big_label, 'Total', mbps(big)), (big_label, 'Fedora ISO', mbps(big)),
+                         (small_label, 'Total', mbps(small)), (small_label, '1 KB file', mbps(small))]
+        else:
+            total = mbps(big) + mbps(small)
+            rows = [('Total', total), ('Fedora ISO', mbps(big)), ('1 KB file', mbps(small))]
+            combined += [(big_label, download, value) for download, value in rows]
+
+        write_csv(os.path.join(results_directory, test + '_graph1.csv'),
+                  ['Download type', 'Throughput (Mbps)'], rows)
+
+    write_csv(os.path.join(results_directory, 'test345_graph1.csv'),
+              ['Test configuration', 'Download type', 'Throughput (Mbps)'], combined)
+    write_csv(os.path.join(results_directory, 'nginx_latency.csv'),
+              ['Environment', 'Latency (ms)'], latency)
+
+if __name__ == "__main__":
+    # Script usage.
+    if sys.argv[1] == 'record':
+        store = sys.argv[4] if len(sys.argv) > 4 else 'wrk_runs.jsonl'
+        print(record_run(sys.argv[2], parse_log(sys.argv[3]), store))
+    elif sys.argv[1] == 'csv':
+        test345_csvs(sys.argv[2] if len(sys.argv) > 2 else '../results')
+    else:
+        raise ValueError("The first argument must be either record or csv.")